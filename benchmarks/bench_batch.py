@@ -0,0 +1,47 @@
+"""Compare parsing a frame's lines one by one and as a batch.
+
+Parses the lines of a room |init| frame, as built by bench_frames.py, with
+message.parse_message per line and with message.parse_messages on the
+whole frame, eagerly and in lazy mode, and reports the cost per line.
+
+Usage:
+    python benchmarks/bench_batch.py [--users N] [--scrollback N] [--repeat N]
+"""
+
+import argparse
+import timeit
+from typing import List
+
+from bench_frames import build_init_frame
+
+from pyshowdown import message
+from pyshowdown.inbound import frame_room
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--scrollback", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    room, body = frame_room(build_init_frame(args.users, args.scrollback))
+    lines: List[str] = [line for line in body.split("\n") if line]
+
+    for lazy in (False, True):
+
+        def per_line() -> None:
+            for line in lines:
+                message.parse_message(room, line, lazy=lazy)
+
+        def batch() -> None:
+            message.parse_messages(room, lines, lazy=lazy)
+
+        mode = "lazy" if lazy else "eager"
+        for name, parse in (("parse_message", per_line), ("parse_messages", batch)):
+            seconds = min(timeit.repeat(parse, number=1, repeat=args.repeat))
+            print(f"{mode:5} {name:15} {seconds / len(lines) * 1e9:7.0f} ns/line")
+
+
+if __name__ == "__main__":
+    main()
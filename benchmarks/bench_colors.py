@@ -0,0 +1,70 @@
+"""Benchmark username colors, one at a time and for a whole user list.
+
+Colors the users of a large room with username_color as it used to be
+(no cache), with username_color and username_colors on a cold and a warm
+cache, and with username_colors vectorized, if NumPy is installed.
+Reports the cost per name.
+
+Usage:
+    python benchmarks/bench_colors.py [--users N] [--repeat N]
+"""
+
+import argparse
+import timeit
+from typing import Callable, List
+
+from pyshowdown.utils import _id_color, numpy, to_id, username_color, username_colors
+
+
+def per_name(run: Callable[[], object], count: int, repeat: int) -> float:
+    """Return the best time of run(), in nanoseconds per name."""
+    return min(timeit.repeat(run, number=1, repeat=repeat)) / count * 1e9
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=3000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    names: List[str] = [f"User Name {i}" for i in range(args.users)]
+    ids = [to_id(name) for name in names]
+
+    def uncached() -> None:
+        for id in ids:
+            _id_color.__wrapped__(id)
+
+    def cold() -> None:
+        _id_color.cache_clear()
+        for name in names:
+            username_color(name)
+
+    def warm() -> None:
+        for name in names:
+            username_color(name)
+
+    def batch_cold() -> None:
+        _id_color.cache_clear()
+        username_colors(ids, vectorized=False)
+
+    runs = [
+        ("username_color, no cache", uncached),
+        ("username_color, cold cache", cold),
+        ("username_color, warm cache", warm),
+        ("username_colors, cold cache", batch_cold),
+        ("username_colors, warm cache", lambda: username_colors(ids, vectorized=False)),
+    ]
+    if numpy is not None:
+        runs.append(
+            ("username_colors, NumPy", lambda: username_colors(ids, vectorized=True))
+        )
+    else:
+        print("NumPy isn't installed, skipping the vectorized path")
+
+    for label, run in runs:
+        cold()
+        print(f"{label:28} {per_name(run, args.users, args.repeat):7.0f} ns/name")
+
+
+if __name__ == "__main__":
+    main()
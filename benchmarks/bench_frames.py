@@ -0,0 +1,98 @@
+"""Compare splitting large websocket frames into lines, all at once or lazily.
+
+Builds a room |init| frame like the one sent on joining a busy room, with a
+|users| line listing every user and the chat scrollback, and splits it the
+way receive_forever used to (str.split, then popping the room header off
+the front of the list) and with inbound.split_frame. Each line is handed to
+a consumer which drops it, as the inbound queue eventually does.
+
+Reports the time per frame and the peak memory allocated while splitting
+one, beyond the frame itself.
+
+Usage:
+    python benchmarks/bench_frames.py [--users N] [--scrollback N] [--repeat N]
+"""
+
+import argparse
+import timeit
+import tracemalloc
+from typing import Callable, Iterator, Tuple
+
+from pyshowdown.inbound import split_frame
+
+
+def build_init_frame(users: int, scrollback: int) -> str:
+    """Return an |init| frame for a room with the given users and scrollback."""
+    ranks = "+ %@"
+    names = ",".join(f"{ranks[i % len(ranks)]}User Name {i}" for i in range(users))
+    lines = [
+        ">lobby",
+        "|init|chat",
+        "|title|Lobby",
+        f"|users|{users},{names}",
+        "|:|1700000000",
+    ]
+    for i in range(scrollback):
+        lines.append(
+            f"|c:|{1699990000 + i}|+User Name {i % users}|message number {i}, "
+            "with some chatter to make it about as long as usual"
+        )
+    return "\n".join(lines)
+
+
+def split_list(frame: str) -> Iterator[Tuple[str, str]]:
+    """Split a frame as receive_forever used to."""
+    messages = frame.split("\n")
+    if messages and messages[0] and messages[0][0] == ">":
+        room = messages.pop(0)[1:]
+    else:
+        room = ""
+    for single_message in messages:
+        if single_message:
+            yield room, single_message
+
+
+def consume(split: Callable[[str], Iterator[Tuple[str, str]]], frame: str) -> int:
+    """Split a frame, dropping each line once it's been seen."""
+    count = 0
+    for _room, _line in split(frame):
+        count += 1
+    return count
+
+
+def peak(split: Callable[[str], Iterator[Tuple[str, str]]], frame: str) -> int:
+    """Return the peak bytes allocated while splitting the frame."""
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    consume(split, frame)
+    result = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--scrollback", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    frame = build_init_frame(args.users, args.scrollback)
+    assert list(split_list(frame)) == list(split_frame(frame))
+    print(
+        f"frame: {len(frame) / 1024:.0f} KiB, "
+        f"{consume(split_frame, frame)} lines (room header excluded)"
+    )
+
+    for name, split in (("str.split", split_list), ("split_frame", split_frame)):
+        seconds = min(
+            timeit.repeat(lambda: consume(split, frame), number=1, repeat=args.repeat)
+        )
+        print(
+            f"{name:12} {seconds * 1e3:7.2f} ms/frame, "
+            f"peak {peak(split, frame) / 1024:8.1f} KiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
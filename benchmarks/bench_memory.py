@@ -0,0 +1,75 @@
+"""Measure the memory held per User and per parsed ChatMessage.
+
+Allocates a large number of objects while tracemalloc is running and
+reports the average number of bytes retained per object. The names and
+message strings are built before tracing starts, so only the objects
+themselves are counted.
+
+Usage:
+    python benchmarks/bench_memory.py [--count N]
+"""
+
+import argparse
+import tracemalloc
+from typing import Callable, List
+
+from pyshowdown import message
+from pyshowdown.user import User, UserRegistry
+
+
+def measure(build: Callable[[], List[object]]) -> float:
+    """Return the bytes retained per object created by build()."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / len(objects)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=50000)
+    args = parser.parse_args()
+
+    names = [f"User Name {i}" for i in range(args.count)]
+    ids = [f"username{i}" for i in range(args.count)]
+    lines = [f"|c:|1700000000|+{name}|hello there" for name in names]
+
+    def users() -> List[object]:
+        # Reuse prebuilt IDs so the to_id() result strings aren't counted.
+        result: List[object] = []
+        for name, id in zip(names, ids):
+            result.append(User(name, "+", "", False, id))
+        return result
+
+    user = User("Somebody", "+", "", False)
+
+    def chat_messages() -> List[object]:
+        return [
+            message.ChatMessage("lobby", line, user, "hello there") for line in lines
+        ]
+
+    def parsed_chat_messages() -> List[object]:
+        return [message.parse_message("lobby", line) for line in lines]
+
+    # the same few people chatting, as in a busy room
+    repeat_lines = [
+        f"|c:|1700000000|+{names[i % 50]}|hello there" for i in range(args.count)
+    ]
+
+    def repeat_chat_messages() -> List[object]:
+        registry = UserRegistry()
+        return [
+            message.parse_message("lobby", line, users=registry)
+            for line in repeat_lines
+        ]
+
+    print(f"User:                      {measure(users):6.1f} bytes")
+    print(f"ChatMessage:               {measure(chat_messages):6.1f} bytes")
+    print(f"parsed ChatMessage + User: {measure(parsed_chat_messages):6.1f} bytes")
+    print(f"parsed, 50 senders:        {measure(repeat_chat_messages):6.1f} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Benchmark the per-line cost of message.parse_message.
+
+Runs parse_message over a mix of lines roughly matching what a bot sitting
+in a few busy chat rooms receives, and reports the average cost per line,
+both with eager parsing and in lazy mode (fields are never read, as for
+lines that don't reach a plugin interested in their payload).
+
+Usage:
+    python benchmarks/bench_parse.py [--rounds N] [--repeat N]
+"""
+
+import argparse
+import timeit
+from typing import List, Tuple
+
+from pyshowdown import message
+
+UPDATEUSER = (
+    '|updateuser| Bot|1|1|{"blockChallenges":false,"blockPMs":false,'
+    '"ignoreTickets":false,"hideBattlesFromTrainerCard":false,'
+    '"blockInvites":false,"doNotDisturb":false,"blockFriendRequests":false,'
+    '"allowFriendNotifications":false,"displayBattlesToFriends":false,'
+    '"hideLogins":false,"hiddenNextBattle":false,'
+    '"inviteOnlyNextBattle":false,"language":null}'
+)
+
+# (weight, room, line)
+MIX: List[Tuple[int, str, str]] = [
+    (30, "lobby", "|c:|1700000000|+Somebody|hello everyone, how is it going?"),
+    (10, "lobby", "|c|@Moderator|please keep it civil"),
+    (12, "lobby", "|J| Newcomer"),
+    (12, "lobby", "|L| Leaver"),
+    (4, "lobby", "|N| New Name@!|oldname"),
+    (6, "", "|pm| Friend| Bot|!help"),
+    (4, "lobby", "|uhtmlchange|scoreboard|<div>score: 12</div>"),
+    (3, "lobby", '|html|<div class="broadcast-blue">announcement</div>'),
+    (3, "lobby", "|:|1700000000"),
+    (
+        2,
+        "",
+        "|queryresponse|userdetails|"
+        '{"id":"friend","userid":"friend","name":"Friend","avatar":"1","group":" ","rooms":{}}',
+    ),
+    (2, "", UPDATEUSER),
+    (2, "", '|updatesearch|{"searching":[],"games":null}'),
+    (2, "battle-gen9ou-1", "|player|p1|Somebody|1|1500"),
+    (2, "battle-gen9ou-1", "|move|p1a: Pikachu|Thunderbolt|p2a: Ditto"),
+    (1, "lobby", "|raw|<div>raw html</div>"),
+    (1, "", "|popup|Hello!"),
+]
+
+
+def build_lines() -> List[Tuple[str, str]]:
+    """Expand MIX into a flat list of (room, line) pairs."""
+    lines = []
+    for weight, room, line in MIX:
+        lines.extend([(room, line)] * weight)
+    return lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    lines = build_lines()
+    parse = message.parse_message
+
+    for lazy in (False, True):
+
+        def run() -> None:
+            for room, line in lines:
+                parse(room, line, lazy)
+
+        best = min(timeit.repeat(run, number=args.rounds, repeat=args.repeat))
+        per_line = best / (args.rounds * len(lines))
+        mode = "lazy" if lazy else "eager"
+        print(
+            f"parse_message ({mode}): {per_line * 1e9:.0f} ns/line"
+            f" over {len(lines)}-line mix"
+        )
+
+
+if __name__ == "__main__":
+    main()
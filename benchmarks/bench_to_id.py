@@ -0,0 +1,77 @@
+"""Benchmark utils.to_id and utils.to_ids on different kinds of names.
+
+Compares the regex implementation to_id used to have with the current one,
+both on names it hasn't seen (calling the function under the cache) and
+on names it has, and with to_ids converting every name at once. Each suite
+is a list of names of one kind: plain ASCII names, names which are
+already IDs, names with accents and other scripts, and pathological ones,
+very long or made almost entirely of punctuation.
+
+Usage:
+    python benchmarks/bench_to_id.py [--count N] [--repeat N]
+"""
+
+import argparse
+import re
+import timeit
+from typing import Callable, Dict, List
+
+from pyshowdown.utils import to_id, to_ids
+
+
+def regex_to_id(string: str) -> str:
+    """to_id as it used to be."""
+    return re.sub(r"[^A-Za-z0-9]", "", string).lower()
+
+
+def build_suites(count: int) -> Dict[str, List[str]]:
+    """Return count names of each kind."""
+    return {
+        "ascii": [f"Some User {i}" for i in range(count)],
+        "id": [f"someuser{i}" for i in range(count)],
+        "unicode": [f"Ünïcödé Nâme ✨{i}" for i in range(count)],
+        "cjk": [f"日本語のなまえ{i}" for i in range(count)],
+        "long": [f"{i}" + "Long Name " * 30 for i in range(count)],
+        "punctuation": [f"{i}" + ".-_ !?" * 10 for i in range(count)],
+    }
+
+
+def per_name(run: Callable[[], object], count: int, repeat: int) -> float:
+    """Return the best time of run(), in nanoseconds per name."""
+    return min(timeit.repeat(run, number=1, repeat=repeat)) / count * 1e9
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'':12} {'regex':>8} {'uncached':>8} {'cached':>8} {'to_ids':>8}  ns/name")
+    for kind, names in build_suites(args.count).items():
+        assert [to_id(name) for name in names] == [regex_to_id(n) for n in names]
+        assert to_ids(names) == [regex_to_id(n) for n in names]
+
+        def regex() -> None:
+            for name in names:
+                regex_to_id(name)
+
+        def uncached() -> None:
+            for name in names:
+                to_id.__wrapped__(name)
+
+        def cached() -> None:
+            for name in names:
+                to_id(name)
+
+        to_id.cache_clear()
+        cached()
+        times = [
+            per_name(run, args.count, args.repeat)
+            for run in (regex, uncached, cached, lambda: to_ids(names))
+        ]
+        print(f"{kind:12} " + " ".join(f"{t:8.0f}" for t in times))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import time
+from enum import Enum
+from typing import Callable, Optional
+
+from pyshowdown.metrics import CounterValue, HistogramValue
+
+
+class BreakerState(Enum):
+    # calls go through
+    CLOSED = "closed"
+    # calls are skipped until the cooldown is over
+    OPEN = "open"
+    # one trial call goes through, to decide whether to close again
+    HALF_OPEN = "half-open"
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        failure_threshold: Optional[int] = 5,
+        cooldown: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """Stops calling something which keeps failing, for a while.
+
+        After failure_threshold failures in a row the breaker opens, and
+        calls are skipped for cooldown seconds. Then it lets one call
+        through: if that succeeds the breaker closes again, otherwise it
+        stays open for another cooldown.
+
+        Args:
+            failure_threshold (int, optional): Failures in a row which open
+                the breaker. Defaults to 5; None never opens it.
+            cooldown (float, optional): Seconds to stay open. Defaults to 60.
+            clock (Callable[[], float], optional): The clock to use, in
+                seconds. Defaults to time.monotonic.
+
+        Raises:
+            ValueError: If failure_threshold is less than 1 or cooldown is
+                negative.
+        """
+        if failure_threshold is not None and failure_threshold < 1:
+            raise ValueError("failure_threshold must be at least 1.")
+        if cooldown < 0:
+            raise ValueError("cooldown must not be negative.")
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.state = BreakerState.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+
+    def allow(self) -> bool:
+        """Returns whether a call may go through now.
+
+        Every call allowed must be followed by record_success(),
+        record_failure() or release().
+
+        Returns:
+            bool: True if the call may go through, False to skip it.
+        """
+        if self.state is BreakerState.CLOSED:
+            return True
+        if self.state is BreakerState.OPEN:
+            if self.clock() - self.opened_at >= self.cooldown:
+                self.state = BreakerState.HALF_OPEN
+                return True
+        # a trial call is already running
+        return False
+
+    def record_success(self) -> None:
+        """Records that a call succeeded, closing the breaker."""
+        self.failures = 0
+        self.state = BreakerState.CLOSED
+
+    def release(self) -> None:
+        """Records that a call ended without showing success or failure.
+
+        A trial call released this way lets the next call be a trial.
+        """
+        if self.state is BreakerState.HALF_OPEN:
+            self.state = BreakerState.OPEN
+
+    def record_failure(self) -> None:
+        """Records that a call failed, opening the breaker if needed."""
+        self.failures += 1
+        if (
+            self.state is BreakerState.HALF_OPEN
+            or self.failure_threshold is not None
+            and self.failures >= self.failure_threshold
+        ):
+            self.state = BreakerState.OPEN
+            self.opened_at = self.clock()
+            self.times_opened += 1
+
+    def __str__(self) -> str:
+        """Returns a string representation of the breaker.
+
+        Returns:
+            str: The string representation of the breaker.
+        """
+        return "CircuitBreaker({}, failures={})".format(self.state.value, self.failures)
+
+    def __repr__(self) -> str:
+        """Returns a representation of the breaker.
+
+        Returns:
+            str: The representation of the breaker.
+        """
+        return self.__str__()
+
+
+class PluginStats:
+    def __init__(
+        self,
+        name: str,
+        breaker: CircuitBreaker,
+        match_seconds: HistogramValue,
+        response_seconds: HistogramValue,
+        errors: CounterValue,
+        timeouts: CounterValue,
+        skipped: CounterValue,
+    ):
+        """How a plugin has been doing, and its circuit breaker.
+
+        The counts and timings are the plugin's children of the client's
+        metrics, so they're also exposed there.
+
+        Args:
+            name (str): The plugin's class name.
+            breaker (CircuitBreaker): The plugin's circuit breaker.
+            match_seconds (HistogramValue): Timings of match() calls.
+            response_seconds (HistogramValue): Timings of response() calls.
+            errors (CounterValue): Exceptions raised by the plugin.
+            timeouts (CounterValue): Calls which took too long.
+            skipped (CounterValue): Messages skipped while the breaker was
+                open.
+        """
+        self.name = name
+        self.breaker = breaker
+        self.match_seconds = match_seconds
+        self.response_seconds = response_seconds
+        self.errors = errors
+        self.timeouts = timeouts
+        self.skipped = skipped
+        self.last_error: Optional[BaseException] = None
+
+    @property
+    def mean_response_seconds(self) -> float:
+        """The mean time response() took, or 0 if it was never called."""
+        timings = self.response_seconds
+        return timings.sum / timings.count if timings.count else 0.0
+
+    def __str__(self) -> str:
+        """Returns a string representation of the stats.
+
+        Returns:
+            str: The string representation of the stats.
+        """
+        return (
+            "PluginStats({}, responses={}, mean={:.4f}s, errors={}, "
+            "timeouts={}, skipped={}, breaker={})"
+        ).format(
+            self.name,
+            self.response_seconds.count,
+            self.mean_response_seconds,
+            int(self.errors.value),
+            int(self.timeouts.value),
+            int(self.skipped.value),
+            self.breaker.state.value,
+        )
+
+    def __repr__(self) -> str:
+        """Returns a representation of the stats.
+
+        Returns:
+            str: The representation of the stats.
+        """
+        return self.__str__()
@@ -4,20 +4,136 @@ import importlib
 import os
 import ssl
 import sys
+import time
+from enum import Enum
 from http.cookies import SimpleCookie
-from typing import TYPE_CHECKING, Dict, List, Optional
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Awaitable,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+)
 
 import aiohttp
 from aiohttp.abc import AbstractCookieJar
 
 from pyshowdown import connection, message
+from pyshowdown.breaker import CircuitBreaker, PluginStats
+from pyshowdown.command import Command, parse_command
+from pyshowdown.executor import PROCESS, THREAD, PluginExecutor
+from pyshowdown.inbound import InboundPipeline, frame_room, split_frame
+from pyshowdown.log import INBOUND, OUTBOUND, WireLog, logger
+from pyshowdown.matcher import KeywordMatcher
+from pyshowdown.metrics import ClientMetrics, CounterValue, MetricsServer
+from pyshowdown.outbound import (
+    ADD_UHTML,
+    CHANGE_UHTML,
+    COALESCE_MAX_BYTES,
+    COALESCE_MAX_LINES,
+    OutboundMessage,
+    OutboundQueue,
+    Priority,
+    join_lines,
+)
+from pyshowdown.ratelimit import AdaptiveTokenBucket, RateLimiter
+from pyshowdown.stream import Subscription
+from pyshowdown.user import RANK_ORDER, UserRegistry, is_trusted_rank
+from pyshowdown.utils import to_id
 
 if TYPE_CHECKING:
-    from pyshowdown.plugins.plugin import BasePlugin
+    from pyshowdown.plugins.plugin import BasePlugin, CommandPlugin
     from pyshowdown.room import Room
 
+T = TypeVar("T")
 
+# seconds between messages, once the burst allowance is used up
 THROTTLE = 0.6
+# seconds between messages in rooms where we have bot or staff rank
+TRUSTED_THROTTLE = 0.1
+# messages which can be sent back to back after an idle period
+BURST = 3
+# times a message rejected for being sent too fast is sent again
+MAX_RETRIES = 2
+# seconds after sending a message during which a throttle notice is taken to
+# be about it. Notices don't say which message they're about, so the one
+# retried is the last sent to the room when the notice is handled, which can
+# be a later one than the server rejected if several were sent close together.
+RETRY_WINDOW = 2.0
+# seconds a plugin's match() or response() may take, unless it says otherwise
+PLUGIN_TIMEOUT = 30.0
+
+
+class DefaultTimeout(Enum):
+    # a plugin timeout which is the client's plugin_timeout
+    CLIENT = "client"
+
+
+class PluginList(List["BasePlugin"]):
+    """A client's plugins, counting the changes made to them.
+
+    The client only rebuilds its routing tables when the count has moved,
+    instead of comparing every plugin on each message.
+    """
+
+    version = 0
+
+    def _changed(self) -> None:
+        self.version += 1
+
+    def append(self, *args: Any) -> None:
+        self._changed()
+        super().append(*args)
+
+    def extend(self, *args: Any) -> None:
+        self._changed()
+        super().extend(*args)
+
+    def insert(self, *args: Any) -> None:
+        self._changed()
+        super().insert(*args)
+
+    def remove(self, *args: Any) -> None:
+        self._changed()
+        super().remove(*args)
+
+    def pop(self, *args: Any) -> "BasePlugin":
+        self._changed()
+        return super().pop(*args)
+
+    def clear(self) -> None:
+        self._changed()
+        super().clear()
+
+    def sort(self, *args: Any, **kwargs: Any) -> None:
+        self._changed()
+        super().sort(*args, **kwargs)
+
+    def reverse(self) -> None:
+        self._changed()
+        super().reverse()
+
+    def __setitem__(self, *args: Any) -> None:
+        self._changed()
+        super().__setitem__(*args)
+
+    def __delitem__(self, *args: Any) -> None:
+        self._changed()
+        super().__delitem__(*args)
+
+    def __iadd__(self, *args: Any) -> "PluginList":
+        self._changed()
+        return super().__iadd__(*args)
+
+    def __imul__(self, *args: Any) -> "PluginList":
+        self._changed()
+        return super().__imul__(*args)
 
 
 class Client:
@@ -28,6 +144,25 @@ class Client:
         url: str,
         login_type: str = "password",
         ssl_context: Optional[ssl.SSLContext] = None,
+        lazy_parsing: bool = False,
+        batch_parsing: bool = False,
+        inbound_queue_size: int = 1000,
+        inbound_workers: int = 4,
+        inbound_overflow: str = "block",
+        rate_limiter: Optional[RateLimiter] = None,
+        min_throttle: float = THROTTLE,
+        coalesce: bool = False,
+        coalesce_max_lines: int = COALESCE_MAX_LINES,
+        coalesce_max_bytes: int = COALESCE_MAX_BYTES,
+        trusted_throttle: Optional[float] = TRUSTED_THROTTLE,
+        wire_log: Optional[WireLog] = None,
+        metrics_port: Optional[int] = None,
+        plugin_timeout: Optional[float] = PLUGIN_TIMEOUT,
+        thread_workers: Optional[int] = None,
+        process_workers: Optional[int] = None,
+        command_prefixes: str = "!",
+        matcher: Optional[KeywordMatcher] = None,
+        user_registry: Optional[UserRegistry] = None,
     ):
         """Client class constructor.
 
@@ -37,17 +172,149 @@ class Client:
             url (str): The url to connect to.
             login_type (str): The type of login to use. Either "password" or "oauth".
             ssl_context (ssl.SSLContext, optional): The SSL context. Defaults to None.
+            lazy_parsing (bool, optional): Whether to decode users and JSON
+                payloads only when a plugin reads them. Defaults to False.
+            batch_parsing (bool, optional): Whether to queue each frame
+                received as a whole, and parse its lines together with
+                message.parse_messages, instead of queueing and parsing
+                them one by one. A frame then counts as one line towards
+                inbound_queue_size. Defaults to False.
+            inbound_queue_size (int, optional): The maximum number of received
+                lines waiting to be handled. Defaults to 1000.
+            inbound_workers (int, optional): The number of coroutines handling
+                received lines. Lines from the same room are always handled in
+                order, so this is also the number of rooms handled at once.
+                Defaults to 4.
+            inbound_overflow (str, optional): What to do with received lines
+                when the inbound queue is full: "block" stops reading from the
+                socket until there is space, "drop" discards them. Defaults to
+                "block".
+            rate_limiter (RateLimiter, optional): Limits the rate of outgoing
+                messages. Defaults to None, which uses an AdaptiveTokenBucket
+                sending up to BURST messages at once and one every THROTTLE
+                seconds after that, slowing down when the server says
+                messages are being sent too fast and speeding up again,
+                up to one every min_throttle seconds, while it doesn't.
+            min_throttle (float, optional): The fewest seconds between
+                messages the default rate_limiter speeds up to. Defaults to
+                THROTTLE, PS's limit for users without a rank. Bots with a
+                rank the server lets send faster can lower it.
+            coalesce (bool, optional): Whether to merge messages queued for the
+                same room into a single frame when sending. Defaults to False.
+            coalesce_max_lines (int, optional): The maximum number of lines in
+                a merged frame. Defaults to COALESCE_MAX_LINES.
+            coalesce_max_bytes (int, optional): The maximum size of a merged
+                frame in bytes. Defaults to COALESCE_MAX_BYTES.
+            trusted_throttle (float, optional): Seconds between messages in
+                rooms where we have bot or staff rank, either in the room or
+                globally. Each of those rooms gets its own AdaptiveTokenBucket
+                instead of sharing rate_limiter. Defaults to TRUSTED_THROTTLE;
+                None uses rate_limiter for every room.
+            wire_log (WireLog, optional): Filters the lines sent and received
+                which are logged to the pyshowdown.wire logger. Defaults to
+                None, which logs every line once that logger is enabled for
+                DEBUG, and nothing otherwise.
+            metrics_port (int, optional): Serves the client's metrics in the
+                Prometheus text format on this local port while connected.
+                Defaults to None, which doesn't serve them. The metrics are
+                recorded either way, in self.metrics.
+            plugin_timeout (float, optional): Seconds a plugin's match() or
+                response() may take, for plugins whose match_timeout or
+                response_timeout is DefaultTimeout.CLIENT. Defaults to
+                PLUGIN_TIMEOUT; None lets them take as long as they like.
+            thread_workers (int, optional): The size of the thread pool for
+                plugins with executor = "thread". Defaults to None, which
+                uses ThreadPoolExecutor's default.
+            process_workers (int, optional): The size of the process pool
+                for plugins with executor = "process". Defaults to None,
+                which uses ProcessPoolExecutor's default.
+            command_prefixes (str, optional): The characters chat commands for
+                CommandPlugins start with. Defaults to "!".
+            matcher (KeywordMatcher, optional): The phrases and patterns to
+                look for in chat messages and PMs, shared by every plugin.
+                Each message is checked once, and what was found is put in
+                its matches attribute. Defaults to None, which starts with
+                an empty matcher plugins can add to.
+            user_registry (UserRegistry, optional): Interns the users of the
+                messages received, so each room's messages and user list
+                share one User per user. Defaults to None, which makes a
+                new registry for this client.
         """
         self.conn = connection.Connection(url, ssl_context=ssl_context)
         self.username = username
         self.password = password
         self.login_type = login_type
+        self.lazy_parsing = lazy_parsing
+        self.user_registry = UserRegistry() if user_registry is None else user_registry
+        self.batch_parsing = batch_parsing
         self.connected = False
         self.cookies: Optional[AbstractCookieJar] = None
-        self.plugins: List["BasePlugin"] = []
+        self._plugins = PluginList()
+        # message class -> [(plugin, whether match() must be called)]
+        self._routes: Dict[type, List[Tuple["BasePlugin", bool]]] = {}
+        # command name -> [(plugin, the command's main name)]
+        self._commands: Dict[str, List[Tuple["CommandPlugin", str]]] = {}
+        self.command_prefixes = command_prefixes
+        self.matcher = KeywordMatcher() if matcher is None else matcher
+        # replaced rather than changed, so it can be iterated over while
+        # subscriptions come and go
+        self._subscriptions: Tuple[Subscription, ...] = ()
+        # the version of the plugins _routes and _commands were built for
+        self._routed_version = -1
+        # responses of unordered plugins still running
+        self._plugin_tasks: Set["asyncio.Task[None]"] = set()
         self.rooms: Dict[str, "Room"] = {}
         self.logging_in: bool = False
         self.backoff: int = 1
+        if rate_limiter is None:
+            rate_limiter = AdaptiveTokenBucket(
+                1 / THROTTLE, BURST, max_rate=1 / min_throttle
+            )
+        self.rate_limiter = rate_limiter
+        self.trusted_throttle = trusted_throttle
+        self.wire_log = WireLog() if wire_log is None else wire_log
+        self.metrics = ClientMetrics()
+        self.metrics.outbound_depth.set_function(lambda: self.queue.qsize())
+        self.metrics.rooms.set_function(lambda: len(self.rooms))
+        self.metrics.users.set_function(
+            lambda: sum(len(r.users) for r in list(self.rooms.values()))
+        )
+        self.metrics_port = metrics_port
+        self.metrics_server: Optional[MetricsServer] = None
+        # metric children, cached to keep lookups off the hot path
+        self._line_counters: Dict[type, CounterValue] = {}
+        self.plugin_timeout = plugin_timeout
+        self._plugin_stats: Dict["BasePlugin", PluginStats] = {}
+        self.executors = {
+            THREAD: PluginExecutor(THREAD, thread_workers),
+            PROCESS: PluginExecutor(PROCESS, process_workers),
+        }
+        for kind, executor in self.executors.items():
+            self.metrics.executor_pending.labels(kind).set_function(
+                lambda executor=executor: executor.pending
+            )
+            self.metrics.executor_workers.labels(kind).set_function(
+                lambda executor=executor: executor.workers
+            )
+        # our rank in each room, and globally
+        self.ranks: Dict[str, str] = {}
+        self.global_rank = " "
+        # rooms where we're trusted, with their own limiters
+        self._room_limiters: Dict[str, RateLimiter] = {}
+        self.queue = OutboundQueue()
+        # the last message sent to each room, in case the server rejects it
+        # and when it was sent
+        self._last_sent: Dict[str, Tuple[float, OutboundMessage]] = {}
+        self.coalesce = coalesce
+        self.coalesce_max_lines = coalesce_max_lines
+        self.coalesce_max_bytes = coalesce_max_bytes
+        self.inbound = InboundPipeline(
+            self.handle_frame if batch_parsing else self.handle_message,
+            maxsize=inbound_queue_size,
+            workers=inbound_workers,
+            overflow=inbound_overflow,
+            on_error=self._inbound_error,
+        )
         self._setup_plugin_paths()
         self._load_system_plugins()
 
@@ -59,10 +326,25 @@ class Client:
 
     def _load_system_plugins(self) -> None:
         """Load the default system plugins required for basic functionality."""
-        system_plugins = ["challstr", "init", "deinit", "title", "users"]
+        system_plugins = ["challstr", "init", "deinit", "title", "users", "throttle"]
         for plugin_name in system_plugins:
             self.load_plugin(plugin_name)
 
+    @property
+    def plugins(self) -> PluginList:
+        """The loaded plugins, in the order they see messages.
+
+        Returns:
+            PluginList: The plugins. Changes to it, or assigning a new list,
+                take effect from the next message handled.
+        """
+        return self._plugins
+
+    @plugins.setter
+    def plugins(self, plugins: List["BasePlugin"]) -> None:
+        self._plugins = PluginList(plugins)
+        self._routed_version = -1
+
     def load_plugin(self, plugin_name: str) -> bool:
         """Load a single plugin by name.
 
@@ -84,6 +366,7 @@ class Client:
             return True
         except Exception as e:
             self.print(f"Error loading plugin {plugin_name}: {e}")
+            logger.debug("Error loading plugin %s", plugin_name, exc_info=e)
             return False
 
     async def connect(self) -> None:
@@ -98,14 +381,25 @@ class Client:
         # Keep a reference to the message-queue consumer task so callers
         # can cancel it explicitly during shutdown.
         self._message_queue_task = asyncio.create_task(self.start_message_queue())
+        self.inbound.start()
+        if self.metrics_port is not None and self.metrics_server is None:
+            self.metrics_server = MetricsServer(
+                self.metrics.registry, port=self.metrics_port
+            )
+            await self.metrics_server.start()
+        attempts = 0
         while not self.connected:
             try:
+                if attempts:
+                    self.metrics.reconnects.inc()
+                attempts += 1
+                self.metrics.backoff_seconds.set(self.backoff)
                 await asyncio.sleep(self.backoff)
                 await self.connect()
                 self.connected = True
                 await self.receive_forever()
             except Exception as e:
-                self.print(e)
+                logger.error("Connection error: %s", e)
             self.backoff *= 2
 
     async def close(self) -> None:
@@ -124,82 +418,267 @@ class Client:
                 # ignore failures while cancelling
                 pass
 
+        await self.inbound.stop()
+        for subscription in self._subscriptions:
+            subscription.close()
+        if self.metrics_server is not None:
+            await self.metrics_server.close()
+            self.metrics_server = None
+        for plugin_task in list(self._plugin_tasks):
+            plugin_task.cancel()
+        await asyncio.gather(*self._plugin_tasks, return_exceptions=True)
+        for executor in self.executors.values():
+            executor.shutdown()
         await self.conn.close()
 
     async def start_message_queue(self) -> None:
         """Starts the message queue."""
-        # Create the queue used for outgoing messages. The consumer will
-        # handle cancellation and loop-closed situations so that shutdown
-        # can proceed without background tasks scheduling callbacks on a
-        # closed loop.
-        self.queue = asyncio.Queue()
+        # The consumer handles cancellation and loop-closed situations so
+        # that shutdown can proceed without background tasks scheduling
+        # callbacks on a closed loop.
         try:
             while True:
                 try:
-                    m = await self.queue.get()
+                    await self.queue.wait()
+                    try:
+                        # rooms with a token to spare take their turn,
+                        # the others keep theirs
+                        m = self.queue.get_nowait(self._try_acquire)
+                    except asyncio.QueueEmpty:
+                        self.metrics.send_stalls.inc()
+                        await self.queue.wait_put(self._send_delay())
+                        continue
+                    self.metrics.outbound_wait_seconds.observe(
+                        self.queue.clock() - m.enqueued
+                    )
+                    if self.coalesce:
+                        m = self.queue.coalesce(
+                            m, self.coalesce_max_lines, self.coalesce_max_bytes
+                        )
                 except asyncio.CancelledError:
                     # Consumer was cancelled, exit cleanly.
                     break
+                except asyncio.QueueEmpty:
+                    continue
                 except RuntimeError:
                     # Event loop is likely closed, stop the consumer.
                     break
 
                 # If the loop is closing, avoid scheduling work.
                 try:
-                    self.print(">> " + m)
-                    await self.conn.send(m)
+                    self.wire_log.log(OUTBOUND, m.room, m.message)
+                    await self.conn.send(m.frame)
+                    self._last_sent[m.room] = (self.queue.clock(), m)
+                    self.metrics.outbound_messages.inc()
+                    self.limiter_for(m.room).sent()
                 except asyncio.CancelledError:
                     break
                 except RuntimeError:
                     # Underlying event loop closed while sending.
                     break
-
-                try:
-                    await asyncio.sleep(THROTTLE)
-                except asyncio.CancelledError:
-                    break
         finally:
-            # Best-effort cleanup: if queue still exists, drain it to
-            # avoid leaving producers blocked on put().
-            try:
-                while not self.queue.empty():
-                    try:
-                        self.queue.get_nowait()
-                    except Exception:
-                        break
-            except Exception:
-                pass
+            # Best-effort cleanup: drop anything still queued so it isn't
+            # sent on a later connection.
+            self.queue.clear()
 
-    async def send(self, room: str, message: str) -> None:
-        """Sends message to the server.
+    def limiter_for(self, room: str) -> RateLimiter:
+        """Returns the rate limiter for messages sent to a room.
 
         Args:
-            message (str): The message to send.
+            room (str): The room ID, or "" for global commands.
+
+        Returns:
+            RateLimiter: The room's own limiter if we're trusted there,
+                rate_limiter otherwise.
         """
-        m = f"{room}|{message}"
-        # If the queue hasn't been created yet (not connected), try to
-        # create it or raise a clear error. This avoids scheduling put()
-        # on a nonexistent/closed loop.
-        if not hasattr(self, "queue") or self.queue is None:
-            # Create a local queue so callers won't error if the consumer
-            # hasn't started yet. The keep_connected logic normally starts
-            # the consumer before connecting, so this is defensive.
-            self.queue = asyncio.Queue()
+        return self._room_limiters.get(room, self.rate_limiter)
 
-        try:
-            await self.queue.put(m)
-        except RuntimeError:
-            # Event loop is closed; ignore the send request.
+    def rank(self, room: str) -> str:
+        """Returns our effective rank in a room.
+
+        Args:
+            room (str): The room ID, or "" for our global rank.
+
+        Returns:
+            str: The higher of our rank in the room and our global rank.
+        """
+        rank = self.ranks.get(room, " ")
+        if RANK_ORDER.get(self.global_rank, 999) < RANK_ORDER.get(rank, 999):
+            return self.global_rank
+        return rank
+
+    def set_rank(self, room: str, rank: Optional[str]) -> None:
+        """Records our rank in a room, and picks the room's rate limiter.
+
+        Args:
+            room (str): The room ID.
+            rank (str, optional): Our rank in the room, or None if we left
+                the room.
+        """
+        if rank is None:
+            self.ranks.pop(room, None)
+        else:
+            self.ranks[room] = rank
+        self._update_limiter(room)
+
+    def set_global_rank(self, rank: str) -> None:
+        """Records our global rank, and picks every room's rate limiter.
+
+        Args:
+            rank (str): Our global rank.
+        """
+        self.global_rank = rank
+        for room in ["", *self.ranks, *self._room_limiters]:
+            self._update_limiter(room)
+
+    def _update_limiter(self, room: str) -> None:
+        """Gives a room its own rate limiter if we're trusted there.
+
+        Args:
+            room (str): The room ID.
+        """
+        if self.trusted_throttle is not None and is_trusted_rank(self.rank(room)):
+            if room not in self._room_limiters:
+                self._room_limiters[room] = AdaptiveTokenBucket(
+                    1 / self.trusted_throttle, BURST
+                )
+        else:
+            self._room_limiters.pop(room, None)
+
+    def is_self(self, user_id: str) -> bool:
+        """Returns True if the user ID is ours.
+
+        Args:
+            user_id (str): The user ID.
+
+        Returns:
+            bool: True if the ID is ours, False otherwise.
+        """
+        return user_id == to_id(self.username)
+
+    def throttled(self, room: str) -> None:
+        """Handles the server rejecting a message for being sent too fast.
+
+        Slows down the room's rate limiter and queues the last message sent to the
+        room again, if it was sent in the last RETRY_WINDOW seconds and hasn't
+        been retried MAX_RETRIES times already. Notices without a room are
+        about the last global message, such as a PM. The notice doesn't say
+        which message was rejected, so if more were sent to the room before
+        it arrived, the last of those is retried instead.
+
+        Args:
+            room (str): The room the server's notice came from.
+        """
+        self.metrics.throttled.inc()
+        self.limiter_for(room).throttled()
+        last = self._last_sent.pop(room, None)
+        if last is None:
+            return
+        sent, m = last
+        if self.queue.clock() - sent > RETRY_WINDOW:
             return
+        if m.attempts >= MAX_RETRIES:
+            logger.warning(
+                "Giving up on message to %s: %s", m.room or "global", m.message
+            )
+            return
+        self.queue.retry(m)
+
+    def _try_acquire(self, room: str) -> bool:
+        """Takes a token from the room's rate limiter, if it has one.
+
+        Args:
+            room (str): The room ID.
+
+        Returns:
+            bool: True if a message may be sent to the room now.
+        """
+        return self.limiter_for(room).try_acquire()
+
+    def _send_delay(self) -> float:
+        """Returns how long until a message may be sent to a queued room.
+
+        Returns:
+            float: The delay in seconds.
+        """
+        rooms = self.queue.rooms()
+        return min((self.limiter_for(room).delay() for room in rooms), default=0.0)
+
+    async def send(
+        self, room: str, message: str, priority: Priority = Priority.INTERACTIVE
+    ) -> None:
+        """Sends message to the server.
 
-    async def send_pm(self, user: str, message: str) -> None:
+        Args:
+            room (str): The room to send the message to.
+            message (str): The message to send.
+            priority (Priority, optional): The priority of the message.
+                Defaults to Priority.INTERACTIVE.
+        """
+        self.queue.put(room, message, priority)
+
+    async def send_pm(
+        self, user: str, message: str, priority: Priority = Priority.INTERACTIVE
+    ) -> None:
         """Sends a private message to the user.
 
+        Multi-line messages are sent with one /w per line, in as few frames
+        as fit within coalesce_max_lines and coalesce_max_bytes.
+
         Args:
             user (str): The user to send the message to.
             message (str): The message to send.
+            priority (Priority, optional): The priority of the message.
+                Defaults to Priority.INTERACTIVE.
+        """
+        lines = [f"/w {user}, {line}" for line in message.split("\n")]
+        for msg in join_lines(
+            "", lines, self.coalesce_max_lines, self.coalesce_max_bytes
+        ):
+            await self.send("", msg, priority)
+
+    async def send_uhtml(
+        self,
+        room: str,
+        name: str,
+        html: str,
+        priority: Priority = Priority.INTERACTIVE,
+    ) -> None:
+        """Adds a uhtml box to the room, or replaces it if it exists.
+
+        If an update to the same box is still queued, it's replaced with
+        this one rather than both being sent.
+
+        Args:
+            room (str): The room to send the box to.
+            name (str): The name of the box.
+            html (str): The HTML to show.
+            priority (Priority, optional): The priority of the message.
+                Defaults to Priority.INTERACTIVE.
+        """
+        await self.send(room, f"{ADD_UHTML} {name}, {html}", priority)
+
+    async def change_uhtml(
+        self,
+        room: str,
+        name: str,
+        html: str,
+        priority: Priority = Priority.INTERACTIVE,
+    ) -> None:
+        """Changes the HTML of a uhtml box in place.
+
+        If an update to the same box is still queued, it's replaced with
+        this one, and if the HTML is the same as the last update sent,
+        nothing is sent.
+
+        Args:
+            room (str): The room the box is in.
+            name (str): The name of the box.
+            html (str): The HTML to show.
+            priority (Priority, optional): The priority of the message.
+                Defaults to Priority.INTERACTIVE.
         """
-        await self.send("", f"/w {user}, {message}")
+        await self.send(room, f"{CHANGE_UHTML} {name}, {html}", priority)
 
     async def receive(self) -> aiohttp.WSMessage:
         """Receives data from the server.
@@ -220,21 +699,16 @@ class Client:
         try:
             async for ws_message in self.conn.ws:
                 if ws_message.type == aiohttp.WSMsgType.TEXT:
-                    message: str = ws_message.data
-                    if message:
-                        # some messages are actually multiple messages
-                        # separated by a newline
-                        messages = message.split("\n")
-                        if messages and messages[0] and messages[0][0] == ">":
-                            room = messages.pop(0)[1:]
-                        else:
-                            room = ""
-
-                        for single_message in messages:
-                            if single_message:
-                                asyncio.create_task(
-                                    self.handle_message(room, single_message)
-                                )
+                    # some messages are actually multiple messages
+                    # separated by a newline
+                    if self.batch_parsing:
+                        room, lines = frame_room(ws_message.data)
+                        if lines:
+                            await self.inbound.put(room, lines)
+                        continue
+                    for room, line in split_frame(ws_message.data):
+                        # blocks while the inbound queue is full
+                        await self.inbound.put(room, line)
         finally:
             self.print("Connection closed.")
             await self.conn.close()
@@ -243,16 +717,83 @@ class Client:
     async def handle_message(self, room: str, msg_str: str) -> None:
         """Handles a message from the server.
 
-        Iterates through all the loaded plugins, determines whether
-        any of them can handle the message, and if so, calls the
-        response method of the plugin.
+        Parses the message, and passes it to the subscriptions and plugins.
 
         Args:
             room (str): The room the message was sent from.
             msg_str (str): The message received.
         """
-        self.print("<< " + msg_str)
-        m = message.parse_message(room, msg_str)
+        self.wire_log.log(INBOUND, room, msg_str)
+        start = time.perf_counter()
+        m = message.parse_message(
+            room, msg_str, lazy=self.lazy_parsing, users=self.user_registry
+        )
+        self.metrics.parse_seconds.observe(time.perf_counter() - start)
+        await self._dispatch(m)
+
+    async def handle_frame(self, room: str, lines: str) -> None:
+        """Handles the lines of a frame from the server, parsed together.
+
+        An error handling one line is reported, and the rest of the lines
+        are still handled.
+
+        Args:
+            room (str): The room the lines were sent from.
+            lines (str): The lines received, separated by newlines.
+        """
+        line_list = [line for line in lines.split("\n") if line]
+        if not line_list:
+            return
+        for line in line_list:
+            self.wire_log.log(INBOUND, room, line)
+        start = time.perf_counter()
+        try:
+            messages = message.parse_messages(
+                room, line_list, lazy=self.lazy_parsing, users=self.user_registry
+            )
+        except Exception:
+            # find the bad lines, and handle the others
+            for line in line_list:
+                try:
+                    m = message.parse_message(
+                        room, line, lazy=self.lazy_parsing, users=self.user_registry
+                    )
+                    await self._dispatch(m)
+                except Exception as e:
+                    self._inbound_error(room, line, e)
+            return
+        per_line = (time.perf_counter() - start) / len(messages)
+        for m in messages:
+            self.metrics.parse_seconds.observe(per_line)
+            try:
+                await self._dispatch(m)
+            except Exception as e:
+                self._inbound_error(room, m.message_str, e)
+
+    async def _dispatch(self, m: message.Message) -> None:
+        """Passes a parsed message to the subscriptions and plugins.
+
+        Iterates through the loaded plugins which handle this type of
+        message, determines whether any of them can handle the message,
+        and if so, calls the response method of the plugin.
+
+        Args:
+            m (message.Message): The message.
+        """
+        room = m.room
+        counter = self._line_counters.get(type(m))
+        if counter is None:
+            counter = self._line_counters[type(m)] = self.metrics.inbound_lines.labels(
+                type(m).__name__
+            )
+        counter.inc()
+
+        if self.matcher and isinstance(m, (message.ChatMessage, message.PMMessage)):
+            m.matches = self.matcher.match(m.message)
+
+        for subscription in self._subscriptions:
+            if subscription.wants(m):
+                await subscription.put(m)
 
         is_old_message = False
         if isinstance(m, message.ChatMessage):
@@ -263,48 +804,380 @@ class Client:
                         # sent before we got here
                         is_old_message = True
 
-        for plugin in self.plugins:
+        for plugin, needs_match in self._routes_for(type(m)):
             if is_old_message and not plugin.scrollback_access:
                 continue
-            try:
-                matched = await plugin.match(m)
-                if matched:
-                    resp = await plugin.response(m)
-                    if resp:
-                        if isinstance(m, message.PMMessage):
-                            await self.send_pm(m.user.name, resp)
-                        else:
-                            await self.send(m.room, resp)
-            except Exception as e:
-                plg = plugin.__class__.__name__
-                self.print("Error handling message in plugin {}: {}".format(plg, e))
-                msg = str(e) + ": " + e.__doc__ if e.__doc__ is not None else str(e)
-                self.print(msg)
+            if plugin.rooms is not None and m.room not in plugin.rooms:
+                continue
+            if plugin.ordered:
+                await self._run_plugin(plugin, m, needs_match)
+            else:
+                task = asyncio.create_task(self._run_plugin(plugin, m, needs_match))
+                self._plugin_tasks.add(task)
+                task.add_done_callback(self._plugin_tasks.discard)
+
+        if isinstance(m, (message.ChatMessage, message.PMMessage)):
+            await self._route_command(m, is_old_message)
+
+    def stream(
+        self,
+        *message_types: Type[message.Message],
+        room: Optional[str] = None,
+        maxsize: int = 100,
+        overflow: str = "block",
+    ) -> Subscription:
+        """Subscribes to the messages received, to consume with async for.
+
+        For example::
+
+            async with client.stream(ChatMessage, room="lobby") as chat:
+                async for m in chat:
+                    ...
+
+        Each message is parsed once, and put into every subscription that
+        wants it before the plugins see it. The subscription is closed,
+        ending the iteration, when the client is closed.
+
+        Args:
+            *message_types (Type[message.Message]): The message classes to
+                stream. Defaults to every message.
+            room (str, optional): The room to stream messages from. Defaults
+                to None, which streams every room.
+            maxsize (int, optional): The most messages to buffer. Defaults
+                to 100.
+            overflow (str, optional): What to do with a new message when the
+                buffer is full: "block" waits for space, which holds up the
+                room's messages, "drop-oldest" discards the oldest buffered
+                message and "drop-newest" the new one. Defaults to "block".
+
+        Returns:
+            Subscription: The subscription. Close it to unsubscribe.
+        """
+        subscription = Subscription(
+            message_types,
+            None if room is None else (room,),
+            maxsize=maxsize,
+            overflow=overflow,
+            on_close=self._unsubscribe,
+        )
+        self._subscriptions += (subscription,)
+        return subscription
+
+    def _unsubscribe(self, subscription: Subscription) -> None:
+        """Stops putting messages into a subscription.
+
+        Args:
+            subscription (Subscription): The subscription, which was closed.
+        """
+        self._subscriptions = tuple(
+            other for other in self._subscriptions if other is not subscription
+        )
+
+    async def _route_command(
+        self, m: Union[message.ChatMessage, message.PMMessage], is_old_message: bool
+    ) -> None:
+        """Runs the command plugins registered for a chat command.
+
+        Args:
+            m (Union[message.ChatMessage, message.PMMessage]): The message.
+            is_old_message (bool): Whether it was sent before we joined.
+        """
+        parsed = parse_command(m.message, self.command_prefixes)
+        if parsed is None:
+            return
+        name, argument = parsed
+        # handle_message has just refreshed the table, via _routes_for()
+        routes = self._commands.get(name)
+        if not routes:
+            return
+        user = m.user
+        if user is None or self.is_self(user.id):
+            return
+
+        is_pm = isinstance(m, message.PMMessage)
+        for plugin, main_name in routes:
+            if is_old_message and not plugin.scrollback_access:
+                continue
+            if is_pm:
+                if not plugin.pm:
+                    continue
+            elif plugin.rooms is not None and m.room not in plugin.rooms:
+                continue
+            if not plugin.allows(user.rank):
+                continue
+            command = Command(main_name, name, argument)
+            if plugin.ordered:
+                await self._run_plugin(plugin, m, False, command)
+            else:
+                task = asyncio.create_task(self._run_plugin(plugin, m, False, command))
+                self._plugin_tasks.add(task)
+                task.add_done_callback(self._plugin_tasks.discard)
+
+    async def _run_plugin(
+        self,
+        plugin: "BasePlugin",
+        m: message.Message,
+        needs_match: bool,
+        command: Optional[Command] = None,
+    ) -> None:
+        """Runs a plugin on a message, and sends its response if any.
+
+        Args:
+            plugin (BasePlugin): The plugin to run.
+            m (message.Message): The message.
+            needs_match (bool): Whether to check plugin.match() first.
+            command (Command, optional): The command to give a CommandPlugin.
+                Defaults to None.
+        """
+        stats = self._plugin_stats.get(plugin)
+        if stats is None:
+            stats = self.plugin_stats(plugin)
+        breaker = stats.breaker
+        if not breaker.allow():
+            stats.skipped.inc()
+            return
+        try:
+            if needs_match:
+                start = time.perf_counter()
+                matched = await self._call_plugin(
+                    plugin.match(m), self._timeout(plugin.match_timeout)
+                )
+                stats.match_seconds.observe(time.perf_counter() - start)
+                if not matched:
+                    # says nothing about whether the plugin is working
+                    breaker.release()
+                    return
+            start = time.perf_counter()
+            if plugin.executor is not None:
+                call = self._run_blocking(plugin, m)
+            elif command is not None:
+                call = plugin.command(m, command)  # type: ignore[attr-defined]
+            else:
+                call = plugin.response(m)
+            resp = await self._call_plugin(call, self._timeout(plugin.response_timeout))
+            stats.response_seconds.observe(time.perf_counter() - start)
+            breaker.record_success()
+            if isinstance(resp, list):
+                await self._send_lines(m, resp)
+            elif resp:
+                await self._send_lines(m, [resp])
+        except asyncio.TimeoutError as e:
+            stats.timeouts.inc()
+            stats.last_error = e
+            breaker.record_failure()
+            logger.warning("Plugin %s timed out", stats.name)
+        except Exception as e:
+            stats.errors.inc()
+            stats.last_error = e
+            breaker.record_failure()
+            logger.error(
+                "Error handling message in plugin %s: %s", stats.name, e, exc_info=e
+            )
+
+    async def _send_lines(self, m: message.Message, lines: List[str]) -> None:
+        """Sends a plugin's lines in reply to a message.
+
+        The lines go out together, in as few frames as fit within
+        coalesce_max_lines and coalesce_max_bytes. Lines containing
+        newlines are split first, so they can be spread over frames too.
+
+        Args:
+            m (message.Message): The message the plugin replied to.
+            lines (List[str]): The lines.
+        """
+        if isinstance(m, message.PMMessage):
+            await self.send_pm(m.user.name, "\n".join(lines))
+            return
+        lines = [line for resp in lines for line in resp.split("\n")]
+        for msg in join_lines(
+            m.room, lines, self.coalesce_max_lines, self.coalesce_max_bytes
+        ):
+            await self.send(m.room, msg)
+
+    async def _run_blocking(
+        self, plugin: "BasePlugin", m: message.Message
+    ) -> Optional[Union[str, List[str]]]:
+        """Calls a plugin's blocking() in the pool it asks for.
+
+        Args:
+            plugin (BasePlugin): The plugin.
+            m (message.Message): The message.
+
+        Raises:
+            ValueError: If the plugin's executor isn't "thread" or "process".
+
+        Returns:
+            Optional[Union[str, List[str]]]: The plugin's response.
+        """
+        executor = self.executors.get(plugin.executor or "")
+        if executor is None:
+            raise ValueError(f"unknown executor {plugin.executor!r}.")
+        if executor.kind == PROCESS:
+            # pickling copies the message anyway
+            return await executor.run(plugin.blocking, m)
+        return await executor.run(plugin.blocking, m.snapshot())
+
+    def _timeout(self, timeout: Union[float, None, DefaultTimeout]) -> Optional[float]:
+        """Returns the timeout to use for a plugin's timeout setting.
+
+        Args:
+            timeout (Union[float, None, DefaultTimeout]): The plugin's
+                match_timeout or response_timeout.
+
+        Returns:
+            Optional[float]: The timeout in seconds, or None for no timeout.
+        """
+        if timeout is DefaultTimeout.CLIENT:
+            return self.plugin_timeout
+        return timeout
+
+    @staticmethod
+    async def _call_plugin(call: Awaitable[T], timeout: Optional[float]) -> T:
+        """Awaits a plugin call, with a timeout if given.
+
+        Args:
+            call (Awaitable[T]): The plugin's match() or response() call.
+            timeout (float, optional): The timeout in seconds, or None.
+
+        Raises:
+            asyncio.TimeoutError: If the call takes longer than the timeout.
+
+        Returns:
+            T: The result of the call.
+        """
+        if timeout is None:
+            return await call
+        return await asyncio.wait_for(call, timeout)
+
+    def plugin_stats(self, plugin: "BasePlugin") -> PluginStats:
+        """Returns a plugin's timings, failure counts and circuit breaker.
+
+        Args:
+            plugin (BasePlugin): The plugin.
 
-    async def join(self, room: str) -> None:
+        Returns:
+            PluginStats: The plugin's stats.
+        """
+        stats = self._plugin_stats.get(plugin)
+        if stats is None:
+            name = type(plugin).__name__
+            stats = self._plugin_stats[plugin] = PluginStats(
+                name,
+                CircuitBreaker(plugin.failure_threshold, plugin.cooldown),
+                self.metrics.plugin_seconds.labels(name, "match"),
+                self.metrics.plugin_seconds.labels(name, "response"),
+                self.metrics.plugin_errors.labels(name),
+                self.metrics.plugin_timeouts.labels(name),
+                self.metrics.plugin_skipped.labels(name),
+            )
+        return stats
+
+    def all_plugin_stats(self) -> List[PluginStats]:
+        """Returns the stats of every loaded plugin.
+
+        Returns:
+            List[PluginStats]: The stats, in load order.
+        """
+        return [self.plugin_stats(plugin) for plugin in self.plugins]
+
+    def _routes_for(
+        self, message_type: Type[message.Message]
+    ) -> List[Tuple["BasePlugin", bool]]:
+        """Returns the plugins which may handle messages of the given class.
+
+        The result is cached per message class, and rebuilt whenever
+        plugins are added, removed, replaced or reordered. Plugins are returned in load order,
+        along with whether their match() method needs to be called, which
+        is only the case for plugins that don't declare message_types or
+        that override BasePlugin.match.
+
+        Args:
+            message_type (Type[message.Message]): The class of the message.
+
+        Returns:
+            List[Tuple[BasePlugin, bool]]: The plugins, and whether to call
+                their match() method.
+        """
+        if self._plugins.version != self._routed_version:
+            self._routes.clear()
+            self._routed_version = self._plugins.version
+            self._build_commands()
+
+        routes = self._routes.get(message_type)
+        if routes is None:
+            from pyshowdown.plugins.plugin import BasePlugin, CommandPlugin
+
+            routes = []
+            for plugin in self.plugins:
+                if isinstance(plugin, CommandPlugin):
+                    # routed by command name instead
+                    continue
+                if plugin.message_types is None:
+                    routes.append((plugin, True))
+                elif issubclass(message_type, plugin.message_types):
+                    overridden = type(plugin).match is not BasePlugin.match
+                    routes.append((plugin, overridden))
+            self._routes[message_type] = routes
+        return routes
+
+    def _build_commands(self) -> None:
+        """Rebuilds the table of command names to CommandPlugins."""
+        from pyshowdown.plugins.plugin import CommandPlugin
+
+        self._commands = {}
+        for plugin in self.plugins:
+            if isinstance(plugin, CommandPlugin):
+                for name, main_name in plugin.names().items():
+                    self._commands.setdefault(name, []).append((plugin, main_name))
+
+    def _inbound_error(self, room: str, msg_str: str, e: Exception) -> None:
+        """Reports an error raised while handling a received line.
+
+        Args:
+            room (str): The room the message was sent from.
+            msg_str (str): The message received.
+            e (Exception): The error.
+        """
+        logger.error(
+            "Error handling message %r in room %r: %s", msg_str, room, e, exc_info=e
+        )
+
+    async def join(self, room: str, priority: Priority = Priority.CONTROL) -> None:
         """Joins the given room.
 
         Args:
             room (str): The room to join.
+            priority (Priority, optional): The priority of the command.
+                Defaults to Priority.CONTROL.
         """
-        await self.send("", f"/join {room}")
+        await self.send("", f"/join {room}", priority)
 
-    async def leave(self, room: str) -> None:
+    async def leave(self, room: str, priority: Priority = Priority.CONTROL) -> None:
         """Leaves the given room.
 
         Args:
             room (str): The room to leave.
+            priority (Priority, optional): The priority of the command.
+                Defaults to Priority.CONTROL.
         """
-        await self.send(room, "/leave")
+        await self.send(room, "/leave", priority)
 
     @staticmethod
     def print(msg) -> None:
-        """Prints a message. Intended to be possible to be overridden.
+        """Logs a status message to the pyshowdown logger at INFO.
+
+        Intended to be possible to be overridden. Until logging is set up,
+        e.g. with setup_logging() or logging.basicConfig(), the logger has
+        no handlers, so the message is printed to stdout instead. Errors
+        and warnings are logged to the logger directly, at their own levels.
 
         Args:
             msg (str): The message to be printed.
         """
-        print(msg)
+        if logger.hasHandlers():
+            logger.info("%s", msg)
+        else:
+            print(msg)
 
     def __str__(self) -> str:
         """Returns a string representation of the client.
@@ -0,0 +1,45 @@
+from typing import Optional, Tuple
+
+
+class Command:
+    __slots__ = ("name", "alias", "argument", "args")
+
+    def __init__(self, name: str, alias: str, argument: str):
+        """A chat command, as invoked.
+
+        Args:
+            name (str): The command's main name.
+            alias (str): The name it was invoked with, lowercased.
+            argument (str): Everything after the name, stripped.
+        """
+        self.name = name
+        self.alias = alias
+        self.argument = argument
+        # PS commands take comma-separated arguments
+        self.args = [arg.strip() for arg in argument.split(",")] if argument else []
+
+    def __str__(self) -> str:
+        return "Command({}, {!r})".format(self.name, self.argument)
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+def parse_command(text: str, prefixes: str = "!") -> Optional[Tuple[str, str]]:
+    """Splits a chat line into a command name and its argument.
+
+    Args:
+        text (str): The chat message.
+        prefixes (str, optional): The characters commands start with.
+            Defaults to "!".
+
+    Returns:
+        Optional[Tuple[str, str]]: The lowercased command name and the
+            stripped argument, or None if the line isn't a command.
+    """
+    if not text or text[0] not in prefixes:
+        return None
+    name, _, argument = text[1:].partition(" ")
+    if not name:
+        return None
+    return name.lower(), argument.strip()
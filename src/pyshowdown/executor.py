@@ -0,0 +1,130 @@
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+THREAD = "thread"
+PROCESS = "process"
+
+
+class PluginExecutor:
+    def __init__(self, kind: str, max_workers: Optional[int] = None):
+        """A pool running blocking plugin code off the event loop.
+
+        The pool itself is only created when it's first used.
+
+        Args:
+            kind (str): THREAD for a ThreadPoolExecutor, or PROCESS for a
+                ProcessPoolExecutor. Functions and arguments given to a
+                process pool must be picklable.
+            max_workers (int, optional): The size of the pool. Defaults to
+                None, which uses the executor's default size.
+
+        Raises:
+            ValueError: If kind isn't THREAD or PROCESS, or max_workers is
+                less than 1.
+        """
+        if kind not in (THREAD, PROCESS):
+            raise ValueError(f"kind must be {THREAD!r} or {PROCESS!r}.")
+        if max_workers is not None and max_workers < 1:
+            raise ValueError("max_workers must be at least 1.")
+        self.kind = kind
+        self.max_workers = max_workers
+        self._pool: Optional[concurrent.futures.Executor] = None
+        # calls finish on other threads
+        self._lock = threading.Lock()
+        # calls submitted and not finished, whether running or waiting
+        self.pending = 0
+        self.completed = 0
+        self.max_pending = 0
+
+    @property
+    def workers(self) -> int:
+        """The size of the pool, once it has been created, 0 before that."""
+        if self._pool is None:
+            return 0
+        # both executors keep their size here
+        return self._pool._max_workers  # type: ignore[attr-defined]
+
+    @property
+    def saturation(self) -> float:
+        """Pending calls per worker. Above 1, calls are waiting for a worker."""
+        workers = self.workers
+        return self.pending / workers if workers else 0.0
+
+    def _get_pool(self) -> concurrent.futures.Executor:
+        """Returns the pool, creating it if needed.
+
+        Returns:
+            concurrent.futures.Executor: The pool.
+        """
+        if self._pool is None:
+            if self.kind == THREAD:
+                self._pool = concurrent.futures.ThreadPoolExecutor(
+                    self.max_workers, thread_name_prefix="pyshowdown-plugin"
+                )
+            else:
+                self._pool = concurrent.futures.ProcessPoolExecutor(self.max_workers)
+        return self._pool
+
+    async def run(self, function: Callable[..., T], *args: Any) -> T:
+        """Runs a function in the pool and waits for its result.
+
+        If the wait is cancelled, e.g. by a timeout, the function still
+        runs to completion in its worker, but its result is discarded.
+
+        Args:
+            function (Callable[..., T]): The function.
+            *args (Any): The arguments to call it with.
+
+        Returns:
+            T: The function's result.
+        """
+        with self._lock:
+            self.pending += 1
+            if self.pending > self.max_pending:
+                self.max_pending = self.pending
+        try:
+            future = self._get_pool().submit(function, *args)
+        except BaseException:
+            self._done(None)
+            raise
+        # counted until the call really finishes, even if nobody waits for it
+        future.add_done_callback(self._done)
+        return await asyncio.wrap_future(future)
+
+    def _done(self, future: "Optional[concurrent.futures.Future[Any]]") -> None:
+        """Records that a call finished.
+
+        Args:
+            future (concurrent.futures.Future, optional): The call's future.
+        """
+        with self._lock:
+            self.pending -= 1
+            self.completed += 1
+
+    def shutdown(self) -> None:
+        """Shuts the pool down, without waiting for running calls."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def __str__(self) -> str:
+        """Returns a string representation of the executor.
+
+        Returns:
+            str: The string representation of the executor.
+        """
+        return "PluginExecutor({}, workers={}, pending={})".format(
+            self.kind, self.workers, self.pending
+        )
+
+    def __repr__(self) -> str:
+        """Returns a representation of the executor.
+
+        Returns:
+            str: The representation of the executor.
+        """
+        return self.__str__()
@@ -0,0 +1,249 @@
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+Handler = Callable[[str, str], Awaitable[None]]
+ErrorHandler = Callable[[str, str, Exception], None]
+
+OVERFLOW_POLICIES = ("block", "drop")
+
+
+def frame_room(frame: str) -> Tuple[str, str]:
+    """Splits the room header off a websocket frame.
+
+    A frame starting with ">ROOMID" holds lines from that room, otherwise
+    they're from the lobby or global.
+
+    Args:
+        frame (str): The frame, as received.
+
+    Returns:
+        Tuple[str, str]: The room, and the rest of the frame.
+    """
+    if frame.startswith(">"):
+        header, _, lines = frame.partition("\n")
+        return header[1:], lines
+    return "", frame
+
+
+def split_frame(frame: str) -> Iterator[Tuple[str, str]]:
+    """Splits a websocket frame into the lines it carries.
+
+    Lines are found one at a time, so a large frame, like a room's |init|
+    with its scrollback and user list, isn't copied into a list of every
+    line at once, and lines can be handled while the rest of the frame is
+    still waiting.
+
+    Args:
+        frame (str): The frame, as received.
+
+    Yields:
+        Tuple[str, str]: The room and each non-empty line.
+    """
+    room = ""
+    start = 0
+    if frame.startswith(">"):
+        start = frame.find("\n") + 1
+        if not start:
+            # just a room header
+            return
+        room = frame[1 : start - 1]
+    find = frame.find
+    end = find("\n", start)
+    while end != -1:
+        if end > start:
+            yield room, frame[start:end]
+        start = end + 1
+        end = find("\n", start)
+    if start < len(frame):
+        yield room, frame[start:]
+
+
+class InboundPipeline:
+    def __init__(
+        self,
+        handler: Handler,
+        maxsize: int = 1000,
+        workers: int = 4,
+        overflow: str = "block",
+        on_error: Optional[ErrorHandler] = None,
+    ):
+        """A bounded set of per-room lanes of inbound lines, consumed by a
+        pool of workers.
+
+        Lines from the same room are handled one at a time, in the order
+        they were received. Lines from different rooms are handled
+        concurrently, with rooms taking turns so a busy room can't hold
+        up the others.
+
+        Args:
+            handler (Handler): The coroutine function handling a line,
+                called with the room and the line.
+            maxsize (int, optional): The maximum number of lines waiting to
+                be handled, across all rooms. Defaults to 1000.
+            workers (int, optional): The number of worker coroutines, and
+                so the number of rooms handled at once. Defaults to 4.
+            overflow (str, optional): What to do with a new line when the
+                queue is full: "block" waits for space, which stops the
+                socket reader, and "drop" discards the line. Defaults to
+                "block".
+            on_error (ErrorHandler, optional): Called with the room, line
+                and exception when the handler raises. Defaults to None.
+
+        Raises:
+            ValueError: If an argument is out of range.
+        """
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1.")
+        if workers < 1:
+            raise ValueError("workers must be at least 1.")
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+
+        self.handler = handler
+        self.maxsize = maxsize
+        self.workers = workers
+        self.overflow = overflow
+        self.on_error = on_error
+        self.dropped = 0
+        self.processed = 0
+        self.failed = 0
+        # room -> lines waiting to be handled. A room has a lane while it
+        # is either waiting in _ready or held by a worker.
+        self._lanes: Dict[str, Deque[str]] = {}
+        self._ready: Optional["asyncio.Queue[str]"] = None
+        self._space: Optional[asyncio.Semaphore] = None
+        self._idle: Optional[asyncio.Event] = None
+        self._depth = 0
+        self._unfinished = 0
+        self._tasks: List["asyncio.Task[None]"] = []
+
+    @property
+    def depth(self) -> int:
+        """The number of lines waiting to be handled."""
+        return self._depth
+
+    @property
+    def running(self) -> bool:
+        """Whether the workers have been started."""
+        return bool(self._tasks)
+
+    def lane_depths(self) -> Dict[str, int]:
+        """Returns the number of lines waiting to be handled, per room.
+
+        Returns:
+            Dict[str, int]: The number of waiting lines, keyed by room.
+        """
+        return {room: len(lane) for room, lane in self._lanes.items() if lane}
+
+    def start(self) -> None:
+        """Starts the worker coroutines, if they aren't running already."""
+        if self._tasks:
+            return
+        if self._ready is None:
+            self._ready = asyncio.Queue()
+            self._space = asyncio.Semaphore(self.maxsize)
+            self._idle = asyncio.Event()
+            self._idle.set()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        """Stops the workers and discards any lines still waiting.
+
+        Discarded lines are counted as dropped.
+        """
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        if self._ready is None:
+            return
+        assert self._space is not None and self._idle is not None
+
+        while not self._ready.empty():
+            self._ready.get_nowait()
+        for _ in range(self._depth):
+            self._space.release()
+        self.dropped += self._depth
+        self._lanes.clear()
+        self._depth = 0
+        self._unfinished = 0
+        self._idle.set()
+
+    async def put(self, room: str, line: str) -> None:
+        """Queues a line to be handled, starting the workers if needed.
+
+        Args:
+            room (str): The room the line was sent from.
+            line (str): The line.
+        """
+        if not self._tasks:
+            self.start()
+        assert self._ready is not None
+        assert self._space is not None and self._idle is not None
+
+        if self.overflow == "drop" and self._depth >= self.maxsize:
+            self.dropped += 1
+            return
+        await self._space.acquire()
+
+        lane = self._lanes.get(room)
+        if lane is None:
+            lane = self._lanes[room] = deque()
+            self._ready.put_nowait(room)
+        lane.append(line)
+        self._depth += 1
+        self._unfinished += 1
+        self._idle.clear()
+
+    async def join(self) -> None:
+        """Waits until every queued line has been handled."""
+        if self._idle is not None:
+            await self._idle.wait()
+
+    async def _work(self) -> None:
+        """Handles lines from the ready rooms until cancelled."""
+        ready, space, idle = self._ready, self._space, self._idle
+        assert ready is not None and space is not None and idle is not None
+
+        while True:
+            room = await ready.get()
+            lane = self._lanes[room]
+            line = lane.popleft()
+            self._depth -= 1
+            space.release()
+            try:
+                await self.handler(room, line)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                if self.on_error is not None:
+                    self.on_error(room, line, e)
+            finally:
+                self._unfinished -= 1
+                if not self._unfinished:
+                    idle.set()
+                if lane:
+                    # go to the back of the line, behind the other rooms
+                    ready.put_nowait(room)
+                elif self._lanes.get(room) is lane:
+                    del self._lanes[room]
+
+    def __str__(self) -> str:
+        """Returns a string representation of the pipeline.
+
+        Returns:
+            str: The string representation of the pipeline.
+        """
+        return "InboundPipeline(depth={}, workers={}, dropped={})".format(
+            self.depth, self.workers, self.dropped
+        )
+
+    def __repr__(self) -> str:
+        """Returns a representation of the pipeline.
+
+        Returns:
+            str: The representation of the pipeline.
+        """
+        return self.__str__()
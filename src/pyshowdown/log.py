@@ -0,0 +1,172 @@
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from typing import Collection, FrozenSet, Optional
+
+logger = logging.getLogger("pyshowdown")
+# every line sent and received, logged at DEBUG
+wire_logger = logging.getLogger("pyshowdown.wire")
+
+INBOUND = "in"
+OUTBOUND = "out"
+
+
+def message_type(direction: str, line: str) -> str:
+    """Returns the type of a line sent or received, for filtering.
+
+    Args:
+        direction (str): INBOUND or OUTBOUND.
+        line (str): The line received, or the message sent.
+
+    Returns:
+        str: For received lines, the protocol message type, e.g. "c", or
+            "raw" for lines without one. For sent messages, the command,
+            e.g. "/join", or "chat" for plain chat messages.
+    """
+    if direction == INBOUND:
+        if not line.startswith("|"):
+            return "raw"
+        return line[1:].partition("|")[0]
+    if line.startswith("/"):
+        return line.partition(" ")[0]
+    return "chat"
+
+
+class WireLog:
+    def __init__(
+        self,
+        directions: Collection[str] = (INBOUND, OUTBOUND),
+        types: Optional[Collection[str]] = None,
+        sample: int = 1,
+    ):
+        """Logs the lines a client sends and receives to wire_logger.
+
+        Nothing is logged unless wire_logger is enabled for DEBUG, e.g. by
+        setup_logging(wire=True), which costs one check per line.
+
+        Args:
+            directions (Collection[str], optional): The directions to log,
+                INBOUND and/or OUTBOUND. Defaults to both.
+            types (Collection[str], optional): The message types to log, as
+                returned by message_type(). Defaults to None, which logs
+                every type.
+            sample (int, optional): Log only every nth line which passes
+                the other filters. Defaults to 1, which logs every line.
+
+        Raises:
+            ValueError: If sample is less than 1.
+        """
+        if sample < 1:
+            raise ValueError("sample must be at least 1.")
+        self.directions: FrozenSet[str] = frozenset(directions)
+        self.types: Optional[FrozenSet[str]] = (
+            None if types is None else frozenset(types)
+        )
+        self.sample = sample
+        self._seen = 0
+
+    def log(self, direction: str, room: str, line: str) -> None:
+        """Logs a line, if it passes the filters.
+
+        Args:
+            direction (str): INBOUND or OUTBOUND.
+            room (str): The room the line was sent to or received from.
+            line (str): The line received, or the message sent.
+        """
+        if not wire_logger.isEnabledFor(logging.DEBUG):
+            return
+        if direction not in self.directions:
+            return
+        msg_type = message_type(direction, line)
+        if self.types is not None and msg_type not in self.types:
+            return
+        self._seen += 1
+        if self.sample > 1 and self._seen % self.sample:
+            return
+        wire_logger.debug(
+            "%s %s|%s",
+            "<<" if direction == INBOUND else ">>",
+            room,
+            line,
+            extra={"direction": direction, "room": room, "msg_type": msg_type},
+        )
+
+    def __str__(self) -> str:
+        """Returns a string representation of the wire log.
+
+        Returns:
+            str: The string representation of the wire log.
+        """
+        return "WireLog(directions={}, types={}, sample={})".format(
+            sorted(self.directions),
+            None if self.types is None else sorted(self.types),
+            self.sample,
+        )
+
+    def __repr__(self) -> str:
+        """Returns a representation of the wire log.
+
+        Returns:
+            str: The representation of the wire log.
+        """
+        return self.__str__()
+
+
+class _DeferredQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Queues records as they are, leaving formatting to the listener.
+
+        The default merges the arguments into the message, which would
+        format every record on the event loop.
+
+        Args:
+            record (logging.LogRecord): The record.
+
+        Returns:
+            logging.LogRecord: The same record.
+        """
+        return record
+
+
+def setup_logging(
+    level: int = logging.INFO,
+    *handlers: logging.Handler,
+    wire: bool = False,
+) -> QueueListener:
+    """Sends pyshowdown's logs to handlers on a background thread.
+
+    The event loop only puts records on a queue. A QueueListener thread
+    formats them and does the I/O, so slow terminals, pipes or files
+    don't block the client.
+
+    Args:
+        level (int, optional): The level to log at. Defaults to
+            logging.INFO.
+        *handlers (logging.Handler): The handlers to write to. Defaults to
+            a StreamHandler writing to stderr.
+        wire (bool, optional): Whether to log every line sent and received.
+            Defaults to False.
+
+    Returns:
+        QueueListener: The running listener. Call its stop() method on
+            shutdown to flush the remaining records.
+    """
+    if not handlers:
+        stream = logging.StreamHandler()
+        stream.setFormatter(
+            logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+        )
+        handlers = (stream,)
+
+    for handler in list(logger.handlers):
+        if isinstance(handler, _DeferredQueueHandler):
+            logger.removeHandler(handler)
+    records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    logger.addHandler(_DeferredQueueHandler(records))
+    logger.setLevel(level)
+    logger.propagate = False
+    wire_logger.setLevel(logging.DEBUG if wire else logging.WARNING)
+
+    listener = QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -0,0 +1,273 @@
+import re
+import warnings
+from collections import deque
+from typing import Dict, FrozenSet, Iterable, List, Optional, Pattern, Set, Tuple
+
+from pyshowdown.utils import text_to_id, to_id
+
+NO_MATCHES: FrozenSet[str] = frozenset()
+
+
+class KeywordMatcher:
+    def __init__(
+        self,
+        phrases: Iterable[str] = (),
+        patterns: Iterable[str] = (),
+        flags: int = re.IGNORECASE,
+    ):
+        """Finds which of many banned phrases and patterns a line contains.
+
+        Phrases are matched on the line's ID, as returned by to_id(), so
+        case, spaces and punctuation put in to dodge a filter don't matter:
+        the phrase "bad word" matches "B.A.D w-o-r-d". They're found with
+        an Aho-Corasick automaton, in one pass over the line however many
+        phrases there are.
+
+        Patterns are regular expressions, matched on the line as sent. Those
+        without groups are joined into one compiled regex, so lines matching
+        none of them, which is most lines, are rejected with a single
+        search. Patterns with groups are searched for one by one, since
+        joining them would renumber their backreferences and could repeat
+        group names.
+
+        The matcher is updated in place as phrases and patterns are added
+        and removed, and brought up to date on the next match() call.
+
+        Args:
+            phrases (Iterable[str], optional): Phrases to look for.
+                Defaults to none.
+            patterns (Iterable[str], optional): Regular expressions to look
+                for. Defaults to none.
+            flags (int, optional): The flags to compile patterns with.
+                Defaults to re.IGNORECASE.
+
+        Raises:
+            ValueError: If a phrase has no letters or digits.
+            re.error: If a pattern isn't a valid regular expression, or
+                sets global flags.
+        """
+        self.flags = flags
+        # the trie: transitions, and the phrases ending at each node
+        self._goto: List[Dict[str, int]] = [{}]
+        self._ends: List[Set[str]] = [set()]
+        # filled in by _build(): failure links, and every phrase found
+        # on reaching each node
+        self._fail: List[int] = [0]
+        self._out: List[FrozenSet[str]] = [NO_MATCHES]
+        self._phrases: Dict[str, int] = {}
+        self._patterns: Dict[str, Pattern[str]] = {}
+        # patterns with groups, which are left out of the combined regex
+        self._grouped: Dict[str, Pattern[str]] = {}
+        self._combined: Optional[Pattern[str]] = None
+        self._dirty = False
+        for phrase in phrases:
+            self.add_phrase(phrase)
+        for pattern in patterns:
+            self.add_pattern(pattern)
+
+    def add_phrase(self, phrase: str) -> None:
+        """Adds a phrase to look for.
+
+        Args:
+            phrase (str): The phrase. It's reported by match() as given.
+
+        Raises:
+            ValueError: If the phrase has no letters or digits.
+        """
+        if phrase in self._phrases:
+            return
+        key = to_id(phrase)
+        if not key:
+            raise ValueError(f"phrase {phrase!r} has no letters or digits.")
+        node = 0
+        for char in key:
+            nxt = self._goto[node].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][char] = nxt
+                self._goto.append({})
+                self._ends.append(set())
+            node = nxt
+        self._ends[node].add(phrase)
+        self._phrases[phrase] = node
+        self._dirty = True
+
+    def remove_phrase(self, phrase: str) -> bool:
+        """Stops looking for a phrase.
+
+        Args:
+            phrase (str): The phrase, as given to add_phrase().
+
+        Returns:
+            bool: True if the phrase was removed, False if it wasn't added.
+        """
+        node = self._phrases.pop(phrase, None)
+        if node is None:
+            return False
+        # the trie keeps its nodes, which other phrases may share
+        self._ends[node].discard(phrase)
+        self._dirty = True
+        return True
+
+    def add_pattern(self, pattern: str) -> None:
+        """Adds a regular expression to look for.
+
+        Args:
+            pattern (str): The regular expression. It's reported by match()
+                as given.
+
+        Raises:
+            re.error: If the pattern isn't a valid regular expression, or
+                sets global flags such as (?i). Pass flags to the matcher
+                instead.
+        """
+        if pattern in self._patterns:
+            return
+        # wrapped as it will be in the combined regex. Global flags there
+        # would apply to every pattern: Python 3.11 rejects them when not
+        # at the start, and earlier versions only warn, so make that an
+        # error everywhere
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", DeprecationWarning)
+            try:
+                compiled = re.compile(f"(?:{pattern})", self.flags)
+            except DeprecationWarning as e:
+                raise re.error(f"global flags in pattern {pattern!r}: {e}") from None
+        self._patterns[pattern] = compiled
+        if compiled.groups:
+            self._grouped[pattern] = compiled
+        self._combined = None
+
+    def remove_pattern(self, pattern: str) -> bool:
+        """Stops looking for a regular expression.
+
+        Args:
+            pattern (str): The pattern, as given to add_pattern().
+
+        Returns:
+            bool: True if the pattern was removed, False if it wasn't added.
+        """
+        if self._patterns.pop(pattern, None) is None:
+            return False
+        self._grouped.pop(pattern, None)
+        self._combined = None
+        return True
+
+    def _build(self) -> None:
+        """Recomputes the failure links and outputs of the trie."""
+        goto = self._goto
+        fail = [0] * len(goto)
+        out: List[FrozenSet[str]] = [NO_MATCHES] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            link = fail[node]
+            out[node] = (
+                out[link].union(self._ends[node]) if self._ends[node] else out[link]
+            )
+            for char, child in goto[node].items():
+                # the longest proper suffix of child's path that's in the trie
+                state = link
+                while char not in goto[state] and state:
+                    state = fail[state]
+                fail[child] = goto[state].get(char, 0)
+                queue.append(child)
+        self._fail = fail
+        self._out = out
+        self._dirty = False
+
+    def _compile(self) -> Optional[Pattern[str]]:
+        """Returns the patterns without groups, joined into one regex.
+
+        Returns:
+            Optional[Pattern[str]]: A regex matching wherever any of those
+                patterns does, or None if every pattern has groups.
+        """
+        if self._combined is None and len(self._grouped) < len(self._patterns):
+            self._combined = re.compile(
+                "|".join(
+                    compiled.pattern
+                    for pattern, compiled in self._patterns.items()
+                    if pattern not in self._grouped
+                ),
+                self.flags,
+            )
+        return self._combined
+
+    def match(self, text: str) -> FrozenSet[str]:
+        """Returns the phrases and patterns found in a line.
+
+        Args:
+            text (str): The line.
+
+        Returns:
+            FrozenSet[str]: The phrases and patterns found, as they were
+                added. Empty if none were.
+        """
+        found: Optional[Set[str]] = None
+        if self._phrases:
+            if self._dirty:
+                self._build()
+            goto = self._goto
+            fail = self._fail
+            out = self._out
+            state = 0
+            for char in text_to_id(text):
+                while state and char not in goto[state]:
+                    state = fail[state]
+                state = goto[state].get(char, 0)
+                if out[state]:
+                    if found is None:
+                        found = set()
+                    found.update(out[state])
+        if self._patterns:
+            combined = self._compile()
+            # the combined search only says that some pattern without
+            # groups matched, and says nothing about those with groups
+            if combined is not None and combined.search(text) is not None:
+                candidates = self._patterns
+            else:
+                candidates = self._grouped
+            for pattern, compiled in candidates.items():
+                if compiled.search(text) is not None:
+                    if found is None:
+                        found = set()
+                    found.add(pattern)
+        return NO_MATCHES if found is None else frozenset(found)
+
+    def phrases(self) -> Tuple[str, ...]:
+        """Returns the phrases being looked for.
+
+        Returns:
+            Tuple[str, ...]: The phrases, in the order they were added.
+        """
+        return tuple(self._phrases)
+
+    def patterns(self) -> Tuple[str, ...]:
+        """Returns the patterns being looked for.
+
+        Returns:
+            Tuple[str, ...]: The patterns, in the order they were added.
+        """
+        return tuple(self._patterns)
+
+    def __len__(self) -> int:
+        return len(self._phrases) + len(self._patterns)
+
+    def __str__(self) -> str:
+        """Returns a string representation of the matcher.
+
+        Returns:
+            str: The string representation of the matcher.
+        """
+        return "KeywordMatcher(phrases={}, patterns={})".format(
+            len(self._phrases), len(self._patterns)
+        )
+
+    def __repr__(self) -> str:
+        """Returns a representation of the matcher.
+
+        Returns:
+            str: The representation of the matcher.
+        """
+        return self.__str__()
@@ -1,10 +1,77 @@
+import copy
 import json
-from typing import Optional, List, Dict
+from contextvars import ContextVar
+from functools import partial
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    FrozenSet,
+    Generic,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+    overload,
+)
 
-from pyshowdown.user import User, RANKS
+from pyshowdown.user import User, UserRegistry, RANKS
+
+T = TypeVar("T")
+
+
+class Deferred:
+    """A raw field value waiting to be decoded."""
+
+    __slots__ = ("decode", "raw")
+
+    def __init__(self, decode: Callable[[str], Any], raw: str):
+        """Initialize a Deferred value.
+
+        Args:
+            decode (Callable[[str], Any]): The function decoding the raw value.
+            raw (str): The raw value, as sent by the server.
+        """
+        self.decode = decode
+        self.raw = raw
+
+
+class LazyField(Generic[T]):
+    """A Message attribute which may hold a Deferred value.
+
+    A Deferred value is decoded the first time the attribute is read, and
+    the result replaces it. Any other value is stored and returned as-is.
+    """
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self.attr = "_" + name
+
+    @overload
+    def __get__(
+        self, instance: None, owner: Optional[type] = None
+    ) -> "LazyField[T]": ...
+
+    @overload
+    def __get__(self, instance: object, owner: Optional[type] = None) -> T: ...
+
+    def __get__(self, instance: Any, owner: Optional[type] = None) -> Any:
+        if instance is None:
+            return self
+        value = getattr(instance, self.attr)
+        if type(value) is Deferred:
+            value = value.decode(value.raw)
+            setattr(instance, self.attr, value)
+        return value
+
+    def __set__(self, instance: Any, value: Union[T, Deferred]) -> None:
+        setattr(instance, self.attr, value)
 
 
 class Message:
+    __slots__ = ("room", "message_str")
+
     def __init__(self, room: str, message_str: str):
         """Initialize a Message object.
 
@@ -15,6 +82,25 @@ class Message:
         self.room = room
         self.message_str = message_str
 
+    def snapshot(self) -> "Message":
+        """Return a deep copy of the message.
+
+        The copy shares nothing with the original, so it can be handed to
+        a worker thread while the client keeps updating the users and other
+        objects the message refers to. Messages can also be pickled, to be
+        sent to a worker process.
+
+        Returns:
+            Message: The copy.
+        """
+        # decode deferred fields first, or the copy would decode its users
+        # into the ones shared through the client's UserRegistry
+        for cls in type(self).__mro__:
+            for name, attr in vars(cls).items():
+                if isinstance(attr, LazyField):
+                    getattr(self, name)
+        return copy.deepcopy(self)
+
     def __str__(self) -> str:
         """Return a string representation of the message.
 
@@ -32,21 +118,21 @@ class Message:
         return self.__str__()
 
 
-section = Dict[str, List[str]]
-formats = Dict[str, section]
+Section = Dict[str, List[str]]
+Formats = Dict[str, Section]
 
 
-def parse_formats(format_str: str) -> formats:
+def parse_formats(format_str: str) -> Formats:
     """Parse a format message and return a list of formats.
 
     Args:
         format_str (str): The format message.
 
     Returns:
-        formats: A dictionary of sections, formats, and some additional
+        Formats: A dictionary of sections, formats, and some additional
             info about the formats.
     """
-    results: formats = {}
+    results: Formats = {}
     split_str = format_str.split("|")
     in_section = False
     section_name = ""
@@ -88,25 +174,38 @@ def parse_formats(format_str: str) -> formats:
 
 
 class InitMessage(Message):
+    __slots__ = ("roomtype",)
+
     def __init__(self, room: str, message_str: str, roomtype: str):
         super().__init__(room, message_str)
         self.roomtype = roomtype
 
 
 class DeinitMessage(Message):
+    __slots__ = ()
+
     def __init__(self, room: str, message_str: str):
         super().__init__(room, message_str)
 
 
 class TitleMessage(Message):
+    __slots__ = ("title",)
+
     def __init__(self, room: str, message_str: str, title: str):
         super().__init__(room, message_str)
         self.title = title
 
 
 class UsersMessage(Message):
+    __slots__ = ("usercount", "_users")
+    users: "LazyField[Dict[str, User]]" = LazyField()
+
     def __init__(
-        self, room: str, message_str: str, usercount: int, users: Dict[str, User]
+        self,
+        room: str,
+        message_str: str,
+        usercount: int,
+        users: Union[Dict[str, User], Deferred],
     ):
         super().__init__(room, message_str)
         self.usercount = usercount
@@ -114,12 +213,16 @@ class UsersMessage(Message):
 
 
 class HTMLMessage(Message):
+    __slots__ = ("html",)
+
     def __init__(self, room: str, message_str: str, html: str):
         super().__init__(room, message_str)
         self.html = html
 
 
 class UHTMLMessage(Message):
+    __slots__ = ("name", "html")
+
     def __init__(self, room: str, message_str: str, name: str, html: str):
         super().__init__(room, message_str)
         self.name = name
@@ -127,6 +230,8 @@ class UHTMLMessage(Message):
 
 
 class UHTMLChangeMessage(Message):
+    __slots__ = ("name", "html")
+
     def __init__(self, room: str, message_str: str, name: str, html: str):
         super().__init__(room, message_str)
         self.name = name
@@ -134,20 +239,34 @@ class UHTMLChangeMessage(Message):
 
 
 class JoinMessage(Message):
-    def __init__(self, room: str, message_str: str, user: User):
+    __slots__ = ("_user",)
+    user: "LazyField[User]" = LazyField()
+
+    def __init__(self, room: str, message_str: str, user: Union[User, Deferred]):
         super().__init__(room, message_str)
         self.user = user
 
 
 class LeaveMessage(Message):
-    def __init__(self, room: str, message_str: str, user: User):
+    __slots__ = ("_user",)
+    user: "LazyField[User]" = LazyField()
+
+    def __init__(self, room: str, message_str: str, user: Union[User, Deferred]):
         super().__init__(room, message_str)
         self.user = user
 
 
 class RenameMessage(Message):
+    __slots__ = ("_user", "oldid", "status_str")
+    user: "LazyField[User]" = LazyField()
+
     def __init__(
-        self, room: str, message_str: str, user: User, oldid: str, status_str: str
+        self,
+        room: str,
+        message_str: str,
+        user: Union[User, Deferred],
+        oldid: str,
+        status_str: str,
     ):
         super().__init__(room, message_str)
         self.user = user
@@ -156,11 +275,14 @@ class RenameMessage(Message):
 
 
 class ChatMessage(Message):
+    __slots__ = ("_user", "message", "timestamp", "matches")
+    user: "LazyField[User]" = LazyField()
+
     def __init__(
         self,
         room: str,
         message_str: str,
-        user: User,
+        user: Union[User, Deferred],
         message: str,
         timestamp: Optional[int] = None,
     ):
@@ -168,15 +290,21 @@ class ChatMessage(Message):
         self.user = user
         self.message = message
         self.timestamp = timestamp
+        # phrases and patterns of the client's matcher found in the message
+        self.matches: FrozenSet[str] = frozenset()
 
 
 class TimestampMessage(Message):
+    __slots__ = ("timestamp",)
+
     def __init__(self, room: str, message_str: str, timestamp: int):
         super().__init__(room, message_str)
         self.timestamp = timestamp
 
 
 class BattleMessage(Message):
+    __slots__ = ("roomid", "user1", "user2")
+
     def __init__(
         self, room: str, message_str: str, roomid: str, user1: str, user2: str
     ):
@@ -187,49 +315,74 @@ class BattleMessage(Message):
 
 
 class PopupMessage(Message):
+    __slots__ = ("message",)
+
     def __init__(self, room: str, message_str: str, message: str):
         super().__init__(room, message_str)
         self.message = message
 
 
 class PMMessage(Message):
+    __slots__ = ("_user", "_receiver", "message", "matches")
+    user: "LazyField[User]" = LazyField()
+    receiver: "LazyField[User]" = LazyField()
+
     def __init__(
-        self, room: str, message_str: str, user: User, receiver: User, message: str
+        self,
+        room: str,
+        message_str: str,
+        user: Union[User, Deferred],
+        receiver: Union[User, Deferred],
+        message: str,
     ):
         super().__init__(room, message_str)
         self.user = user
         self.receiver = receiver
         self.message = message
+        self.matches: FrozenSet[str] = frozenset()
 
 
 class UserCountMessage(Message):
+    __slots__ = ("usercount",)
+
     def __init__(self, room: str, message_str: str, usercount: int):
         super().__init__(room, message_str)
         self.usercount = usercount
 
 
 class NameTakenMessage(Message):
-    def __init__(self, room: str, message_str: str, user: User, message: str):
+    __slots__ = ("_user", "message")
+    user: "LazyField[User]" = LazyField()
+
+    def __init__(
+        self, room: str, message_str: str, user: Union[User, Deferred], message: str
+    ):
         super().__init__(room, message_str)
         self.user = user
         self.message = message
 
 
 class ChallstrMessage(Message):
+    __slots__ = ("challstr",)
+
     def __init__(self, room: str, message_str: str, challstr: str):
         super().__init__(room, message_str)
         self.challstr = challstr
 
 
 class UpdateUserMessage(Message):
+    __slots__ = ("_user", "named", "avatar", "_settings")
+    user: "LazyField[User]" = LazyField()
+    settings: "LazyField[Dict[str, str]]" = LazyField()
+
     def __init__(
         self,
         room: str,
         message_str: str,
-        user: User,
+        user: Union[User, Deferred],
         named: bool,
         avatar: str,
-        settings: Dict[str, str],
+        settings: Union[Dict[str, str], Deferred],
     ):
         super().__init__(room, message_str)
         self.user = user
@@ -239,26 +392,46 @@ class UpdateUserMessage(Message):
 
 
 class FormatsMessage(Message):
-    def __init__(self, room: str, message_str: str, formats: formats):
+    __slots__ = ("_formats",)
+    formats: "LazyField[Formats]" = LazyField()
+
+    def __init__(self, room: str, message_str: str, formats: Union[Formats, Deferred]):
         super().__init__(room, message_str)
         self.formats = formats
 
 
 class UpdateSearchMessage(Message):
-    def __init__(self, room: str, message_str: str, json: Dict[str, str]):
+    __slots__ = ("_json",)
+    json: "LazyField[Dict[str, str]]" = LazyField()
+
+    def __init__(
+        self, room: str, message_str: str, json: Union[Dict[str, str], Deferred]
+    ):
         super().__init__(room, message_str)
         self.json = json
 
 
 class UpdateChallengesMessage(Message):
-    def __init__(self, room: str, message_str: str, json: Dict[str, str]):
+    __slots__ = ("_json",)
+    json: "LazyField[Dict[str, str]]" = LazyField()
+
+    def __init__(
+        self, room: str, message_str: str, json: Union[Dict[str, str], Deferred]
+    ):
         super().__init__(room, message_str)
         self.json = json
 
 
 class QueryResponseMessage(Message):
+    __slots__ = ("query_type", "_json_data", "password")
+    json_data: "LazyField[Dict[str, str]]" = LazyField()
+
     def __init__(
-        self, room: str, message_str: str, query_type: str, json_data: Dict[str, str]
+        self,
+        room: str,
+        message_str: str,
+        query_type: str,
+        json_data: Union[Dict[str, str], Deferred],
     ):
         super().__init__(room, message_str)
         self.query_type = query_type
@@ -274,18 +447,24 @@ class QueryResponseMessage(Message):
 
 
 class RawMessage(Message):
+    __slots__ = ("data",)
+
     def __init__(self, room: str, message_str: str, data: str):
         super().__init__(room, message_str)
         self.data = data
 
 
 class WinMessage(Message):
+    __slots__ = ("winner",)
+
     def __init__(self, room: str, message_str: str, winner: str):
         super().__init__(room, message_str)
         self.winner = winner
 
 
 class PlayerMessage(Message):
+    __slots__ = ("player", "name", "avatar", "rating")
+
     def __init__(
         self,
         room: str,
@@ -303,206 +482,599 @@ class PlayerMessage(Message):
 
 
 class PageHTMLMessage(Message):
+    __slots__ = ("html",)
+
     def __init__(self, room: str, message_str: str, html: str):
         super().__init__(room, message_str)
         self.html = html
 
 
 class ErrorMessage(Message):
+    __slots__ = ("error",)
+
     def __init__(self, room: str, message_str: str, error: str):
         super().__init__(room, message_str)
         self.error = error
 
 
-def parse_message(room: str, message_str: str) -> Message:
-    info = message_str.split("|")
-    if len(info) > 1:
-        message_type = info[1]
+Parser = Callable[[str, str, List[str]], Message]
+
+PARSERS: Dict[str, Parser] = {}
+LAZY_PARSERS: Dict[str, Parser] = {}
+# the parser in PARSERS each lazy parser stands in for, when it was registered
+_LAZY_REPLACES: Dict[str, Optional[Parser]] = {}
+# the registry users are taken from while parsing, if any
+_USERS: ContextVar[Optional[UserRegistry]] = ContextVar("_USERS", default=None)
+
+
+def register_parser(
+    *message_types: str, lazy: bool = False
+) -> Callable[[Parser], Parser]:
+    """Register a parser function for one or more message types.
+
+    The parser is called with the room, the raw message and the raw
+    message split on ``|``, and must return a Message. Registering a
+    type that already has a parser replaces it.
+
+    Lazy parsers are used by ``parse_message(..., lazy=True)``. They only
+    get the message split on its first two ``|`` (so the last item is the
+    rest of the line), and should wrap expensive fields in Deferred. A
+    lazy parser stands in for the parser registered for its type at the
+    time, and is no longer used once that one is replaced.
+
+    Args:
+        *message_types (str): The message types handled by the parser,
+            e.g. ``"c"`` and ``"chat"``.
+        lazy (bool, optional): Whether to register a lazy parser.
+            Defaults to False.
+
+    Returns:
+        Callable[[Parser], Parser]: A decorator registering the parser.
+    """
+    registry = LAZY_PARSERS if lazy else PARSERS
+
+    def decorator(parser: Parser) -> Parser:
+        for message_type in message_types:
+            registry[message_type] = parser
+            if lazy:
+                _LAZY_REPLACES[message_type] = PARSERS.get(message_type)
+        return parser
+
+    return decorator
+
+
+def _parse_user_status(u: str) -> Tuple[str, str, str]:
+    """Split a user string with an optional status into its parts.
+
+    Args:
+        u (str): The user string, e.g. ``"@foo@!busy"``.
+
+    Returns:
+        Tuple[str, str, str]: The name, rank and raw status string.
+    """
+    if "@" in u[1:]:
+        s = u[1:].split("@")
+        name, status = (s[0], "@".join(s[1:]))
     else:
-        message_type = None
+        name, status = u[1:], ""
+    return name, u[0], status
 
-    if message_type == "init":
-        return InitMessage(room, message_str, info[2])
 
-    elif message_type == "deinit":
-        return DeinitMessage(room, message_str)
+def _new_user_with_status(u: str) -> User:
+    """Make a new User for a user string with an optional status.
 
-    elif message_type == "title":
-        return TitleMessage(room, message_str, info[2])
+    Args:
+        u (str): The user string, e.g. ``"@foo@!busy"``.
 
-    elif message_type == "users":
-        users = info[2].split(",")
-        usercount = int(users.pop(0))
+    Returns:
+        User: The user.
+    """
+    name, rank, status = _parse_user_status(u)
+    away = status.startswith("!")
+    if away:
+        status = status[1:]
+    return User(name, rank, status, away)
 
-        users_dict = {}
 
-        for u in users:
-            if "@" in u[1:]:
-                s = u[1:].split("@")
-                name, status = (s[0], "@".join(s[1:]))
-            else:
-                name, status = u[1:], ""
+def _new_user(u: str) -> User:
+    """Make a new User for a user string without a status.
 
-            away = False
-            if status:
-                if status[0] == "!":
-                    away = True
-                    status = status[1:]
+    Args:
+        u (str): The user string, e.g. ``"@foo"``.
 
-            user_obj = User(name, u[0], status, away)
-            users_dict[user_obj.id] = user_obj
+    Returns:
+        User: The user.
+    """
+    return User(u[1:], u[0], "", False)
 
-        return UsersMessage(room, message_str, usercount, users_dict)
 
-    elif message_type == "html":
-        return HTMLMessage(room, message_str, info[2])
+def _user_with_status(u: str, room: str) -> User:
+    """Get the User for a user string with an optional status.
 
-    elif message_type == "uhtml":
-        return UHTMLMessage(room, message_str, info[2], info[3])
+    Args:
+        u (str): The user string, e.g. ``"@foo@!busy"``.
+        room (str): The room the user string was sent to.
 
-    elif message_type == "uhtmlchange":
-        return UHTMLChangeMessage(room, message_str, info[2], info[3])
+    Returns:
+        User: The user, from the registry being parsed with, if any.
+    """
+    users = _USERS.get()
+    if users is None:
+        return _new_user_with_status(u)
+    return users.user_with_status(u, room)
 
-    elif message_type in ["j", "J", "join"]:
-        u = info[2]
-        if "@" in u[1:]:
-            s = u[1:].split("@")
-            name, status = (s[0], "@".join(s[1:]))
-        else:
-            name, status = u[1:], ""
 
-        away = False
-        if status:
-            if status[0] == "!":
-                away = True
-                status = status[1:]
+def _user_from_str(u: str, room: str) -> User:
+    """Get the User for a user string without a status.
+
+    Args:
+        u (str): The user string, e.g. ``"@foo"``.
+        room (str): The room the user string was sent to.
+
+    Returns:
+        User: The user, from the registry being parsed with, if any.
+    """
+    users = _USERS.get()
+    if users is None:
+        return _new_user(u)
+    return users.user(u, room)
+
+
+def _user_decoder(room: str, with_status: bool = False) -> Callable[[str], User]:
+    """Get a function decoding user strings later, for Deferred users.
+
+    The registry being parsed with is bound now, since the user is decoded
+    after parsing has finished.
+
+    Args:
+        room (str): The room the user strings were sent to.
+        with_status (bool, optional): Whether the user strings can have a
+            status. Defaults to False.
 
-        user = User(name, u[0], status, away)
-        return JoinMessage(room, message_str, user)
+    Returns:
+        Callable[[str], User]: The function.
+    """
+    users = _USERS.get()
+    if users is None:
+        return _new_user_with_status if with_status else _new_user
+    return partial(users.user_with_status if with_status else users.user, room=room)
 
-    elif message_type in ["l", "L", "leave"]:
-        user = User(info[2][1:], info[2][0], "", False)
-        return LeaveMessage(room, message_str, user)
 
-    elif message_type in ["n", "N", "name"]:
-        u = info[2]
-        oldid = info[3]
+def _parse_user_list(
+    user_list: str, room: str, users: Optional[UserRegistry]
+) -> Dict[str, User]:
+    """Parse the comma-separated user list of a users message.
 
-        if "@" in u[1:]:
-            s = u[1:].split("@")
-            name, status = (s[0], "@".join(s[1:]))
+    Args:
+        user_list (str): The user list, without the leading user count.
+        room (str): The room the user list was sent to.
+        users (UserRegistry, optional): The registry to take the users
+            from, or None to make new ones.
+
+    Returns:
+        Dict[str, User]: The users, keyed by ID.
+    """
+    users_dict = {}
+
+    if user_list:
+        strings = user_list.split(",")
+        if users is None:
+            user_objs = [_new_user_with_status(u) for u in strings]
         else:
-            name, status = u[1:], ""
-
-        status_str = status
-
-        away = False
-        if status:
-            if status[0] == "!":
-                away = True
-                status = status[1:]
-
-        user = User(name, u[0], status, away)
-        return RenameMessage(room, message_str, user, oldid, status_str)
-
-    elif message_type in ["c", "chat"]:
-        rank, name = info[2][0], info[2][1:]
-        message = "|".join(info[3:])
-        user = User(name, rank, "", False)
-        return ChatMessage(room, message_str, user, message)
-
-    elif message_type == "c:":
-        timestamp = int(info[2])
-        rank, name = info[3][0], info[3][1:]
-        message = "|".join(info[4:])
-        user = User(name, rank, "", False)
-        return ChatMessage(room, message_str, user, message, timestamp)
-
-    elif message_type == ":":
-        timestamp = int(info[2])
-        return TimestampMessage(room, message_str, timestamp)
-
-    elif message_type == "battle":
-        roomid = info[2]
-        user1 = info[3]
-        user2 = info[4]
-        return BattleMessage(room, message_str, roomid, user1, user2)
-
-    elif message_type == "popup":
-        message = "|".join(info[2:])
-        return PopupMessage(room, message_str, message)
-
-    elif message_type == "pm":
-        user_str = info[2]
-        receiver_str = info[3]
-        message = "|".join(info[4:])
-        user = User(user_str[1:], user_str[0], "", False)
-        receiver = User(receiver_str[1:], receiver_str[0], "", False)
-        return PMMessage(room, message_str, user, receiver, message)
-
-    elif message_type == "usercount":
-        usercount = int(info[2])
-        return UserCountMessage(room, message_str, usercount)
-
-    elif message_type == "nametaken":
-        rank, name = info[2][0], info[2][1:]
-        message = info[3]
-        user = User(name, rank, "", False)
-        return NameTakenMessage(room, message_str, user, message)
-
-    elif message_type == "challstr":
-        challstr = "|".join(info[2:])
-        return ChallstrMessage(room, message_str, challstr)
-
-    elif message_type == "updateuser":
-        rank, name = info[2][0], info[2][1:]
-        named = True if info[3] == "1" else False
-        avatar = info[4]
-        settings = json.loads(info[5])
-        user = User(name, rank, "", False)
-        return UpdateUserMessage(room, message_str, user, named, avatar, settings)
-
-    elif message_type == "formats":
-        formats = parse_formats("|".join(info[2:]))
-        return FormatsMessage(room, message_str, formats)
-
-    elif message_type == "updatesearch":
-        json_data = json.loads("|".join(info[2:]))
-        return UpdateSearchMessage(room, message_str, json_data)
-
-    elif message_type == "updatechallenges":
-        json_data = json.loads("|".join(info[2:]))
-        return UpdateChallengesMessage(room, message_str, json_data)
-
-    elif message_type == "queryresponse":
-        query_type = info[2]
-        json_data = json.loads("|".join(info[3:]))
-        m = QueryResponseMessage(room, message_str, query_type, json_data)
-        m.handle()
-        return m
-
-    elif message_type == "raw":
-        data = info[2]
-        return RawMessage(room, message_str, data)
-
-    elif message_type == "win":
-        winner = info[2]
-        return WinMessage(room, message_str, winner)
-
-    elif message_type == "player":
-        player = info[2] if len(info) > 2 else None
-        name = info[3] if len(info) > 3 else None
-        avatar = info[4] if len(info) > 4 else None
-        rating = int(info[5]) if len(info) > 5 and info[5] else None
-        return PlayerMessage(room, message_str, player, name, avatar, rating)
-
-    elif message_type == "pagehtml":
-        html = "|".join(info[2:])
-        return PageHTMLMessage(room, message_str, html)
-
-    elif message_type == "error":
-        error = "|".join(info[2:])
-        return ErrorMessage(room, message_str, error)
+            user_objs = users.users_with_status(strings, room)
+        for user_obj in user_objs:
+            users_dict[user_obj.id] = user_obj
 
-    else:
-        return Message(room, message_str)
+    return users_dict
+
+
+@register_parser("init")
+def _parse_init(room: str, message_str: str, info: List[str]) -> Message:
+    return InitMessage(room, message_str, info[2])
+
+
+@register_parser("deinit")
+def _parse_deinit(room: str, message_str: str, info: List[str]) -> Message:
+    return DeinitMessage(room, message_str)
+
+
+@register_parser("title")
+def _parse_title(room: str, message_str: str, info: List[str]) -> Message:
+    return TitleMessage(room, message_str, info[2])
+
+
+@register_parser("users")
+def _parse_users(room: str, message_str: str, info: List[str]) -> Message:
+    usercount, _, user_list = info[2].partition(",")
+    return UsersMessage(
+        room,
+        message_str,
+        int(usercount),
+        _parse_user_list(user_list, room, _USERS.get()),
+    )
+
+
+@register_parser("html")
+def _parse_html(room: str, message_str: str, info: List[str]) -> Message:
+    return HTMLMessage(room, message_str, info[2])
+
+
+@register_parser("uhtml")
+def _parse_uhtml(room: str, message_str: str, info: List[str]) -> Message:
+    return UHTMLMessage(room, message_str, info[2], info[3])
+
+
+@register_parser("uhtmlchange")
+def _parse_uhtmlchange(room: str, message_str: str, info: List[str]) -> Message:
+    return UHTMLChangeMessage(room, message_str, info[2], info[3])
+
+
+@register_parser("j", "J", "join")
+def _parse_join(room: str, message_str: str, info: List[str]) -> Message:
+    return JoinMessage(room, message_str, _user_with_status(info[2], room))
+
+
+@register_parser("l", "L", "leave")
+def _parse_leave(room: str, message_str: str, info: List[str]) -> Message:
+    user = _user_from_str(info[2], room)
+    return LeaveMessage(room, message_str, user)
+
+
+@register_parser("n", "N", "name")
+def _parse_name(room: str, message_str: str, info: List[str]) -> Message:
+    oldid = info[3]
+    _, _, status_str = _parse_user_status(info[2])
+    user = _user_with_status(info[2], room)
+    return RenameMessage(room, message_str, user, oldid, status_str)
+
+
+@register_parser("c", "chat")
+def _parse_chat(room: str, message_str: str, info: List[str]) -> Message:
+    message = "|".join(info[3:])
+    return ChatMessage(room, message_str, _user_from_str(info[2], room), message)
+
+
+@register_parser("c:")
+def _parse_timestamp_chat(room: str, message_str: str, info: List[str]) -> Message:
+    timestamp = int(info[2])
+    message = "|".join(info[4:])
+    user = _user_from_str(info[3], room)
+    return ChatMessage(room, message_str, user, message, timestamp)
+
+
+@register_parser(":")
+def _parse_timestamp(room: str, message_str: str, info: List[str]) -> Message:
+    return TimestampMessage(room, message_str, int(info[2]))
+
+
+@register_parser("battle")
+def _parse_battle(room: str, message_str: str, info: List[str]) -> Message:
+    roomid = info[2]
+    user1 = info[3]
+    user2 = info[4]
+    return BattleMessage(room, message_str, roomid, user1, user2)
+
+
+@register_parser("popup")
+def _parse_popup(room: str, message_str: str, info: List[str]) -> Message:
+    return PopupMessage(room, message_str, "|".join(info[2:]))
+
+
+@register_parser("pm")
+def _parse_pm(room: str, message_str: str, info: List[str]) -> Message:
+    message = "|".join(info[4:])
+    user = _user_from_str(info[2], room)
+    receiver = _user_from_str(info[3], room)
+    return PMMessage(room, message_str, user, receiver, message)
+
+
+@register_parser("usercount")
+def _parse_usercount(room: str, message_str: str, info: List[str]) -> Message:
+    return UserCountMessage(room, message_str, int(info[2]))
+
+
+@register_parser("nametaken")
+def _parse_nametaken(room: str, message_str: str, info: List[str]) -> Message:
+    return NameTakenMessage(room, message_str, _user_from_str(info[2], room), info[3])
+
+
+@register_parser("challstr")
+def _parse_challstr(room: str, message_str: str, info: List[str]) -> Message:
+    return ChallstrMessage(room, message_str, "|".join(info[2:]))
+
+
+@register_parser("updateuser")
+def _parse_updateuser(room: str, message_str: str, info: List[str]) -> Message:
+    named = True if info[3] == "1" else False
+    avatar = info[4]
+    settings = json.loads(info[5])
+    user = _user_from_str(info[2], room)
+    return UpdateUserMessage(room, message_str, user, named, avatar, settings)
+
+
+@register_parser("formats")
+def _parse_formats(room: str, message_str: str, info: List[str]) -> Message:
+    return FormatsMessage(room, message_str, parse_formats("|".join(info[2:])))
+
+
+@register_parser("updatesearch")
+def _parse_updatesearch(room: str, message_str: str, info: List[str]) -> Message:
+    json_data = json.loads("|".join(info[2:]))
+    return UpdateSearchMessage(room, message_str, json_data)
+
+
+@register_parser("updatechallenges")
+def _parse_updatechallenges(room: str, message_str: str, info: List[str]) -> Message:
+    json_data = json.loads("|".join(info[2:]))
+    return UpdateChallengesMessage(room, message_str, json_data)
+
+
+@register_parser("queryresponse")
+def _parse_queryresponse(room: str, message_str: str, info: List[str]) -> Message:
+    query_type = info[2]
+    json_data = json.loads("|".join(info[3:]))
+    m = QueryResponseMessage(room, message_str, query_type, json_data)
+    m.handle()
+    return m
+
+
+@register_parser("raw")
+def _parse_raw(room: str, message_str: str, info: List[str]) -> Message:
+    return RawMessage(room, message_str, info[2])
+
+
+@register_parser("win")
+def _parse_win(room: str, message_str: str, info: List[str]) -> Message:
+    return WinMessage(room, message_str, info[2])
+
+
+@register_parser("player")
+def _parse_player(room: str, message_str: str, info: List[str]) -> Message:
+    player = info[2] if len(info) > 2 else None
+    name = info[3] if len(info) > 3 else None
+    avatar = info[4] if len(info) > 4 else None
+    rating = int(info[5]) if len(info) > 5 and info[5] else None
+    return PlayerMessage(room, message_str, player, name, avatar, rating)
+
+
+@register_parser("pagehtml")
+def _parse_pagehtml(room: str, message_str: str, info: List[str]) -> Message:
+    return PageHTMLMessage(room, message_str, "|".join(info[2:]))
+
+
+@register_parser("error")
+def _parse_error(room: str, message_str: str, info: List[str]) -> Message:
+    return ErrorMessage(room, message_str, "|".join(info[2:]))
+
+
+@register_parser("users", lazy=True)
+def _lazy_parse_users(room: str, message_str: str, info: List[str]) -> Message:
+    usercount, _, user_list = info[2].partition("|")[0].partition(",")
+    decode = partial(_parse_user_list, room=room, users=_USERS.get())
+    users = Deferred(decode, user_list)
+    return UsersMessage(room, message_str, int(usercount), users)
+
+
+@register_parser("j", "J", "join", lazy=True)
+def _lazy_parse_join(room: str, message_str: str, info: List[str]) -> Message:
+    user = Deferred(_user_decoder(room, True), info[2].partition("|")[0])
+    return JoinMessage(room, message_str, user)
+
+
+@register_parser("l", "L", "leave", lazy=True)
+def _lazy_parse_leave(room: str, message_str: str, info: List[str]) -> Message:
+    user = Deferred(_user_decoder(room), info[2].partition("|")[0])
+    return LeaveMessage(room, message_str, user)
+
+
+@register_parser("n", "N", "name", lazy=True)
+def _lazy_parse_name(room: str, message_str: str, info: List[str]) -> Message:
+    fields = info[2].split("|")
+    _, _, status_str = _parse_user_status(fields[0])
+    user = Deferred(_user_decoder(room, True), fields[0])
+    return RenameMessage(room, message_str, user, fields[1], status_str)
+
+
+@register_parser("c", "chat", lazy=True)
+def _lazy_parse_chat(room: str, message_str: str, info: List[str]) -> Message:
+    user_str, _, message = info[2].partition("|")
+    return ChatMessage(
+        room, message_str, Deferred(_user_decoder(room), user_str), message
+    )
+
+
+@register_parser("c:", lazy=True)
+def _lazy_parse_timestamp_chat(room: str, message_str: str, info: List[str]) -> Message:
+    fields = info[2].split("|", 2)
+    message = fields[2] if len(fields) > 2 else ""
+    user = Deferred(_user_decoder(room), fields[1])
+    return ChatMessage(room, message_str, user, message, int(fields[0]))
+
+
+@register_parser("pm", lazy=True)
+def _lazy_parse_pm(room: str, message_str: str, info: List[str]) -> Message:
+    fields = info[2].split("|", 2)
+    message = fields[2] if len(fields) > 2 else ""
+    user = Deferred(_user_decoder(room), fields[0])
+    receiver = Deferred(_user_decoder(room), fields[1])
+    return PMMessage(room, message_str, user, receiver, message)
+
+
+@register_parser("nametaken", lazy=True)
+def _lazy_parse_nametaken(room: str, message_str: str, info: List[str]) -> Message:
+    fields = info[2].split("|")
+    user = Deferred(_user_decoder(room), fields[0])
+    return NameTakenMessage(room, message_str, user, fields[1])
+
+
+@register_parser("updateuser", lazy=True)
+def _lazy_parse_updateuser(room: str, message_str: str, info: List[str]) -> Message:
+    fields = info[2].split("|")
+    user = Deferred(_user_decoder(room), fields[0])
+    named = True if fields[1] == "1" else False
+    settings = Deferred(json.loads, fields[3])
+    return UpdateUserMessage(room, message_str, user, named, fields[2], settings)
+
+
+@register_parser("formats", lazy=True)
+def _lazy_parse_formats(room: str, message_str: str, info: List[str]) -> Message:
+    return FormatsMessage(room, message_str, Deferred(parse_formats, info[2]))
+
+
+@register_parser("updatesearch", lazy=True)
+def _lazy_parse_updatesearch(room: str, message_str: str, info: List[str]) -> Message:
+    return UpdateSearchMessage(room, message_str, Deferred(json.loads, info[2]))
+
+
+@register_parser("updatechallenges", lazy=True)
+def _lazy_parse_updatechallenges(
+    room: str, message_str: str, info: List[str]
+) -> Message:
+    return UpdateChallengesMessage(room, message_str, Deferred(json.loads, info[2]))
+
+
+@register_parser("queryresponse", lazy=True)
+def _lazy_parse_queryresponse(room: str, message_str: str, info: List[str]) -> Message:
+    query_type, _, data = info[2].partition("|")
+    json_data = Deferred(json.loads, data)
+    m = QueryResponseMessage(room, message_str, query_type, json_data)
+    m.handle()
+    return m
+
+
+def parse_message(
+    room: str,
+    message_str: str,
+    lazy: bool = False,
+    users: Optional[UserRegistry] = None,
+) -> Message:
+    """Parse a raw protocol line into a Message.
+
+    The parser is looked up by message type in PARSERS. Lines without a
+    registered parser are returned as a plain Message.
+
+    In lazy mode, types with a parser in LAZY_PARSERS skip decoding users,
+    JSON payloads and formats until the field is first read. Decoding
+    errors for those fields are then raised on access instead of here.
+    Types whose parser in PARSERS has been replaced since their lazy
+    parser was registered are parsed by the replacement.
+
+    Users are taken from the registry given, which shares them with other
+    messages from the same room. Without one, every message gets new Users.
+
+    Args:
+        room (str): The room the message was sent to.
+        message_str (str): The raw message.
+        lazy (bool, optional): Whether to defer decoding of expensive
+            fields. Defaults to False.
+        users (UserRegistry, optional): The registry to take users from.
+            Defaults to None.
+
+    Returns:
+        Message: The parsed message.
+    """
+    token = _USERS.set(users)
+    try:
+        return _parse_message(room, message_str, lazy)
+    finally:
+        _USERS.reset(token)
+
+
+def _parse_message(room: str, message_str: str, lazy: bool) -> Message:
+    """Parse a raw protocol line, with the registry already set.
+
+    Args:
+        room (str): The room the message was sent to.
+        message_str (str): The raw message.
+        lazy (bool): Whether to defer decoding of expensive fields.
+
+    Returns:
+        Message: The parsed message.
+    """
+    if lazy:
+        info = message_str.split("|", 2)
+        if len(info) > 2:
+            parser = LAZY_PARSERS.get(info[1])
+            if parser is not None and _LAZY_REPLACES[info[1]] is PARSERS.get(info[1]):
+                return parser(room, message_str, info)
+
+    info = message_str.split("|")
+    if len(info) > 1:
+        parser = PARSERS.get(info[1])
+        if parser is not None:
+            return parser(room, message_str, info)
+    return Message(room, message_str)
+
+
+def parse_messages(
+    room: str,
+    lines: Iterable[str],
+    lazy: bool = False,
+    users: Optional[UserRegistry] = None,
+) -> List[Message]:
+    """Parse the lines of a frame, all from the same room, into Messages.
+
+    Gives the same results as calling parse_message on each line, but chat
+    lines, which make up most of a room's scrollback, are split once
+    without going through the parser lookup. Other lines are parsed by
+    parse_message.
+
+    Chat lines are only parsed this way while their registered parsers are
+    the default ones, so replacing those still takes effect.
+
+    Args:
+        room (str): The room the lines were sent to.
+        lines (Iterable[str]): The raw lines.
+        lazy (bool, optional): Whether to defer decoding of expensive
+            fields, as for parse_message. Defaults to False.
+        users (UserRegistry, optional): The registry to take users from,
+            as for parse_message. Defaults to None.
+
+    Returns:
+        List[Message]: The parsed messages, in order.
+    """
+    token = _USERS.set(users)
+    try:
+        return _parse_messages(room, lines, lazy)
+    finally:
+        _USERS.reset(token)
+
+
+def _parse_messages(room: str, lines: Iterable[str], lazy: bool) -> List[Message]:
+    """Parse the lines of a frame, with the registry already set.
+
+    Args:
+        room (str): The room the lines were sent to.
+        lines (Iterable[str]): The raw lines.
+        lazy (bool): Whether to defer decoding of expensive fields.
+
+    Returns:
+        List[Message]: The parsed messages, in order.
+    """
+    # lazy mode also falls back to PARSERS once they're replaced
+    chat = PARSERS.get("c") is _parse_chat and (
+        not lazy or LAZY_PARSERS.get("c") is _lazy_parse_chat
+    )
+    timestamp_chat = PARSERS.get("c:") is _parse_timestamp_chat and (
+        not lazy or LAZY_PARSERS.get("c:") is _lazy_parse_timestamp_chat
+    )
+
+    messages: List[Message] = []
+    append = messages.append
+    decode = _user_decoder(room)
+    user: Union[User, Deferred]
+    for line in lines:
+        if timestamp_chat and line.startswith("|c:|"):
+            fields = line.split("|", 4)
+            if len(fields) == 5:
+                user = Deferred(decode, fields[3]) if lazy else decode(fields[3])
+                append(ChatMessage(room, line, user, fields[4], int(fields[2])))
+                continue
+        elif chat and line.startswith("|c|"):
+            fields = line.split("|", 3)
+            if len(fields) == 4:
+                user = Deferred(decode, fields[2]) if lazy else decode(fields[2])
+                append(ChatMessage(room, line, user, fields[3]))
+                continue
+        append(_parse_message(room, line, lazy))
+    return messages
@@ -0,0 +1,644 @@
+import asyncio
+import math
+from bisect import bisect_left
+from typing import Callable, Dict, Generic, List, Optional, Sequence, Tuple, TypeVar
+
+# latency buckets in seconds, from 100µs to 10s
+DEFAULT_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def _format_value(value: float) -> str:
+    """Formats a sample value for the Prometheus text format.
+
+    Args:
+        value (float): The value.
+
+    Returns:
+        str: The formatted value.
+    """
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    """Formats label pairs for the Prometheus text format.
+
+    Args:
+        names (Sequence[str]): The label names.
+        values (Sequence[str]): The label values.
+
+    Returns:
+        str: The labels in braces, or "" if there are none.
+    """
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class CounterValue:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        """A value which only goes up."""
+        self.value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        """Increases the value.
+
+        Args:
+            amount (float, optional): The amount to add. Defaults to 1.
+        """
+        self.value += amount
+
+
+class GaugeValue:
+    __slots__ = ("value", "function")
+
+    def __init__(self):
+        """A value which goes up and down."""
+        self.value = 0.0
+        self.function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float) -> None:
+        """Sets the value.
+
+        Args:
+            value (float): The new value.
+        """
+        self.value = value
+
+    def inc(self, amount: float = 1) -> None:
+        """Increases the value.
+
+        Args:
+            amount (float, optional): The amount to add. Defaults to 1.
+        """
+        self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        """Decreases the value.
+
+        Args:
+            amount (float, optional): The amount to subtract. Defaults to 1.
+        """
+        self.value -= amount
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Reads the value from a function whenever metrics are collected.
+
+        Args:
+            function (Callable[[], float]): Returns the current value.
+        """
+        self.function = function
+
+    def get(self) -> float:
+        """Returns the current value.
+
+        Returns:
+            float: The value.
+        """
+        return self.value if self.function is None else self.function()
+
+
+class HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        """Counts observations in buckets.
+
+        Args:
+            bounds (Tuple[float, ...]): The upper bounds of the buckets, in
+                increasing order.
+        """
+        self.bounds = bounds
+        # one more bucket for values above the last bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """Records an observation.
+
+        Args:
+            value (float): The observed value.
+        """
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+V = TypeVar("V", CounterValue, GaugeValue, HistogramValue)
+
+
+class Metric(Generic[V]):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        """Base class for metrics.
+
+        A metric without labels records values itself. A metric with labels
+        records them in children, one per combination of label values.
+        Children are created on first use and can be kept to skip the
+        lookup on the hot path.
+
+        Args:
+            name (str): The metric name.
+            documentation (str): What the metric measures.
+            labelnames (Sequence[str], optional): The label names. Defaults
+                to no labels.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], V] = {}
+        self._value: Optional[V] = None
+        if not self.labelnames:
+            self._value = self._children[()] = self._new_value()
+
+    def _new_value(self) -> V:
+        """Creates a child value.
+
+        Raises:
+            NotImplementedError: Always, since this is a base class.
+
+        Returns:
+            V: The new value.
+        """
+        raise NotImplementedError()
+
+    def labels(self, *values: str) -> V:
+        """Returns the child for some label values, creating it if needed.
+
+        Args:
+            *values (str): One value per label name.
+
+        Raises:
+            ValueError: If the number of values doesn't match the labels.
+
+        Returns:
+            V: The child.
+        """
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(
+                    "expected {} label values, got {}.".format(
+                        len(self.labelnames), len(values)
+                    )
+                )
+            child = self._children[values] = self._new_value()
+        return child
+
+    def _unlabelled(self) -> V:
+        """Returns the value of a metric without labels.
+
+        Raises:
+            ValueError: If the metric has labels.
+
+        Returns:
+            V: The value.
+        """
+        if self._value is None:
+            raise ValueError("metric has labels; use labels() first.")
+        return self._value
+
+    def _samples(self, labels: str, value: V) -> List[str]:
+        """Returns the exposition lines for one child.
+
+        Raises:
+            NotImplementedError: Always, since this is a base class.
+
+        Args:
+            labels (str): The formatted labels of the child.
+            value (V): The child.
+
+        Returns:
+            List[str]: The lines.
+        """
+        raise NotImplementedError()
+
+    def expose(self) -> str:
+        """Returns the metric in the Prometheus text format.
+
+        Returns:
+            str: The metric's HELP, TYPE and sample lines.
+        """
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for values, child in list(self._children.items()):
+            lines.extend(self._samples(_format_labels(self.labelnames, values), child))
+        return "\n".join(lines) + "\n"
+
+    def __str__(self) -> str:
+        """Returns a string representation of the metric.
+
+        Returns:
+            str: The string representation of the metric.
+        """
+        return "{}({})".format(type(self).__name__, self.name)
+
+    def __repr__(self) -> str:
+        """Returns a representation of the metric.
+
+        Returns:
+            str: The representation of the metric.
+        """
+        return self.__str__()
+
+
+class Counter(Metric[CounterValue]):
+    kind = "counter"
+
+    def _new_value(self) -> CounterValue:
+        return CounterValue()
+
+    def inc(self, amount: float = 1) -> None:
+        """Increases the value of a metric without labels.
+
+        Args:
+            amount (float, optional): The amount to add. Defaults to 1.
+        """
+        self._unlabelled().inc(amount)
+
+    def _samples(self, labels: str, value: CounterValue) -> List[str]:
+        return [f"{self.name}{labels} {_format_value(value.value)}"]
+
+
+class Gauge(Metric[GaugeValue]):
+    kind = "gauge"
+
+    def _new_value(self) -> GaugeValue:
+        return GaugeValue()
+
+    def set(self, value: float) -> None:
+        """Sets the value of a metric without labels.
+
+        Args:
+            value (float): The new value.
+        """
+        self._unlabelled().set(value)
+
+    def inc(self, amount: float = 1) -> None:
+        """Increases the value of a metric without labels.
+
+        Args:
+            amount (float, optional): The amount to add. Defaults to 1.
+        """
+        self._unlabelled().inc(amount)
+
+    def dec(self, amount: float = 1) -> None:
+        """Decreases the value of a metric without labels.
+
+        Args:
+            amount (float, optional): The amount to subtract. Defaults to 1.
+        """
+        self._unlabelled().dec(amount)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Reads the value of a metric without labels from a function.
+
+        Args:
+            function (Callable[[], float]): Returns the current value.
+        """
+        self._unlabelled().set_function(function)
+
+    def _samples(self, labels: str, value: GaugeValue) -> List[str]:
+        return [f"{self.name}{labels} {_format_value(value.get())}"]
+
+
+class Histogram(Metric[HistogramValue]):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        """A metric counting observations in buckets.
+
+        Args:
+            name (str): The metric name.
+            documentation (str): What the metric measures.
+            labelnames (Sequence[str], optional): The label names. Defaults
+                to no labels.
+            buckets (Sequence[float], optional): The upper bounds of the
+                buckets. Defaults to DEFAULT_BUCKETS.
+
+        Raises:
+            ValueError: If there are no buckets.
+        """
+        if not buckets:
+            raise ValueError("a histogram needs at least one bucket.")
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_value(self) -> HistogramValue:
+        return HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        """Records an observation in a metric without labels.
+
+        Args:
+            value (float): The observed value.
+        """
+        self._unlabelled().observe(value)
+
+    def _samples(self, labels: str, value: HistogramValue) -> List[str]:
+        # the bucket label goes after the others
+        prefix = labels[:-1] + "," if labels else "{"
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, value.counts):
+            cumulative += count
+            lines.append(
+                f'{self.name}_bucket{prefix}le="{_format_value(bound)}"}} {cumulative}'
+            )
+        lines.append(f'{self.name}_bucket{prefix}le="+Inf"}} {value.count}')
+        lines.append(f"{self.name}_sum{labels} {_format_value(value.sum)}")
+        lines.append(f"{self.name}_count{labels} {value.count}")
+        return lines
+
+
+M = TypeVar("M", bound=Metric)
+
+
+class Registry:
+    def __init__(self):
+        """A collection of metrics to expose together."""
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: M) -> M:
+        """Adds a metric.
+
+        Args:
+            metric (Metric): The metric.
+
+        Raises:
+            ValueError: If a metric with the same name is registered.
+
+        Returns:
+            Metric: The metric.
+        """
+        if metric.name in self.metrics:
+            raise ValueError(f"metric {metric.name} is already registered.")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ) -> Counter:
+        """Creates and registers a counter.
+
+        Args:
+            name (str): The metric name.
+            documentation (str): What the metric measures.
+            labelnames (Sequence[str], optional): The label names. Defaults
+                to no labels.
+
+        Returns:
+            Counter: The counter.
+        """
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ) -> Gauge:
+        """Creates and registers a gauge.
+
+        Args:
+            name (str): The metric name.
+            documentation (str): What the metric measures.
+            labelnames (Sequence[str], optional): The label names. Defaults
+                to no labels.
+
+        Returns:
+            Gauge: The gauge.
+        """
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        """Creates and registers a histogram.
+
+        Args:
+            name (str): The metric name.
+            documentation (str): What the metric measures.
+            labelnames (Sequence[str], optional): The label names. Defaults
+                to no labels.
+            buckets (Sequence[float], optional): The upper bounds of the
+                buckets. Defaults to DEFAULT_BUCKETS.
+
+        Returns:
+            Histogram: The histogram.
+        """
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def expose(self) -> str:
+        """Returns every metric in the Prometheus text format.
+
+        Returns:
+            str: The exposition.
+        """
+        return "".join(metric.expose() for metric in self.metrics.values())
+
+
+class ClientMetrics:
+    def __init__(self, registry: Optional[Registry] = None):
+        """The metrics recorded by a Client.
+
+        Args:
+            registry (Registry, optional): The registry to add them to.
+                Defaults to None, which creates a new one.
+        """
+        self.registry = Registry() if registry is None else registry
+        r = self.registry
+        self.inbound_lines = r.counter(
+            "pyshowdown_inbound_lines_total",
+            "Lines received, by message class.",
+            ["type"],
+        )
+        self.parse_seconds = r.histogram(
+            "pyshowdown_parse_seconds",
+            "Time spent parsing a received line.",
+            buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001),
+        )
+        self.plugin_seconds = r.histogram(
+            "pyshowdown_plugin_seconds",
+            "Time spent in plugin match() and response() calls.",
+            ["plugin", "stage"],
+        )
+        self.plugin_errors = r.counter(
+            "pyshowdown_plugin_errors_total",
+            "Exceptions raised by plugins.",
+            ["plugin"],
+        )
+        self.plugin_timeouts = r.counter(
+            "pyshowdown_plugin_timeouts_total",
+            "Plugin match() and response() calls which timed out.",
+            ["plugin"],
+        )
+        self.plugin_skipped = r.counter(
+            "pyshowdown_plugin_skipped_total",
+            "Messages not given to a plugin while its circuit breaker was open.",
+            ["plugin"],
+        )
+        self.executor_pending = r.gauge(
+            "pyshowdown_executor_pending",
+            "Plugin calls submitted to a pool and not finished.",
+            ["pool"],
+        )
+        self.executor_workers = r.gauge(
+            "pyshowdown_executor_workers", "The size of a plugin pool.", ["pool"]
+        )
+        self.outbound_depth = r.gauge(
+            "pyshowdown_outbound_queue_depth", "Messages waiting to be sent."
+        )
+        self.outbound_wait_seconds = r.histogram(
+            "pyshowdown_outbound_wait_seconds",
+            "Time messages waited in the outbound queue.",
+        )
+        self.outbound_messages = r.counter(
+            "pyshowdown_outbound_messages_total", "Frames sent."
+        )
+        self.send_stalls = r.counter(
+            "pyshowdown_send_stalls_total",
+            "Times no queued message could be sent because of rate limits.",
+        )
+        self.throttled = r.counter(
+            "pyshowdown_throttled_total",
+            "Messages the server rejected for being sent too fast.",
+        )
+        self.reconnects = r.counter(
+            "pyshowdown_reconnects_total", "Connection attempts after the first."
+        )
+        self.backoff_seconds = r.gauge(
+            "pyshowdown_backoff_seconds", "The current reconnection delay."
+        )
+        self.rooms = r.gauge("pyshowdown_rooms", "Rooms the client is in.")
+        self.users = r.gauge(
+            "pyshowdown_room_users", "Users in the client's rooms, summed."
+        )
+
+    def expose(self) -> str:
+        """Returns every metric in the Prometheus text format.
+
+        Returns:
+            str: The exposition.
+        """
+        return self.registry.expose()
+
+
+class MetricsServer:
+    def __init__(self, registry: Registry, host: str = "127.0.0.1", port: int = 9108):
+        """A minimal HTTP server exposing metrics to Prometheus.
+
+        Every GET request is answered with the registry's exposition, so
+        /metrics works as usual.
+
+        Args:
+            registry (Registry): The metrics to expose.
+            host (str, optional): The address to listen on. Defaults to
+                "127.0.0.1".
+            port (int, optional): The port to listen on, or 0 for any free
+                port. Defaults to 9108.
+        """
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        """Starts listening. The port is updated if it was 0."""
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def close(self) -> None:
+        """Stops listening."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Answers one request.
+
+        Args:
+            reader (asyncio.StreamReader): The request stream.
+            writer (asyncio.StreamWriter): The response stream.
+        """
+        try:
+            request = await reader.readline()
+            # skip the headers
+            while (await reader.readline()).strip():
+                pass
+            if request.startswith(b"GET "):
+                body = self.registry.expose().encode()
+                status = "200 OK"
+            else:
+                body = b""
+                status = "405 Method Not Allowed"
+            writer.write(
+                (
+                    f"HTTP/1.1 {status}\r\n"
+                    "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                    f"Content-Length: {len(body)}\r\n"
+                    "Connection: close\r\n\r\n"
+                ).encode()
+                + body
+            )
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def __str__(self) -> str:
+        """Returns a string representation of the server.
+
+        Returns:
+            str: The string representation of the server.
+        """
+        return "MetricsServer({}:{})".format(self.host, self.port)
+
+    def __repr__(self) -> str:
+        """Returns a representation of the server.
+
+        Returns:
+            str: The representation of the server.
+        """
+        return self.__str__()
@@ -0,0 +1,508 @@
+import asyncio
+import time
+from collections import deque
+from enum import IntEnum
+from typing import Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from pyshowdown.utils import to_id
+
+# PS warns non-staff users sending more lines than this in one message
+COALESCE_MAX_LINES = 3
+COALESCE_MAX_BYTES = 4096
+
+ADD_UHTML = "/adduhtml"
+CHANGE_UHTML = "/changeuhtml"
+
+
+class Priority(IntEnum):
+    """Priority levels for outgoing messages, highest first."""
+
+    # login, joins and other commands the client depends on
+    CONTROL = 0
+    # replies to users
+    INTERACTIVE = 1
+    # announcements and other messages nobody is waiting for
+    BULK = 2
+
+
+def parse_uhtml(message: str) -> Optional[Tuple[str, str, str]]:
+    """Parses an outgoing /adduhtml or /changeuhtml command.
+
+    Args:
+        message (str): The outgoing message.
+
+    Returns:
+        Optional[Tuple[str, str, str]]: The command, the ID of the uhtml
+            box and its HTML, or None if the message isn't one of those
+            commands.
+    """
+    command, _, rest = message.partition(" ")
+    if command != ADD_UHTML and command != CHANGE_UHTML:
+        return None
+    name, sep, html = rest.partition(",")
+    if not sep or "\n" in html:
+        return None
+    return command, to_id(name), html.strip()
+
+
+def join_lines(
+    room: str,
+    lines: List[str],
+    max_lines: int = COALESCE_MAX_LINES,
+    max_bytes: int = COALESCE_MAX_BYTES,
+) -> List[str]:
+    """Joins lines for a room into as few messages as the limits allow.
+
+    Lines are kept in order, and joined with newlines while the frame of
+    each message stays within the limits. A line over the limits on its
+    own is a message on its own.
+
+    Args:
+        room (str): The room the lines are for.
+        lines (List[str]): The lines.
+        max_lines (int, optional): The maximum number of lines in a message.
+            Defaults to COALESCE_MAX_LINES.
+        max_bytes (int, optional): The maximum size of a message's frame in
+            bytes. Defaults to COALESCE_MAX_BYTES.
+
+    Returns:
+        List[str]: The messages.
+    """
+    messages: List[str] = []
+    current: List[str] = []
+    # "room|"
+    overhead = len(room.encode()) + 1
+    count = size = 0
+    for line in lines:
+        line_lines = line.count("\n") + 1
+        line_size = len(line.encode()) + 1
+        if current and (count + line_lines > max_lines or size + line_size > max_bytes):
+            messages.append("\n".join(current))
+            current = []
+        if not current:
+            count = 0
+            size = overhead - 1
+        current.append(line)
+        count += line_lines
+        size += line_size
+    if current:
+        messages.append("\n".join(current))
+    return messages
+
+
+class OutboundMessage:
+    __slots__ = ("room", "message", "priority", "enqueued", "key", "attempts")
+
+    def __init__(
+        self,
+        room: str,
+        message: str,
+        priority: Priority,
+        enqueued: float,
+        key: Optional[Tuple[str, str]] = None,
+    ):
+        """A message waiting to be sent.
+
+        Args:
+            room (str): The room to send the message to.
+            message (str): The message.
+            priority (Priority): The priority of the message.
+            enqueued (float): When the message was queued.
+            key (Tuple[str, str], optional): The room and name of the uhtml
+                box the message updates, if any. Defaults to None.
+        """
+        self.room = room
+        self.message = message
+        self.priority = priority
+        self.enqueued = enqueued
+        self.key = key
+        # times the message was sent, but rejected by the server
+        self.attempts = 0
+
+    @property
+    def frame(self) -> str:
+        """The message as sent over the websocket."""
+        return f"{self.room}|{self.message}"
+
+    def __str__(self) -> str:
+        return "OutboundMessage({}, {})".format(self.priority.name, self.frame)
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class WaitStats:
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self):
+        """Statistics about how long messages waited in the queue."""
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, wait: float) -> None:
+        """Records the wait time of a message.
+
+        Args:
+            wait (float): The time the message waited, in seconds.
+        """
+        self.count += 1
+        self.total += wait
+        if wait > self.max:
+            self.max = wait
+
+    @property
+    def mean(self) -> float:
+        """The mean wait time in seconds, or 0 if nothing was recorded."""
+        return self.total / self.count if self.count else 0.0
+
+    def __str__(self) -> str:
+        return "WaitStats(count={}, mean={:.3f}, max={:.3f})".format(
+            self.count, self.mean, self.max
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class _Level:
+    __slots__ = ("lanes", "rooms", "size")
+
+    def __init__(self):
+        # room -> messages, and the order in which rooms take turns
+        self.lanes: Dict[str, Deque[OutboundMessage]] = {}
+        self.rooms: Deque[str] = deque()
+        self.size = 0
+
+
+class OutboundQueue:
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        """A queue of outgoing messages with priority levels.
+
+        Messages are taken from the highest priority level with messages
+        waiting. Within a level, rooms take turns, so a room with many
+        messages queued doesn't hold up the others, and messages for the
+        same room keep their order.
+
+        Updates to a uhtml box (/adduhtml and /changeuhtml) replace any
+        update to the same box still waiting in the queue, and a
+        /changeuhtml identical to the last update sent is skipped.
+
+        Args:
+            clock (Callable[[], float], optional): The clock used to measure
+                wait times, in seconds. Defaults to time.monotonic.
+        """
+        self.clock = clock
+        self._levels: List[_Level] = [_Level() for _ in Priority]
+        self._size = 0
+        self._nonempty: Optional[asyncio.Event] = None
+        self.wait_stats: Dict[Priority, WaitStats] = {p: WaitStats() for p in Priority}
+        # uhtml updates waiting to be sent, and the HTML last sent, by box
+        self._pending: Dict[Tuple[str, str], OutboundMessage] = {}
+        self._sent_html: Dict[Tuple[str, str], str] = {}
+        self.superseded = 0
+        self.skipped = 0
+
+    def qsize(self, priority: Optional[Priority] = None) -> int:
+        """Returns the number of queued messages.
+
+        Args:
+            priority (Priority, optional): Only count messages with this
+                priority. Defaults to None, which counts all messages.
+
+        Returns:
+            int: The number of queued messages.
+        """
+        if priority is None:
+            return self._size
+        return self._levels[priority].size
+
+    def empty(self) -> bool:
+        """Returns True if no messages are queued."""
+        return not self._size
+
+    def put(
+        self, room: str, message: str, priority: Priority = Priority.INTERACTIVE
+    ) -> Optional[OutboundMessage]:
+        """Queues a message.
+
+        Args:
+            room (str): The room to send the message to.
+            message (str): The message.
+            priority (Priority, optional): The priority of the message.
+                Defaults to Priority.INTERACTIVE.
+
+        Returns:
+            Optional[OutboundMessage]: The queued message, which is an
+                earlier message if this one replaced it, or None if the
+                message was skipped.
+        """
+        key = None
+        uhtml = parse_uhtml(message)
+        if uhtml is not None:
+            command, name, html = uhtml
+            key = (room, name)
+            pending = self._pending.get(key)
+            if pending is not None:
+                if command == CHANGE_UHTML and pending.message.startswith(ADD_UHTML):
+                    # the box hasn't been created yet, so keep adding it
+                    message = ADD_UHTML + message[len(CHANGE_UHTML) :]
+                pending.message = message
+                self.superseded += 1
+                return pending
+            if command == CHANGE_UHTML and self._sent_html.get(key) == html:
+                self.skipped += 1
+                return None
+
+        item = OutboundMessage(room, message, Priority(priority), self.clock(), key)
+        self.put_item(item)
+        return item
+
+    def put_item(self, item: OutboundMessage, front: bool = False) -> None:
+        """Queues an existing message.
+
+        Args:
+            item (OutboundMessage): The message.
+            front (bool, optional): Whether to put the message first in its
+                priority level, e.g. to retry it. Defaults to False.
+        """
+        level = self._levels[item.priority]
+        lane = level.lanes.get(item.room)
+        if front:
+            if lane is None:
+                lane = level.lanes[item.room] = deque()
+            else:
+                level.rooms.remove(item.room)
+            level.rooms.appendleft(item.room)
+            lane.appendleft(item)
+        else:
+            if lane is None:
+                lane = level.lanes[item.room] = deque()
+                level.rooms.append(item.room)
+            lane.append(item)
+        level.size += 1
+        self._size += 1
+        if item.key is not None:
+            self._pending[item.key] = item
+        if self._nonempty is not None:
+            self._nonempty.set()
+
+    def retry(self, item: OutboundMessage) -> bool:
+        """Queues a message the server rejected, ahead of its room's others.
+
+        Args:
+            item (OutboundMessage): The rejected message.
+
+        Returns:
+            bool: True if the message was queued, False if it updates a
+                uhtml box which already has a newer update queued.
+        """
+        item.attempts += 1
+        if item.key is not None:
+            # the box may not show what was last sent any more
+            self._sent_html.pop(item.key, None)
+            if item.key in self._pending:
+                return False
+        self.put_item(item, front=True)
+        return True
+
+    def peek(self) -> Optional[OutboundMessage]:
+        """Returns the next message, without removing it.
+
+        Returns:
+            Optional[OutboundMessage]: The next message, or None if the
+                queue is empty.
+        """
+        for level in self._levels:
+            if level.size:
+                return level.lanes[level.rooms[0]][0]
+        return None
+
+    def get_nowait(
+        self, ready: Optional[Callable[[str], bool]] = None
+    ) -> OutboundMessage:
+        """Removes and returns the next message.
+
+        Args:
+            ready (Callable[[str], bool], optional): Called with a room ID,
+                in the order rooms would be served, until it returns True.
+                Rooms it returns False for are skipped, keeping their turn.
+                Defaults to None, which takes the next message.
+
+        Raises:
+            asyncio.QueueEmpty: If the queue is empty, or no room is ready.
+
+        Returns:
+            OutboundMessage: The next message.
+        """
+        for level in self._levels:
+            if not level.size:
+                continue
+            if ready is None:
+                room = level.rooms.popleft()
+            else:
+                for i, room in enumerate(level.rooms):
+                    if ready(room):
+                        del level.rooms[i]
+                        break
+                else:
+                    continue
+            lane = level.lanes[room]
+            item = lane.popleft()
+            if lane:
+                level.rooms.append(room)
+            else:
+                del level.lanes[room]
+            level.size -= 1
+            self._size -= 1
+            self._taken(item, self.clock())
+            return item
+        raise asyncio.QueueEmpty()
+
+    def rooms(self) -> Set[str]:
+        """Returns the rooms with messages queued.
+
+        Returns:
+            Set[str]: The room IDs.
+        """
+        return {room for level in self._levels for room in level.lanes}
+
+    def coalesce(
+        self,
+        item: OutboundMessage,
+        max_lines: int = COALESCE_MAX_LINES,
+        max_bytes: int = COALESCE_MAX_BYTES,
+    ) -> OutboundMessage:
+        """Merges the messages queued behind an item for the same room.
+
+        Messages with the same room and priority as the item are taken off
+        the queue, in order, while the merged message stays within the
+        limits. They are joined with newlines into one message, which PS
+        handles as separate lines.
+
+        Args:
+            item (OutboundMessage): A message just taken off the queue.
+            max_lines (int, optional): The maximum number of lines in the
+                merged message. Defaults to COALESCE_MAX_LINES.
+            max_bytes (int, optional): The maximum size of the merged frame
+                in bytes. Defaults to COALESCE_MAX_BYTES.
+
+        Returns:
+            OutboundMessage: The merged message, or the item itself if
+                nothing could be merged.
+        """
+        level = self._levels[item.priority]
+        lane = level.lanes.get(item.room)
+        if not lane:
+            return item
+
+        messages = [item.message]
+        lines = item.message.count("\n") + 1
+        size = len(item.frame.encode())
+        now = self.clock()
+        while lane:
+            message = lane[0].message
+            message_lines = message.count("\n") + 1
+            message_size = len(message.encode()) + 1
+            if lines + message_lines > max_lines or size + message_size > max_bytes:
+                break
+            merged = lane.popleft()
+            level.size -= 1
+            self._size -= 1
+            self._taken(merged, now)
+            messages.append(message)
+            lines += message_lines
+            size += message_size
+
+        if not lane:
+            del level.lanes[item.room]
+            level.rooms.remove(item.room)
+        if len(messages) == 1:
+            return item
+        return OutboundMessage(
+            item.room, "\n".join(messages), item.priority, item.enqueued
+        )
+
+    def _taken(self, item: OutboundMessage, now: float) -> None:
+        """Records that a message was taken off the queue to be sent.
+
+        Args:
+            item (OutboundMessage): The message.
+            now (float): The current time.
+        """
+        self.wait_stats[item.priority].add(now - item.enqueued)
+        if item.key is not None:
+            del self._pending[item.key]
+            uhtml = parse_uhtml(item.message)
+            if uhtml is not None:
+                self._sent_html[item.key] = uhtml[2]
+
+    async def wait(self) -> None:
+        """Waits until at least one message is queued."""
+        while not self._size:
+            if self._nonempty is None:
+                self._nonempty = asyncio.Event()
+            self._nonempty.clear()
+            await self._nonempty.wait()
+
+    async def wait_put(self, timeout: Optional[float] = None) -> bool:
+        """Waits until a message is queued.
+
+        Args:
+            timeout (float, optional): The longest to wait, in seconds.
+                Defaults to None, which waits forever.
+
+        Returns:
+            bool: True if a message was queued, False if the timeout passed.
+        """
+        if self._nonempty is None:
+            self._nonempty = asyncio.Event()
+        self._nonempty.clear()
+        try:
+            await asyncio.wait_for(self._nonempty.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def get(self) -> OutboundMessage:
+        """Waits for a message, then removes and returns it.
+
+        Returns:
+            OutboundMessage: The next message.
+        """
+        await self.wait()
+        return self.get_nowait()
+
+    def clear(self) -> int:
+        """Discards every queued message, and forgets the HTML last sent.
+
+        Clearing the queue means starting over, e.g. on a new connection,
+        where boxes may not show what was sent before, so unchanged uhtml
+        updates are sent again.
+
+        Returns:
+            int: The number of messages discarded.
+        """
+        discarded = self._size
+        self._levels = [_Level() for _ in Priority]
+        self._size = 0
+        self._pending.clear()
+        self._sent_html.clear()
+        return discarded
+
+    def __str__(self) -> str:
+        """Returns a string representation of the queue.
+
+        Returns:
+            str: The string representation of the queue.
+        """
+        sizes = ", ".join(f"{p.name}={self._levels[p].size}" for p in Priority)
+        return "OutboundQueue({})".format(sizes)
+
+    def __repr__(self) -> str:
+        """Returns a representation of the queue.
+
+        Returns:
+            str: The representation of the queue.
+        """
+        return self.__str__()
@@ -10,8 +10,10 @@ from aiohttp import CookieJar
 from aiohttp.abc import AbstractCookieJar
 
 from pyshowdown.client import Client
+from pyshowdown.log import logger
 from pyshowdown.message import ChallstrMessage, Message
-from pyshowdown.plugins.plugin import BasePlugin
+from pyshowdown.outbound import Priority
+from pyshowdown.plugins.plugin import BasePlugin, SystemPlugin
 
 base_url = "https://play.pokemonshowdown.com/api"
 
@@ -106,11 +108,10 @@ async def password_login(client: Client, challstr: str) -> None:
                             client.print("Successfully logged in using cookies.")
                             valid_cookies = True
                         else:
-                            client.print("Cookies are invalid.")
-                            client.print(result)
+                            logger.warning("Cookies are invalid: %s", result)
 
             except (aiohttp.ClientError, json.JSONDecodeError) as e:
-                client.print(f"Error during cookie login: {e}")
+                logger.warning("Error during cookie login: %s", e)
 
     if not valid_cookies:
         client.print("Cookies are invalid. Logging in again...")
@@ -142,29 +143,22 @@ async def password_login(client: Client, challstr: str) -> None:
                         break
 
                 except Exception as e:
-                    client.print("Error logging in: {}".format(e))
+                    logger.warning("Error logging in: %s", e)
                     await asyncio.sleep(10)
 
     if valid_cookies and result and result.get("assertion"):
         client.logging_in = True
         await client.send(
-            "", "/trn {},0,{}".format(client.username, result["assertion"])
+            "",
+            "/trn {},0,{}".format(client.username, result["assertion"]),
+            Priority.CONTROL,
         )
     else:
-        client.print("Failed to log in after multiple attempts.")
+        logger.error("Failed to log in after multiple attempts.")
 
 
-class ChallstrHandler(BasePlugin):
-    async def match(self, message: Message) -> bool:
-        """Returns true if the message is a challstr.
-
-        Args:
-            message (Message): The message to check.
-
-        Returns:
-            bool: True if the message is a challstr, False otherwise.
-        """
-        return isinstance(message, ChallstrMessage)
+class ChallstrHandler(SystemPlugin):
+    message_types = (ChallstrMessage,)
 
     async def response(self, message: Message) -> None:
         """Responds to a challstr message and logs in.
@@ -177,7 +171,7 @@ class ChallstrHandler(BasePlugin):
             if self.client.login_type == "password":
                 await password_login(self.client, message.challstr)
             else:
-                self.client.print("Login type not supported.")
+                logger.error("Login type not supported.")
 
 
 def setup(client: Client) -> List[BasePlugin]:
@@ -1,24 +1,15 @@
 from typing import List
 
 from pyshowdown.client import Client
-from pyshowdown.plugins.plugin import BasePlugin
+from pyshowdown.plugins.plugin import BasePlugin, SystemPlugin
 from pyshowdown.message import Message, DeinitMessage
 
 
-class DeinitHandler(BasePlugin):
-    async def match(self, message: Message) -> bool:
-        """Returns true if the message is a deinit message.
-
-        Args:
-            message (Message): The message to check.
-
-        Returns:
-            bool: True if the message is a deinit message, False otherwise.
-        """
-        return isinstance(message, DeinitMessage)
+class DeinitHandler(SystemPlugin):
+    message_types = (DeinitMessage,)
 
     async def response(self, message: Message) -> None:
-        """Removes the room from the Client's room dict.
+        """Removes the room from the Client's room dict, and forgets its users.
 
         PS also sends a deinit message if you join a room using a
         room alias (appearing as if from the alias room), so we
@@ -29,6 +20,8 @@ class DeinitHandler(BasePlugin):
         """
         if message.room in self.client.rooms:
             del self.client.rooms[message.room]
+            self.client.set_rank(message.room, None)
+            self.client.user_registry.clear(message.room)
 
 
 def setup(client: Client) -> List[BasePlugin]:
@@ -2,21 +2,12 @@ from typing import List
 
 from pyshowdown import room
 from pyshowdown.client import Client
-from pyshowdown.plugins.plugin import BasePlugin
+from pyshowdown.plugins.plugin import BasePlugin, SystemPlugin
 from pyshowdown.message import Message, InitMessage, TimestampMessage
 
 
-class InitHandler(BasePlugin):
-    async def match(self, message: Message) -> bool:
-        """Returns true if the message is an init message.
-
-        Args:
-            message (Message): The message to check.
-
-        Returns:
-            bool: True if the message is an init message, False otherwise.
-        """
-        return isinstance(message, InitMessage)
+class InitHandler(SystemPlugin):
+    message_types = (InitMessage,)
 
     async def response(self, message: Message) -> None:
         """Creates the room in the Client's room dict.
@@ -28,17 +19,8 @@ class InitHandler(BasePlugin):
         self.client.rooms[r.id] = r
 
 
-class TimestampHandler(BasePlugin):
-    async def match(self, message: Message) -> bool:
-        """Returns true if the message is a timestamp message.
-
-        Args:
-            message (Message): The message to check.
-
-        Returns:
-            bool: True if the message is a timestamp message, False otherwise.
-        """
-        return isinstance(message, TimestampMessage)
+class TimestampHandler(SystemPlugin):
+    message_types = (TimestampMessage,)
 
     async def response(self, message: Message) -> None:
         """Sets the room timestamp in the Client's room dict.
@@ -1,12 +1,33 @@
-from typing import Optional
+from typing import Any, Collection, Dict, List, Optional, Tuple, Type, Union
 
-from pyshowdown.client import Client
-from pyshowdown.message import Message
+from pyshowdown.client import Client, DefaultTimeout
+from pyshowdown.command import Command, parse_command
+from pyshowdown.message import ChatMessage, Message, PMMessage
+from pyshowdown.user import RANK_ORDER
 
 
 class BasePlugin:
     # whether the plugin should respond to messages sent before joining the room
     scrollback_access: bool = False
+    # whether the plugin must see a room's messages one at a time, in order.
+    # Unordered plugins run concurrently with the rest of the room's messages.
+    ordered: bool = True
+    # message classes the plugin handles, or None for every message
+    message_types: Optional[Tuple[Type[Message], ...]] = None
+    # room IDs the plugin handles, or None for every room
+    rooms: Optional[Collection[str]] = None
+    # seconds match() and response() may take, None for no limit, or
+    # DefaultTimeout.CLIENT for the client's plugin_timeout
+    match_timeout: Union[float, None, DefaultTimeout] = DefaultTimeout.CLIENT
+    response_timeout: Union[float, None, DefaultTimeout] = DefaultTimeout.CLIENT
+    # failures (errors or timeouts) in a row after which the plugin is
+    # skipped for cooldown seconds, then given one message to try again.
+    # None keeps running the plugin however often it fails
+    failure_threshold: Optional[int] = 5
+    cooldown: float = 60.0
+    # "thread" or "process" to call blocking() in the client's pool of that
+    # kind instead of awaiting response(), or None
+    executor: Optional[str] = None
 
     def __init__(self, client: Client):
         """Initializes the plugin.
@@ -19,20 +40,31 @@ class BasePlugin:
     async def match(self, message: Message) -> bool:
         """Returns True if the message is a match for the plugin.
 
+        Plugins which declare message_types match any message of those
+        types (in one of their rooms, if declared). The client already
+        routes messages that way, so it only calls match() for plugins
+        overriding it with a more specific check.
+
         Args:
             message (Message): The message to check.
 
         Raises:
-            NotImplementedError: Always, since this is a base class.
+            NotImplementedError: If the plugin declares no message_types.
 
         Returns:
             bool: True if the message is a match, False otherwise.
         """
-        raise NotImplementedError()
+        if self.message_types is None:
+            raise NotImplementedError()
+        return isinstance(message, self.message_types) and (
+            self.rooms is None or message.room in self.rooms
+        )
 
-    async def response(self, message: Message) -> Optional[str]:
+    async def response(self, message: Message) -> Optional[Union[str, List[str]]]:
         """Returns the response for the message.
 
+        A list of lines is sent as a single websocket frame.
+
         Args:
             message (Message): The message to respond to.
 
@@ -40,6 +72,126 @@ class BasePlugin:
             NotImplementedError: Always, since this is a base class.
 
         Returns:
-            Optional[str]: The response for the message.
+            Optional[Union[str, List[str]]]: The response for the message.
+        """
+        raise NotImplementedError()
+
+    def blocking(self, message: Message) -> Optional[Union[str, List[str]]]:
+        """Returns the response for the message, for plugins with an executor.
+
+        Called instead of response() in a worker thread or process, so it
+        may block. It gets a copy of the message, and in a process, a copy
+        of the plugin without its client, so it should only compute the
+        response from them.
+
+        Args:
+            message (Message): A copy of the message to respond to.
+
+        Raises:
+            NotImplementedError: Always, since this is a base class.
+
+        Returns:
+            Optional[Union[str, List[str]]]: The response for the message.
+        """
+        raise NotImplementedError()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Returns the plugin's state for pickling, without the client.
+
+        Returns:
+            Dict[str, Any]: The plugin's attributes, except client.
+        """
+        state = self.__dict__.copy()
+        state.pop("client", None)
+        return state
+
+
+class SystemPlugin(BasePlugin):
+    """A plugin the client relies on, such as logging in or tracking rooms.
+
+    System plugins may take as long as they need, and are never skipped
+    by their circuit breaker however often they fail.
+    """
+
+    match_timeout = None
+    response_timeout = None
+    failure_threshold = None
+
+
+class CommandPlugin(BasePlugin):
+    """A plugin handling chat commands, like !roll 2d6.
+
+    The client looks up the command name of each chat message and PM in a
+    table of every command plugin's names, and calls command() only on the
+    plugins registered for it, in rooms they handle, for users of at least
+    min_rank. match() and response() aren't used.
+    """
+
+    message_types = (ChatMessage, PMMessage)
+    # the command's names, without the prefix; the first is its main name
+    commands: Tuple[str, ...] = ()
+    # other names for the commands, mapped to the main name they stand for
+    aliases: Dict[str, str] = {}
+    # the lowest rank which may use the commands, or None for everyone
+    min_rank: Optional[str] = None
+    # whether the commands can be used in PMs
+    pm: bool = True
+
+    def __init__(self, client: Client):
+        """Initializes the plugin.
+
+        Args:
+            client (Client): A reference to the client.
+
+        Raises:
+            ValueError: If min_rank isn't a rank, or an alias stands for a
+                command the plugin doesn't have.
+        """
+        super().__init__(client)
+        if self.min_rank is not None and self.min_rank not in RANK_ORDER:
+            raise ValueError(f"unknown rank {self.min_rank!r}.")
+        for alias, name in self.aliases.items():
+            if name not in self.commands:
+                raise ValueError(f"alias {alias!r} is for unknown command {name!r}.")
+
+    def names(self) -> Dict[str, str]:
+        """Returns every name the plugin's commands can be invoked with.
+
+        Returns:
+            Dict[str, str]: Lowercased names and aliases, mapped to the main
+                name they stand for.
+        """
+        names = {name.lower(): name for name in self.commands}
+        names.update((alias.lower(), name) for alias, name in self.aliases.items())
+        return names
+
+    def allows(self, rank: str) -> bool:
+        """Returns whether a user with the rank may use the commands.
+
+        Args:
+            rank (str): The user's rank.
+
+        Returns:
+            bool: True if the rank is min_rank or higher.
+        """
+        if self.min_rank is None:
+            return True
+        return RANK_ORDER.get(rank, RANK_ORDER[" "]) <= RANK_ORDER[self.min_rank]
+
+    async def command(
+        self, message: Message, command: Command
+    ) -> Optional[Union[str, List[str]]]:
+        """Returns the response to a command.
+
+        Args:
+            message (Message): The chat message or PM with the command.
+            command (Command): The command name and arguments.
+
+        Raises:
+            NotImplementedError: Always, since this is a base class.
+
+        Returns:
+            Optional[Union[str, List[str]]]: The response, sent to the room
+                or user the command came from.
         """
         raise NotImplementedError()
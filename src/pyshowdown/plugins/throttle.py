@@ -0,0 +1,66 @@
+from typing import List
+
+from pyshowdown.client import Client
+from pyshowdown.plugins.plugin import BasePlugin, SystemPlugin
+from pyshowdown.message import ErrorMessage, Message, PopupMessage, RawMessage
+
+# what PS says when it drops a message for being sent too fast
+THROTTLE_NOTICES = (
+    "Your message was not sent because you've been typing too quickly.",
+    "You are sending messages too fast",
+)
+# the class of the raw HTML notice PS sends to the room instead
+THROTTLE_NOTICE_CLASS = 'class="message-throttle-notice"'
+
+
+def is_throttle_notice(text: str) -> bool:
+    """Returns True if an error or popup says messages are being sent too fast.
+
+    Args:
+        text (str): The text of an error or popup message.
+
+    Returns:
+        bool: True if the text is a throttle notice, False otherwise.
+    """
+    return text.strip().startswith(THROTTLE_NOTICES)
+
+
+class ThrottleHandler(SystemPlugin):
+    message_types = (ErrorMessage, PopupMessage, RawMessage)
+
+    async def match(self, message: Message) -> bool:
+        """Returns True if the message is a throttle notice.
+
+        Args:
+            message (Message): The message to check.
+
+        Returns:
+            bool: True if the message is a throttle notice, False otherwise.
+        """
+        if isinstance(message, ErrorMessage):
+            return is_throttle_notice(message.error)
+        if isinstance(message, PopupMessage):
+            return is_throttle_notice(message.message)
+        if isinstance(message, RawMessage):
+            return THROTTLE_NOTICE_CLASS in message.data
+        return False
+
+    async def response(self, message: Message) -> None:
+        """Slows down sending, and resends the rejected message.
+
+        Args:
+            message (Message): The throttle notice.
+        """
+        self.client.throttled(message.room)
+
+
+def setup(client: Client) -> List[BasePlugin]:
+    """Return a list of plugins to load.
+
+    Args:
+        client (Client): The client to use.
+
+    Returns:
+        List[BasePlugin]: A list of plugins to load.
+    """
+    return [ThrottleHandler(client)]
@@ -2,21 +2,12 @@ from typing import List
 
 from pyshowdown import room
 from pyshowdown.client import Client
-from pyshowdown.plugins.plugin import BasePlugin
+from pyshowdown.plugins.plugin import BasePlugin, SystemPlugin
 from pyshowdown.message import Message, TitleMessage
 
 
-class TitleHandler(BasePlugin):
-    async def match(self, message: Message) -> bool:
-        """Returns true if the message is a title message.
-
-        Args:
-            message (Message): The message to check.
-
-        Returns:
-            bool: True if the message is a title message, False otherwise.
-        """
-        return isinstance(message, TitleMessage)
+class TitleHandler(SystemPlugin):
+    message_types = (TitleMessage,)
 
     async def response(self, message: Message) -> None:
         """Sets the room title in the Client's room dict.
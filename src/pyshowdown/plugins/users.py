@@ -2,29 +2,21 @@ from typing import List
 
 from pyshowdown import room
 from pyshowdown.client import Client
-from pyshowdown.plugins.plugin import BasePlugin
+from pyshowdown.plugins.plugin import BasePlugin, SystemPlugin
 from pyshowdown.message import (
     Message,
     UsersMessage,
     JoinMessage,
     LeaveMessage,
     RenameMessage,
+    UpdateUserMessage,
 )
 from pyshowdown.user import User
 from pyshowdown.utils import to_id
 
 
-class UsersHandler(BasePlugin):
-    async def match(self, message: Message) -> bool:
-        """Returns true if the message is a users message.
-
-        Args:
-            message (Message): The message to check.
-
-        Returns:
-            bool: True if the message is a users message, False otherwise.
-        """
-        return isinstance(message, UsersMessage)
+class UsersHandler(SystemPlugin):
+    message_types = (UsersMessage,)
 
     async def response(self, message: Message) -> None:
         """Sets the room users in the Client's room dict.
@@ -36,19 +28,13 @@ class UsersHandler(BasePlugin):
             r = room.Room(message.room)
             if message.users is not None:
                 self.client.rooms[r.id].users = message.users
+                me = message.users.get(to_id(self.client.username))
+                if me is not None:
+                    self.client.set_rank(message.room, me.rank)
 
 
-class JoinHandler(BasePlugin):
-    async def match(self, message: Message) -> bool:
-        """Returns true if the message is a join message.
-
-        Args:
-            message (Message): The message to check.
-
-        Returns:
-            bool: True if the message is a join message, False otherwise.
-        """
-        return isinstance(message, JoinMessage)
+class JoinHandler(SystemPlugin):
+    message_types = (JoinMessage,)
 
     async def response(self, message: Message) -> None:
         """Adds the user to the room's users.
@@ -60,19 +46,12 @@ class JoinHandler(BasePlugin):
             r = room.Room(message.room)
             if message.user is not None:
                 self.client.rooms[r.id].users[message.user.id] = message.user
+                if self.client.is_self(message.user.id):
+                    self.client.set_rank(message.room, message.user.rank)
 
 
-class LeaveHandler(BasePlugin):
-    async def match(self, message: Message) -> bool:
-        """Returns true if the message is a leave message.
-
-        Args:
-            message (Message): The message to check.
-
-        Returns:
-            bool: True if the message is a leave message, False otherwise.
-        """
-        return isinstance(message, LeaveMessage)
+class LeaveHandler(SystemPlugin):
+    message_types = (LeaveMessage,)
 
     async def response(self, message: Message) -> None:
         """Removes the user from the room's users.
@@ -86,17 +65,8 @@ class LeaveHandler(BasePlugin):
                 del self.client.rooms[r.id].users[message.user.id]
 
 
-class RenameHandler(BasePlugin):
-    async def match(self, message: Message) -> bool:
-        """Returns true if the message is a rename message.
-
-        Args:
-            message (Message): The message to check.
-
-        Returns:
-            bool: True if the message is a rename message, False otherwise.
-        """
-        return isinstance(message, RenameMessage)
+class RenameHandler(SystemPlugin):
+    message_types = (RenameMessage,)
 
     async def response(self, message: Message) -> None:
         """Renames the user in the room's users.
@@ -106,12 +76,29 @@ class RenameHandler(BasePlugin):
         """
         if isinstance(message, RenameMessage):
             r = room.Room(message.room)
-            if to_id(message.oldid) in self.client.rooms[r.id].users:
-                user = self.client.rooms[r.id].users[to_id(message.oldid)]
-                if message.user is not None:
-                    user.name = message.user.name
-                    self.client.rooms[r.id].users[message.user.id] = user
-                    del self.client.rooms[r.id].users[to_id(message.oldid)]
+            users = self.client.rooms[r.id].users
+            oldid = to_id(message.oldid)
+            if oldid in users and message.user is not None:
+                # users are shared, so the new one replaces the old one
+                # rather than being renamed in place
+                del users[oldid]
+                users[message.user.id] = message.user
+            if message.user is not None and self.client.is_self(message.user.id):
+                self.client.set_rank(message.room, message.user.rank)
+
+
+class UpdateUserHandler(SystemPlugin):
+    message_types = (UpdateUserMessage,)
+
+    async def response(self, message: Message) -> None:
+        """Records our global rank.
+
+        Args:
+            message (Message): The updateuser message.
+        """
+        if isinstance(message, UpdateUserMessage):
+            if message.user is not None and self.client.is_self(message.user.id):
+                self.client.set_global_rank(message.user.rank)
 
 
 def setup(client: Client) -> List[BasePlugin]:
@@ -128,4 +115,5 @@ def setup(client: Client) -> List[BasePlugin]:
         JoinHandler(client),
         LeaveHandler(client),
         RenameHandler(client),
+        UpdateUserHandler(client),
     ]
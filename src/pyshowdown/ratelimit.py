@@ -0,0 +1,253 @@
+import asyncio
+import time
+from typing import Callable, Optional
+
+
+def _check_rate(rate: float, burst: Optional[int]) -> None:
+    """Checks that a rate and bucket size are valid.
+
+    Args:
+        rate (float): The number of tokens added per second.
+        burst (int, optional): The size of the bucket, if given.
+
+    Raises:
+        ValueError: If rate isn't positive or burst is less than 1.
+    """
+    if rate <= 0:
+        raise ValueError("rate must be positive.")
+    if burst is not None and burst < 1:
+        raise ValueError("burst must be at least 1.")
+
+
+class RateLimiter:
+    """Base class for outbound rate limiters.
+
+    The client calls try_acquire() before sending each message, and when
+    no queued message may be sent, waits for the shortest delay().
+    """
+
+    def delay(self) -> float:
+        """Returns how long until a message may be sent.
+
+        Raises:
+            NotImplementedError: Always, since this is a base class.
+
+        Returns:
+            float: The delay in seconds, 0 if a message may be sent now.
+        """
+        raise NotImplementedError()
+
+    def try_acquire(self) -> bool:
+        """Allows a message to be sent, if one may be sent now.
+
+        Raises:
+            NotImplementedError: Always, since this is a base class.
+
+        Returns:
+            bool: True if the message may be sent, False otherwise.
+        """
+        raise NotImplementedError()
+
+    async def acquire(self) -> None:
+        """Waits until a message may be sent.
+
+        Raises:
+            NotImplementedError: Always, since this is a base class.
+        """
+        raise NotImplementedError()
+
+    def sent(self) -> None:
+        """Called after a message is sent. Does nothing by default."""
+
+    def throttled(self) -> None:
+        """Called when the server says messages are being sent too fast.
+
+        Does nothing by default.
+        """
+
+
+class TokenBucket(RateLimiter):
+    def __init__(
+        self,
+        rate: float,
+        burst: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """A token bucket rate limiter.
+
+        The bucket holds up to `burst` tokens and gains `rate` tokens per
+        second. Sending a message takes one token, so after an idle period
+        up to `burst` messages go out immediately, and after that one goes
+        out every 1 / rate seconds.
+
+        Args:
+            rate (float): The number of tokens added per second.
+            burst (int, optional): The size of the bucket. Defaults to 1.
+            clock (Callable[[], float], optional): The clock to use, in
+                seconds. Defaults to time.monotonic.
+
+        Raises:
+            ValueError: If rate isn't positive or burst is less than 1.
+        """
+        _check_rate(rate, burst)
+        self.clock = clock
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = clock()
+        self._changed: Optional[asyncio.Event] = None
+
+    def set_rate(self, rate: float, burst: Optional[int] = None) -> None:
+        """Changes the refill rate, and optionally the bucket size.
+
+        Takes effect immediately, including for a sender already waiting
+        for a token.
+
+        Args:
+            rate (float): The number of tokens added per second.
+            burst (int, optional): The size of the bucket. Defaults to None,
+                which keeps the current size.
+
+        Raises:
+            ValueError: If rate isn't positive or burst is less than 1.
+        """
+        _check_rate(rate, burst)
+        # bank the tokens earned at the old rate
+        self._refill()
+        self.rate = rate
+        if burst is not None:
+            self.burst = burst
+            self.tokens = min(self.tokens, burst)
+
+        if self._changed is not None:
+            self._changed.set()
+
+    def _refill(self) -> None:
+        """Adds the tokens earned since the last update."""
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """Returns how long until a token is available.
+
+        Returns:
+            float: The delay in seconds, 0 if a token is available now.
+        """
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def try_acquire(self) -> bool:
+        """Takes a token if one is available, without waiting.
+
+        Returns:
+            bool: True if a token was taken, False otherwise.
+        """
+        if self.delay() > 0:
+            return False
+        self.tokens -= 1
+        return True
+
+    async def acquire(self) -> None:
+        """Waits for a token and takes it."""
+        while not self.try_acquire():
+            if self._changed is None:
+                self._changed = asyncio.Event()
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), self.delay())
+            except asyncio.TimeoutError:
+                pass
+
+    def __str__(self) -> str:
+        """Returns a string representation of the bucket.
+
+        Returns:
+            str: The string representation of the bucket.
+        """
+        return "TokenBucket(rate={}, burst={})".format(self.rate, self.burst)
+
+    def __repr__(self) -> str:
+        """Returns a representation of the bucket.
+
+        Returns:
+            str: The representation of the bucket.
+        """
+        return self.__str__()
+
+
+class AdaptiveTokenBucket(TokenBucket):
+    def __init__(
+        self,
+        rate: float,
+        burst: int = 1,
+        min_rate: Optional[float] = None,
+        max_rate: Optional[float] = None,
+        increase: Optional[float] = None,
+        decrease: float = 0.5,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """A token bucket which adapts its rate to the server's feedback.
+
+        When the server says messages are being sent too fast, the rate is
+        multiplied by `decrease` and the bucket is emptied. Each message
+        sent after that adds `increase` to the rate again, up to
+        `max_rate`.
+
+        Args:
+            rate (float): The initial number of tokens added per second.
+            burst (int, optional): The size of the bucket. Defaults to 1.
+            min_rate (float, optional): The lowest rate to back off to.
+                Defaults to None, which is a tenth of the initial rate.
+            max_rate (float, optional): The highest rate to recover to.
+                Defaults to None, which is the initial rate.
+            increase (float, optional): How much each message sent adds to
+                the rate. Defaults to None, which is a twentieth of the
+                initial rate.
+            decrease (float, optional): What the rate is multiplied by when
+                throttled. Defaults to 0.5.
+            clock (Callable[[], float], optional): The clock to use, in
+                seconds. Defaults to time.monotonic.
+
+        Raises:
+            ValueError: If any rate isn't positive, burst is less than 1,
+                min_rate is greater than max_rate, or decrease isn't between
+                0 and 1.
+        """
+        super().__init__(rate, burst, clock)
+        self.min_rate = rate / 10 if min_rate is None else min_rate
+        self.max_rate = rate if max_rate is None else max_rate
+        self.increase = rate / 20 if increase is None else increase
+        _check_rate(self.min_rate, None)
+        _check_rate(self.increase, None)
+        if self.min_rate > self.max_rate:
+            raise ValueError("min_rate must not be greater than max_rate.")
+        if not 0 < decrease < 1:
+            raise ValueError("decrease must be between 0 and 1.")
+        self.decrease = decrease
+        self.throttle_count = 0
+
+    def sent(self) -> None:
+        """Raises the rate additively, up to max_rate."""
+        if self.rate < self.max_rate:
+            self.set_rate(min(self.max_rate, self.rate + self.increase))
+
+    def throttled(self) -> None:
+        """Lowers the rate multiplicatively and empties the bucket."""
+        self.throttle_count += 1
+        self.set_rate(max(self.min_rate, self.rate * self.decrease))
+        self.tokens = 0.0
+
+    def __str__(self) -> str:
+        """Returns a string representation of the bucket.
+
+        Returns:
+            str: The string representation of the bucket.
+        """
+        return (
+            "AdaptiveTokenBucket(rate={}, burst={}, min_rate={}, max_rate={})".format(
+                self.rate, self.burst, self.min_rate, self.max_rate
+            )
+        )
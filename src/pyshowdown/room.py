@@ -1,6 +1,169 @@
-from typing import Optional, Dict
+from bisect import bisect_left, insort
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
 
-from pyshowdown.user import User
+from pyshowdown.user import RANK_ORDER, SortKey, User, sort_key
+
+
+class RoomUsers(Dict[str, User]):
+    """A room's users, keyed by ID, which also keeps them in userlist order.
+
+    It's a dict, updated as usual, but every change also updates a sorted
+    list of the users' sort keys. Listing the users in order, the first n,
+    or those within a range of ranks then takes O(log n + k) without
+    sorting or comparing Users.
+    """
+
+    __slots__ = ("_keys", "_order")
+
+    def __init__(self, users: Optional[Mapping[str, User]] = None):
+        """Initializes the users.
+
+        Args:
+            users (Mapping[str, User], optional): The users, keyed by ID.
+                Defaults to None, which starts with no users.
+        """
+        super().__init__()
+        self._keys: Dict[str, SortKey] = {}
+        self._order: List[SortKey] = []
+        if users:
+            dict.update(self, users)
+            self._keys = {id: self._key(id, user) for id, user in self.items()}
+            self._order = sorted(self._keys.values())
+
+    @staticmethod
+    def _key(id: str, user: User) -> SortKey:
+        """Returns the sort key of a user, stored under the given ID.
+
+        Args:
+            id (str): The ID the user is stored under.
+            user (User): The user.
+
+        Returns:
+            SortKey: The key, ending with the ID it's stored under.
+        """
+        key = sort_key(user)
+        return key if key[3] == id else key[:3] + (id,)
+
+    def _unindex(self, id: str) -> None:
+        """Removes a user's key from the sorted list.
+
+        Args:
+            id (str): The user's ID.
+        """
+        key = self._keys.pop(id)
+        del self._order[bisect_left(self._order, key)]
+
+    def __setitem__(self, id: str, user: User) -> None:
+        key = self._key(id, user)
+        old = self._keys.get(id)
+        if old != key:
+            if old is not None:
+                self._unindex(id)
+            insort(self._order, key)
+            self._keys[id] = key
+        dict.__setitem__(self, id, user)
+
+    def __delitem__(self, id: str) -> None:
+        dict.__delitem__(self, id)
+        self._unindex(id)
+
+    def pop(self, id: str, *default: Any) -> Any:
+        if id in self:
+            self._unindex(id)
+        return dict.pop(self, id, *default)
+
+    def popitem(self) -> Tuple[str, User]:
+        id, user = dict.popitem(self)
+        self._unindex(id)
+        return id, user
+
+    def setdefault(self, id: str, default: User) -> User:  # type: ignore[override]
+        if id not in self:
+            self[id] = default
+        return self[id]
+
+    def update(self, *args: Any, **kwargs: User) -> None:
+        for id, user in dict(*args, **kwargs).items():
+            self[id] = user
+
+    def __ior__(self, other: Any) -> "RoomUsers":  # type: ignore[override]
+        self.update(other)
+        return self
+
+    def clear(self) -> None:
+        dict.clear(self)
+        self._keys.clear()
+        self._order.clear()
+
+    def copy(self) -> "RoomUsers":
+        return RoomUsers(self)
+
+    def __reduce__(self) -> Tuple[type, Tuple[Dict[str, User]]]:
+        # rebuilt from the users, rather than item by item on top of a
+        # copied index
+        return RoomUsers, (dict(self),)
+
+    def _users(self, keys: Iterable[SortKey]) -> List[User]:
+        """Returns the users with the given keys.
+
+        Args:
+            keys (Iterable[SortKey]): The keys.
+
+        Returns:
+            List[User]: The users.
+        """
+        get = dict.__getitem__
+        return [get(self, key[3]) for key in keys]
+
+    def ordered(self) -> Iterator[User]:
+        """Iterates over the users in userlist order.
+
+        That's by rank, then with users who aren't away first, then by
+        name, case-insensitively, as sorted() orders Users.
+
+        Returns:
+            Iterator[User]: The users.
+        """
+        get = dict.__getitem__
+        return (get(self, key[3]) for key in list(self._order))
+
+    def top(self, n: int) -> List[User]:
+        """Returns the first users in userlist order.
+
+        Args:
+            n (int): The number of users.
+
+        Returns:
+            List[User]: Up to n users.
+        """
+        return self._users(self._order[:n])
+
+    def with_rank(self, lowest: str, highest: Optional[str] = None) -> List[User]:
+        """Returns the users with a rank in a range, in userlist order.
+
+        For example, with_rank("%") returns the room's staff, and
+        with_rank("+", "+") its voices.
+
+        Args:
+            lowest (str): The lowest rank to include.
+            highest (str, optional): The highest rank to include. Defaults
+                to None, which includes every rank above lowest.
+
+        Raises:
+            ValueError: If a rank isn't in RANK_ORDER.
+
+        Returns:
+            List[User]: The users.
+        """
+        for rank in (lowest, highest):
+            if rank is not None and rank not in RANK_ORDER:
+                raise ValueError(f"unknown rank {rank!r}.")
+        order = self._order
+        # keys start with the rank order, so a 1-tuple sorts before all
+        # the keys of that rank
+        start = 0 if highest is None else bisect_left(order, (RANK_ORDER[highest],))
+        end = bisect_left(order, (RANK_ORDER[lowest] + 1,))
+        return self._users(order[start:end])
 
 
 class Room:
@@ -12,7 +175,7 @@ class Room:
         """
         self.id = id
         self.title: Optional[str] = None
-        self.users: Dict[str, User] = {}
+        self._users = RoomUsers()
         self.is_battle = self.id.startswith("battle-")
         if self.is_battle:
             self.is_private_battle = self.id.count("-") == 3
@@ -23,6 +186,15 @@ class Room:
                 self.id = self.id.replace("-" + self.password, "")
         self.join_time: Optional[int] = None
 
+    @property
+    def users(self) -> RoomUsers:
+        """The room's users, keyed by ID."""
+        return self._users
+
+    @users.setter
+    def users(self, users: Mapping[str, User]) -> None:
+        self._users = users if isinstance(users, RoomUsers) else RoomUsers(users)
+
     def __str__(self) -> str:
         return "Room({})".format(self.id)
 
@@ -0,0 +1,212 @@
+import asyncio
+from collections import deque
+from typing import Callable, Collection, Deque, Optional, Tuple, Type
+
+from pyshowdown.message import Message
+
+OVERFLOW_POLICIES = ("block", "drop-oldest", "drop-newest")
+
+
+def _wake(waiters: "Deque[asyncio.Future[None]]") -> None:
+    """Wakes the first waiter which is still waiting.
+
+    Args:
+        waiters (Deque[asyncio.Future[None]]): The waiters, oldest first.
+    """
+    while waiters:
+        waiter = waiters.popleft()
+        if not waiter.done():
+            waiter.set_result(None)
+            return
+
+
+class Subscription:
+    def __init__(
+        self,
+        message_types: Tuple[Type[Message], ...] = (),
+        rooms: Optional[Collection[str]] = None,
+        maxsize: int = 100,
+        overflow: str = "block",
+        on_close: Optional[Callable[["Subscription"], None]] = None,
+    ):
+        """A stream of parsed messages, consumed with async for.
+
+        The client puts each message the subscription wants into its
+        buffer, and the consumer takes them out at its own pace. When the
+        buffer is full, overflow decides what happens to a new message:
+        "block" makes the client wait for space, which holds up that
+        room's messages, "drop-oldest" discards the oldest buffered
+        message to make room, and "drop-newest" discards the new one.
+
+        Messages are shared with the plugins and other subscriptions, so
+        they shouldn't be modified.
+
+        Args:
+            message_types (Tuple[Type[Message], ...], optional): The message
+                classes to stream. Defaults to (), which streams every
+                message.
+            rooms (Collection[str], optional): The rooms to stream messages
+                from. Defaults to None, which streams every room.
+            maxsize (int, optional): The most messages to buffer. Defaults
+                to 100.
+            overflow (str, optional): "block", "drop-oldest" or
+                "drop-newest". Defaults to "block".
+            on_close (Callable[[Subscription], None], optional): Called
+                with the subscription when it's closed. Defaults to None.
+
+        Raises:
+            ValueError: If maxsize is less than 1 or overflow isn't a
+                known policy.
+        """
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1.")
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.message_types = message_types
+        self.rooms = rooms
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.on_close = on_close
+        self.closed = False
+        # messages put in the buffer, taken out, and discarded
+        self.received = 0
+        self.delivered = 0
+        self.dropped = 0
+        # times the client had to wait for space, and the fullest the
+        # buffer has been
+        self.blocked = 0
+        self.max_lag = 0
+        self._buffer: Deque[Message] = deque()
+        self._getters: "Deque[asyncio.Future[None]]" = deque()
+        self._putters: "Deque[asyncio.Future[None]]" = deque()
+
+    @property
+    def lag(self) -> int:
+        """The number of messages waiting to be consumed."""
+        return len(self._buffer)
+
+    def wants(self, message: Message) -> bool:
+        """Returns whether the subscription streams a message.
+
+        Args:
+            message (Message): The message.
+
+        Returns:
+            bool: True if the message is of one of the subscription's
+                types, from one of its rooms.
+        """
+        return (not self.message_types or isinstance(message, self.message_types)) and (
+            self.rooms is None or message.room in self.rooms
+        )
+
+    async def put(self, message: Message) -> None:
+        """Adds a message to the buffer, applying the overflow policy.
+
+        Args:
+            message (Message): The message.
+        """
+        if self.closed:
+            return
+        buffer = self._buffer
+        if len(buffer) >= self.maxsize:
+            if self.overflow == "drop-newest":
+                self.dropped += 1
+                return
+            if self.overflow == "drop-oldest":
+                buffer.popleft()
+                self.dropped += 1
+            else:
+                self.blocked += 1
+                while len(buffer) >= self.maxsize and not self.closed:
+                    waiter = asyncio.get_running_loop().create_future()
+                    self._putters.append(waiter)
+                    try:
+                        await waiter
+                    except asyncio.CancelledError:
+                        if len(buffer) < self.maxsize:
+                            _wake(self._putters)
+                        raise
+                if self.closed:
+                    return
+        buffer.append(message)
+        self.received += 1
+        if len(buffer) > self.max_lag:
+            self.max_lag = len(buffer)
+        _wake(self._getters)
+
+    async def get(self) -> Message:
+        """Takes the oldest message out of the buffer, waiting for one.
+
+        Raises:
+            StopAsyncIteration: If the subscription is closed and the
+                buffer is empty.
+
+        Returns:
+            Message: The message.
+        """
+        buffer = self._buffer
+        while not buffer:
+            if self.closed:
+                raise StopAsyncIteration
+            waiter = asyncio.get_running_loop().create_future()
+            self._getters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                # pass the wakeup on, in case this waiter was chosen
+                if buffer:
+                    _wake(self._getters)
+                raise
+        message = buffer.popleft()
+        self.delivered += 1
+        _wake(self._putters)
+        return message
+
+    def close(self) -> None:
+        """Stops streaming messages.
+
+        Messages already buffered can still be consumed, after which
+        iteration ends.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        for waiter in (*self._getters, *self._putters):
+            if not waiter.done():
+                waiter.set_result(None)
+        self._getters.clear()
+        self._putters.clear()
+        if self.on_close is not None:
+            self.on_close(self)
+
+    def __aiter__(self) -> "Subscription":
+        return self
+
+    async def __anext__(self) -> Message:
+        return await self.get()
+
+    async def __aenter__(self) -> "Subscription":
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def __str__(self) -> str:
+        """Returns a string representation of the subscription.
+
+        Returns:
+            str: The string representation of the subscription.
+        """
+        return "Subscription({}, lag={}, dropped={})".format(
+            [cls.__name__ for cls in self.message_types] or "all",
+            self.lag,
+            self.dropped,
+        )
+
+    def __repr__(self) -> str:
+        """Returns a representation of the subscription.
+
+        Returns:
+            str: The representation of the subscription.
+        """
+        return self.__str__()
@@ -1,4 +1,6 @@
-from pyshowdown.utils import to_id
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from pyshowdown.utils import to_id, to_ids
 
 
 RANKS = set(["~", "&", "#", "★", "*", "@", "%", "☆", "§", "+", "^", " ", "!", "‽"])
@@ -21,17 +23,41 @@ RANK_ORDER = {
 }
 
 
+def is_trusted_rank(rank: str) -> bool:
+    """Returns True if PS gives users with the rank looser send limits.
+
+    That's bot rank and every staff rank above it.
+
+    Args:
+        rank (str): The rank symbol.
+
+    Returns:
+        bool: True if the rank is trusted, False otherwise.
+    """
+    return RANK_ORDER.get(rank, RANK_ORDER[" "]) <= RANK_ORDER["*"]
+
+
 class User:
-    def __init__(self, name: str, rank: str, status: str, away: bool):
+    __slots__ = ("id", "name", "rank", "status", "away")
+
+    def __init__(
+        self, name: str, rank: str, status: str, away: bool, id: Optional[str] = None
+    ):
         """Represents a user.
 
+        Users parsed by a client come from its UserRegistry, which keeps one
+        User per user and room: it's shared by that room's messages and its
+        user list, but never with other rooms.
+
         Args:
             name (str): The user's name, without rank.
             rank (str): The user's rank.
             status (str): The user's status.
             away (bool): Whether the user is away.
+            id (str, optional): The user's ID, if already known. Defaults
+                to None, which computes it from the name.
         """
-        self.id = to_id(name)
+        self.id = to_id(name) if id is None else id
         self.name = name
         self.rank = rank
         self.status = status
@@ -78,3 +104,241 @@ class User:
     def fullname(self) -> str:
         """Return the user's name with rank."""
         return "{}{}".format(self.rank, self.name)
+
+
+# rank order, away, lowercased name, ID
+SortKey = Tuple[int, bool, str, str]
+
+
+def sort_key(user: User) -> SortKey:
+    """Returns a key sorting users in PS userlist order, as User.__gt__ does.
+
+    Comparing keys is much cheaper than calling __gt__, so they can be
+    computed once per user and kept, e.g. in a sorted list. The ID breaks
+    ties, so every user of a room has a different key.
+
+    Args:
+        user (User): The user.
+
+    Returns:
+        SortKey: The key.
+    """
+    return (RANK_ORDER.get(user.rank, 108), user.away, user.name.lower(), user.id)
+
+
+class UserIdentity(NamedTuple):
+    """The part of a user which is the same in every room."""
+
+    id: str
+    name: str
+
+
+class UserRegistry:
+    def __init__(self, maxsize: int = 10000):
+        """Interns the users in the user strings of protocol messages.
+
+        Each user ID has one UserIdentity, shared by every room, so a user
+        in several rooms has their name and ID stored once. Each room has
+        one User per user in it, holding their rank, status and away flag
+        there, which is shared by the room's messages and user list while
+        it's up to date. A user string with a different rank or status
+        gives a new User, leaving earlier messages with the one they were
+        parsed with. Since Users aren't shared between rooms, changing one
+        only affects its room.
+
+        The identities, and each room's users, are bounded by maxsize, and
+        the oldest are forgotten first, which only costs sharing.
+
+        Args:
+            maxsize (int, optional): The most identities, and users per room,
+                to keep. Defaults to 10000.
+
+        Raises:
+            ValueError: If maxsize is less than 1.
+        """
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1.")
+        self.maxsize = maxsize
+        self._identities: Dict[str, UserIdentity] = {}
+        self._rooms: Dict[str, Dict[str, User]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _store(self, cache: Dict[str, Any], key: str, value: Any) -> None:
+        """Adds an entry to a cache, making room for it if needed.
+
+        Args:
+            cache (Dict[str, Any]): The cache.
+            key (str): The key.
+            value (Any): The value.
+        """
+        if key not in cache and len(cache) >= self.maxsize:
+            del cache[next(iter(cache))]
+        cache[key] = value
+
+    def identity(self, name: str, id: Optional[str] = None) -> UserIdentity:
+        """Returns the identity of a user.
+
+        Args:
+            name (str): The user's name.
+            id (str, optional): The user's ID, if already known. Defaults to
+                None, which computes it with to_id().
+
+        Returns:
+            UserIdentity: The identity. It's replaced when the user's name
+                changes, e.g. its capitalisation.
+        """
+        if id is None:
+            id = to_id(name)
+        identity = self._identities.get(id)
+        if identity is None or identity.name != name:
+            identity = UserIdentity(id, name)
+            self._store(self._identities, id, identity)
+        return identity
+
+    def _record(
+        self,
+        room: str,
+        name: str,
+        id: str,
+        rank: str,
+        status: Optional[str],
+        away: bool,
+    ) -> User:
+        """Returns a room's User for a user, replacing it if it's out of date.
+
+        Args:
+            room (str): The room ID.
+            name (str): The user's name.
+            id (str): The user's ID.
+            rank (str): The user's rank.
+            status (str, optional): The user's status, or None to keep the
+                room's current status and away flag.
+            away (bool): Whether the user is away, if status isn't None.
+
+        Returns:
+            User: The user.
+        """
+        users = self._rooms.get(room)
+        if users is None:
+            users = self._rooms[room] = {}
+        user = users.get(id)
+        if status is None:
+            status, away = ("", False) if user is None else (user.status, user.away)
+        if (
+            user is not None
+            and user.rank == rank
+            and user.name == name
+            and user.status == status
+            and user.away == away
+        ):
+            self.hits += 1
+            return user
+        self.misses += 1
+        identity = self.identity(name, id)
+        user = User(identity.name, rank, status, away, identity.id)
+        self._store(users, id, user)
+        return user
+
+    def user(self, u: str, room: str = "") -> User:
+        """Returns a room's user for a user string without a status.
+
+        Chat messages and PMs don't show statuses, so the user keeps the
+        status they have in the room.
+
+        Args:
+            u (str): The user string, e.g. "@foo".
+            room (str, optional): The room ID. Defaults to "", the lobby.
+
+        Returns:
+            User: The user.
+        """
+        name = u[1:]
+        return self._record(room, name, to_id(name), u[0], None, False)
+
+    def user_with_status(self, u: str, room: str = "") -> User:
+        """Returns a room's user for a user string with an optional status.
+
+        Args:
+            u (str): The user string, e.g. "@foo@!busy".
+            room (str, optional): The room ID. Defaults to "", the lobby.
+
+        Returns:
+            User: The user.
+        """
+        name, _, status = u[1:].partition("@")
+        return self._with_status(room, u[0], name, to_id(name), status)
+
+    def _with_status(
+        self, room: str, rank: str, name: str, id: str, status: str
+    ) -> User:
+        """Returns a room's user, given their status as in a user string.
+
+        Args:
+            room (str): The room ID.
+            rank (str): The user's rank.
+            name (str): The user's name.
+            id (str): The user's ID.
+            status (str): The user's status, starting with "!" if away.
+
+        Returns:
+            User: The user.
+        """
+        away = status.startswith("!")
+        if away:
+            status = status[1:]
+        return self._record(room, name, id, rank, status, away)
+
+    def users_with_status(self, strings: List[str], room: str = "") -> List[User]:
+        """Returns a room's users for many user strings, as user_with_status().
+
+        The IDs are computed together, with to_ids(), which is faster for a
+        room's whole user list.
+
+        Args:
+            strings (List[str]): The user strings.
+            room (str, optional): The room ID. Defaults to "", the lobby.
+
+        Returns:
+            List[User]: The users, in the same order.
+        """
+        parts = [u[1:].partition("@") for u in strings]
+        ids = to_ids([name for name, _, _ in parts])
+        return [
+            self._with_status(room, u[0], name, id, status)
+            for u, (name, _, status), id in zip(strings, parts, ids)
+        ]
+
+    def clear(self, room: Optional[str] = None) -> None:
+        """Forgets the users of a room, or every user and identity.
+
+        Args:
+            room (str, optional): The room ID. Defaults to None, which
+                forgets everything.
+        """
+        if room is None:
+            self._identities.clear()
+            self._rooms.clear()
+        else:
+            self._rooms.pop(room, None)
+
+    def __len__(self) -> int:
+        return len(self._identities)
+
+    def __str__(self) -> str:
+        """Returns a string representation of the registry.
+
+        Returns:
+            str: The string representation of the registry.
+        """
+        return "UserRegistry(identities={}, rooms={})".format(
+            len(self), len(self._rooms)
+        )
+
+    def __repr__(self) -> str:
+        """Returns a representation of the registry.
+
+        Returns:
+            str: The representation of the registry.
+        """
+        return self.__str__()
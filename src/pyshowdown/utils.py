@@ -1,14 +1,74 @@
 import colorsys
-import re
+import string as _string
+from functools import lru_cache
 from hashlib import md5
-from typing import Optional
+from typing import Dict, Iterable, List, Optional
 
+try:
+    import numpy
+except ImportError:
+    numpy = None  # type: ignore[assignment]
 
+# recently converted names kept by to_id()
+ID_CACHE_SIZE = 8192
+
+# lowercases ASCII letters, and deletes every other ASCII character except
+# letters and digits, so ASCII bytes are turned into an ID in one call
+_ID_TABLE = bytes.maketrans(
+    _string.ascii_uppercase.encode(), _string.ascii_lowercase.encode()
+)
+_NON_ID_BYTES = bytes(c for c in range(128) if not chr(c).isalnum())
+# separates names in to_ids(); it's not deleted, so it survives translation
+_SEPARATOR = "\0"
+_NON_ID_BYTES_BUT_SEPARATOR = _NON_ID_BYTES.replace(_SEPARATOR.encode(), b"")
+
+
+@lru_cache(maxsize=ID_CACHE_SIZE)
 def to_id(string: Optional[str]) -> str:
-    """Convert a string to an ID."""
+    """Convert a string to an ID.
+
+    Only ASCII letters and digits are kept, lowercased. Encoding to ASCII
+    drops everything else outside ASCII, and a byte translation drops the
+    rest and lowercases in a single pass. Recent results are cached, so
+    use text_to_id() for free text such as whole chat lines.
+    """
     if string is None:
         return ""
-    return (re.sub(r"[^A-Za-z0-9]", "", string)).lower()
+    return text_to_id(string)
+
+
+def text_to_id(text: str) -> str:
+    """Convert text to an ID, as to_id() does, without caching the result.
+
+    For text which is rarely converted twice, like chat lines, which would
+    only push names out of to_id()'s cache.
+    """
+    return (
+        text.encode("ascii", "ignore")
+        .translate(_ID_TABLE, _NON_ID_BYTES)
+        .decode("ascii")
+    )
+
+
+def to_ids(strings: Iterable[str]) -> List[str]:
+    """Convert many strings to IDs at once, as to_id() does.
+
+    The strings are joined and translated together, which is much faster
+    than converting them one by one when most aren't cached, e.g. for the
+    user list of a room just joined.
+    """
+    strings = list(strings)
+    ids = (
+        _SEPARATOR.join(strings)
+        .encode("ascii", "ignore")
+        .translate(_ID_TABLE, _NON_ID_BYTES_BUT_SEPARATOR)
+        .decode("ascii")
+        .split(_SEPARATOR)
+    )
+    if len(ids) != len(strings):
+        # some of the strings contained the separator
+        return [to_id(string) for string in strings]
+    return ids
 
 
 def HSLToRGB(H: float, S: float, L: float) -> tuple:
@@ -20,9 +80,21 @@ def HSLToRGB(H: float, S: float, L: float) -> tuple:
     return R, G, B
 
 
+# recently computed colors kept by username_color()
+COLOR_CACHE_SIZE = 4096
+# the fewest names username_colors() vectorizes, below which NumPy's
+# overhead outweighs the savings
+VECTORIZE_THRESHOLD = 64
+
+
 def username_color(name: str) -> tuple:
     """Get the color of a username."""
-    name = to_id(name)
+    return _id_color(to_id(name))
+
+
+@lru_cache(maxsize=COLOR_CACHE_SIZE)
+def _id_color(name: str) -> tuple:
+    """Get the color of a user ID."""
     hash = md5(name.encode()).hexdigest()
     H = int(hash[4:8], 16) % 360
     S = int(hash[0:4], 16) % 50 + 40
@@ -41,3 +113,91 @@ def username_color(name: str) -> tuple:
         HLmod += (15 - Hdist) / 3
     L += HLmod
     return H, S, L
+
+
+def username_colors(
+    names: Iterable[str], vectorized: Optional[bool] = None
+) -> Dict[str, tuple]:
+    """Get the colors of many usernames, e.g. every user of a Room.
+
+    The colors are the same as username_color()'s, down to the bit. With
+    NumPy installed, the color math for many names is done on arrays.
+
+    Args:
+        names (Iterable[str]): The usernames or IDs, e.g. a Room's users.
+        vectorized (bool, optional): Whether to use NumPy. Defaults to None,
+            which uses it when it's installed and there are at least
+            VECTORIZE_THRESHOLD names.
+
+    Raises:
+        ImportError: If vectorized is True but NumPy isn't installed.
+
+    Returns:
+        Dict[str, tuple]: The colors, keyed by ID.
+    """
+    ids = list(dict.fromkeys(to_ids(names)))
+    if vectorized is None:
+        vectorized = numpy is not None and len(ids) >= VECTORIZE_THRESHOLD
+    if not vectorized:
+        return {id: _id_color(id) for id in ids}
+    if numpy is None:
+        raise ImportError("vectorized username_colors() needs NumPy.")
+    # a local, so the check above still holds inside v()
+    np = numpy
+    if not ids:
+        return {}
+
+    # the first 12 hex digits of each hash, as three 16 bit numbers
+    digests = b"".join(md5(id.encode()).digest() for id in ids)
+    words = np.frombuffer(digests, dtype=">u2").reshape(-1, 8)[:, :3]
+    words = words.astype(np.int64)
+    H = words[:, 1] % 360
+    S = words[:, 0] % 50 + 40
+    L = words[:, 2] % 20 + 30
+
+    # HSLToRGB and colorsys.hls_to_rgb, on arrays, in the same order of
+    # operations so the rounding is the same
+    hue = H / 360
+    saturation = S / 100
+    light = L / 100
+    m2 = np.where(
+        light <= 0.5,
+        light * (1.0 + saturation),
+        light + saturation - (light * saturation),
+    )
+    m1 = 2.0 * light - m2
+
+    def v(h):
+        h = h % 1.0
+        return np.select(
+            [h < colorsys.ONE_SIXTH, h < 0.5, h < colorsys.TWO_THIRD],
+            [
+                m1 + (m2 - m1) * h * 6.0,
+                m2,
+                m1 + (m2 - m1) * (colorsys.TWO_THIRD - h) * 6.0,
+            ],
+            m1,
+        )
+
+    R = v(hue + colorsys.ONE_THIRD)
+    G = v(hue)
+    B = v(hue - colorsys.ONE_THIRD)
+
+    lum = R * R * R * 0.2126 + G * G * G * 0.7152 + B * B * B * 0.0722
+    HLmod = (lum - 0.2) * -150
+    adjusted = (HLmod > 18) | (HLmod < 0)
+    HLmod = np.select(
+        [HLmod > 18, HLmod < 0], [(HLmod - 18) * 2.5, (HLmod - 0) / 3], 0.0
+    )
+    Hdist = np.minimum(np.abs(180 - H), np.abs(240 - H))
+    near = Hdist < 15
+    HLmod = np.where(near, HLmod + (15 - Hdist) / 3, HLmod)
+    # username_color() leaves L an int when it isn't adjusted
+    unchanged = ~(adjusted | near)
+    lightness = [
+        base if keep else value
+        for base, keep, value in zip(
+            L.tolist(), unchanged.tolist(), (L + HLmod).tolist()
+        )
+    ]
+    return dict(zip(ids, zip(H.tolist(), S.tolist(), lightness)))
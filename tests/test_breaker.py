@@ -0,0 +1,78 @@
+import unittest
+
+from pyshowdown.breaker import BreakerState, CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def test_opens_after_threshold(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=3, cooldown=10, clock=clock)
+
+        breaker.record_failure()
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+
+        breaker.record_failure()
+        self.assertIs(breaker.state, BreakerState.OPEN)
+        self.assertFalse(breaker.allow())
+        self.assertEqual(breaker.times_opened, 1)
+
+    def test_half_open(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, cooldown=10, clock=clock)
+        breaker.record_failure()
+
+        clock.now = 10
+        self.assertTrue(breaker.allow())
+        self.assertIs(breaker.state, BreakerState.HALF_OPEN)
+        # only one trial at a time
+        self.assertFalse(breaker.allow())
+
+        breaker.record_failure()
+        self.assertIs(breaker.state, BreakerState.OPEN)
+        self.assertFalse(breaker.allow())
+
+        clock.now = 20
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertIs(breaker.state, BreakerState.CLOSED)
+        self.assertTrue(breaker.allow())
+
+    def test_release(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=2, cooldown=10, clock=clock)
+        breaker.record_failure()
+        breaker.release()
+        breaker.record_failure()
+        self.assertIs(breaker.state, BreakerState.OPEN)
+
+        # a released trial lets the next call be the trial instead
+        clock.now = 10
+        self.assertTrue(breaker.allow())
+        breaker.release()
+        self.assertIs(breaker.state, BreakerState.OPEN)
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertIs(breaker.state, BreakerState.CLOSED)
+
+    def test_no_threshold(self):
+        breaker = CircuitBreaker(failure_threshold=None)
+        for _ in range(100):
+            breaker.record_failure()
+        self.assertIs(breaker.state, BreakerState.CLOSED)
+        self.assertTrue(breaker.allow())
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, CircuitBreaker, failure_threshold=0)
+        self.assertRaises(ValueError, CircuitBreaker, cooldown=-1)
@@ -0,0 +1,766 @@
+import asyncio
+import contextlib
+import io
+import logging
+import threading
+import time
+import unittest
+from typing import Any, List, Optional, Tuple
+
+from pyshowdown import message
+from pyshowdown.breaker import BreakerState
+from pyshowdown.client import (
+    MAX_RETRIES,
+    RETRY_WINDOW,
+    THROTTLE,
+    TRUSTED_THROTTLE,
+    Client,
+    PluginList,
+)
+from pyshowdown.outbound import Priority
+from pyshowdown.plugins.plugin import (
+    BasePlugin,
+    Command,
+    CommandPlugin,
+    SystemPlugin,
+    parse_command,
+)
+from pyshowdown.ratelimit import AdaptiveTokenBucket, TokenBucket
+from pyshowdown.room import Room
+
+
+class RecordingPlugin(BasePlugin):
+    def __init__(self, client: Client):
+        super().__init__(client)
+        self.seen: List[message.Message] = []
+
+    async def response(self, message: message.Message) -> Optional[str]:
+        self.seen.append(message)
+        return None
+
+
+class ChatPlugin(RecordingPlugin):
+    message_types = (message.ChatMessage,)
+
+
+class LobbyChatPlugin(RecordingPlugin):
+    message_types = (message.ChatMessage,)
+    rooms = {"lobby"}
+
+
+class HelloPlugin(RecordingPlugin):
+    message_types = (message.ChatMessage, message.PMMessage)
+
+    def __init__(self, client: Client):
+        super().__init__(client)
+        self.match_calls = 0
+
+    async def match(self, message: message.Message) -> bool:
+        self.match_calls += 1
+        return getattr(message, "message", "") == "hello"
+
+    async def response(self, message: message.Message) -> Optional[str]:
+        await super().response(message)
+        return "hi!"
+
+
+class HelpPlugin(RecordingPlugin):
+    message_types = (message.ChatMessage, message.PMMessage)
+
+    async def response(self, message: message.Message) -> Optional[List[str]]:
+        return ["Commands:", "!help", "!roll"]
+
+
+class WildcardPlugin(RecordingPlugin):
+    async def match(self, message: message.Message) -> bool:
+        return True
+
+
+class SlowPlugin(RecordingPlugin):
+    message_types = (message.ChatMessage,)
+    ordered = False
+
+    def __init__(self, client: Client):
+        super().__init__(client)
+        self.release = asyncio.Event()
+
+    async def response(self, message: message.Message) -> Optional[str]:
+        await self.release.wait()
+        return await super().response(message)
+
+
+class HangingPlugin(RecordingPlugin):
+    message_types = (message.ChatMessage,)
+    response_timeout = 0.01
+    failure_threshold = 2
+
+    async def response(self, message: message.Message) -> Optional[str]:
+        await asyncio.sleep(10)
+        return None
+
+
+class FailingPlugin(RecordingPlugin):
+    message_types = (message.ChatMessage,)
+    failure_threshold = 1
+    cooldown = 0
+
+    async def response(self, message: message.Message) -> Optional[str]:
+        await super().response(message)
+        if message.message == "fail":
+            raise ValueError("bad message")
+        return None
+
+
+class LongHelpPlugin(RecordingPlugin):
+    message_types = (message.ChatMessage, message.PMMessage)
+
+    async def response(self, message: message.Message) -> Optional[List[str]]:
+        return ["Commands:", "!help", "!roll", "!pick"]
+
+
+class LongHelpTextPlugin(RecordingPlugin):
+    message_types = (message.ChatMessage, message.PMMessage)
+
+    async def response(self, message: message.Message) -> Optional[str]:
+        return "Commands:\n!help\n!roll\n!pick"
+
+
+class PickyFailingPlugin(FailingPlugin):
+    failure_threshold = 2
+
+    async def match(self, message: message.Message) -> bool:
+        return getattr(message, "message", "") != "skip"
+
+
+class ThreadPlugin(RecordingPlugin):
+    message_types = (message.ChatMessage,)
+    executor = "thread"
+
+    def blocking(self, message: message.Message) -> Optional[str]:
+        self.seen.append(message)
+        time.sleep(0.01)
+        return threading.current_thread().name
+
+
+class ProcessPlugin(RecordingPlugin):
+    message_types = (message.ChatMessage,)
+    executor = "process"
+
+    def blocking(self, message: message.Message) -> Optional[str]:
+        assert not hasattr(self, "client")
+        return f"{message.user.name} said {message.message}"
+
+
+class RollPlugin(CommandPlugin):
+    commands = ("roll", "pick")
+    aliases = {"dice": "roll"}
+
+    def __init__(self, client: Client):
+        super().__init__(client)
+        self.calls: List[Command] = []
+
+    async def command(
+        self, message: message.Message, command: Command
+    ) -> Optional[str]:
+        self.calls.append(command)
+        return f"{command.name}: {command.args}"
+
+
+class BanPlugin(CommandPlugin):
+    commands = ("ban",)
+    min_rank = "@"
+    rooms = {"techcode"}
+    pm = False
+
+    async def command(
+        self, message: message.Message, command: Command
+    ) -> Optional[str]:
+        return "banned " + command.argument
+
+
+def make_client(**kwargs: Any) -> Client:
+    # the system plugins print that they're loaded
+    with contextlib.redirect_stdout(io.StringIO()):
+        client = Client(
+            "bot", "password", "ws://localhost:8000/showdown/websocket", **kwargs
+        )
+    client.print = lambda msg: None  # type: ignore[method-assign]
+    return client
+
+
+class ClientTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.client = make_client()
+        self.sent: List[Tuple[str, str]] = []
+
+        async def send(room: str, msg: str, priority: Priority = Priority.INTERACTIVE):
+            self.sent.append((room, msg))
+
+        self.client.send = send  # type: ignore[method-assign]
+
+    async def test_routing(self):
+        chat = ChatPlugin(self.client)
+        lobby = LobbyChatPlugin(self.client)
+        hello = HelloPlugin(self.client)
+        wildcard = WildcardPlugin(self.client)
+        self.client.plugins.extend([chat, lobby, hello, wildcard])
+        await self.client.handle_message("lobby", "|init|chat")
+
+        await self.client.handle_message("lobby", "|c|@foo|hello")
+        await self.client.handle_message("techcode", "|c|@foo|bye")
+        await self.client.handle_message("lobby", "|j|@foo")
+
+        self.assertEqual(len(chat.seen), 2)
+        self.assertEqual(len(lobby.seen), 1)
+        self.assertEqual(lobby.seen[0].room, "lobby")
+        self.assertEqual(len(hello.seen), 1)
+        self.assertEqual(hello.match_calls, 2)
+        self.assertEqual(len(wildcard.seen), 4)
+        self.assertEqual(self.sent, [("lobby", "hi!")])
+
+    async def test_routes_rebuilt_on_load(self):
+        await self.client.handle_message("lobby", "|c|@foo|hello")
+
+        chat = ChatPlugin(self.client)
+        self.client.plugins.append(chat)
+        await self.client.handle_message("lobby", "|c|@foo|hello")
+
+        self.assertEqual(len(chat.seen), 1)
+
+    async def test_routes_rebuilt_on_replace(self):
+        chat = ChatPlugin(self.client)
+        self.client.plugins.append(chat)
+        await self.client.handle_message("lobby", "|c|@foo|hello")
+
+        # the same number of plugins, but not the same plugins
+        wildcard = WildcardPlugin(self.client)
+        self.client.plugins[-1] = wildcard
+        await self.client.handle_message("lobby", "|c|@foo|hello")
+
+        self.assertEqual(len(chat.seen), 1)
+        self.assertEqual(len(wildcard.seen), 1)
+
+    async def test_routes_rebuilt_on_assign(self):
+        await self.client.handle_message("lobby", "|c|@foo|hello")
+        commands = self.client._commands
+        await self.client.handle_message("lobby", "|c|@foo|hello")
+        # nothing changed, so nothing was rebuilt
+        self.assertIs(self.client._commands, commands)
+
+        chat = ChatPlugin(self.client)
+        self.client.plugins = [chat]
+        await self.client.handle_message("lobby", "|c|@foo|hello")
+
+        self.assertIsInstance(self.client.plugins, PluginList)
+        self.assertEqual(len(chat.seen), 1)
+
+    async def test_default_match(self):
+        lobby = LobbyChatPlugin(self.client)
+
+        self.assertTrue(await lobby.match(message.parse_message("lobby", "|c|@foo|hi")))
+        self.assertFalse(
+            await lobby.match(message.parse_message("techcode", "|c|@foo|hi"))
+        )
+        self.assertFalse(await lobby.match(message.parse_message("lobby", "|j|@foo")))
+
+        with self.assertRaises(NotImplementedError):
+            await BasePlugin(self.client).match(message.Message("", ""))
+
+    async def test_list_response(self):
+        self.client.plugins.append(HelpPlugin(self.client))
+
+        await self.client.handle_message("lobby", "|c|@foo|!help")
+
+        self.assertEqual(self.sent, [("lobby", "Commands:\n!help\n!roll")])
+
+    async def test_long_list_response(self):
+        self.client.plugins.append(LongHelpPlugin(self.client))
+
+        await self.client.handle_message("lobby", "|c|@foo|!help")
+        await self.client.handle_message("", "|pm|@foo| bot|!help")
+
+        self.assertEqual(
+            self.sent,
+            [
+                ("lobby", "Commands:\n!help\n!roll"),
+                ("lobby", "!pick"),
+                ("", "/w foo, Commands:\n/w foo, !help\n/w foo, !roll"),
+                ("", "/w foo, !pick"),
+            ],
+        )
+
+    async def test_long_text_response(self):
+        self.client.plugins.append(LongHelpTextPlugin(self.client))
+
+        await self.client.handle_message("lobby", "|c|@foo|!help")
+        await self.client.handle_message("", "|pm|@foo| bot|!help")
+
+        self.assertEqual(
+            self.sent,
+            [
+                ("lobby", "Commands:\n!help\n!roll"),
+                ("lobby", "!pick"),
+                ("", "/w foo, Commands:\n/w foo, !help\n/w foo, !roll"),
+                ("", "/w foo, !pick"),
+            ],
+        )
+
+    async def test_rank_limiters(self):
+        client = self.client
+        await client.handle_message("techcode", "|init|chat")
+        await client.handle_message("techcode", "|users|2,*Bot, foo")
+        await client.handle_message("lobby", "|init|chat")
+        await client.handle_message("lobby", "|j|+bot")
+
+        self.assertEqual(client.rank("techcode"), "*")
+        self.assertIsNot(client.limiter_for("techcode"), client.rate_limiter)
+        self.assertEqual(client.limiter_for("techcode").rate, 1 / TRUSTED_THROTTLE)
+        self.assertIs(client.limiter_for("lobby"), client.rate_limiter)
+        self.assertIs(client.limiter_for(""), client.rate_limiter)
+
+        await client.handle_message("techcode", "|n| bot|bot")
+        self.assertIs(client.limiter_for("techcode"), client.rate_limiter)
+
+        await client.handle_message("", "|updateuser|@bot|1|1|{}")
+        self.assertEqual(client.rank("lobby"), "@")
+        self.assertIsNot(client.limiter_for("lobby"), client.rate_limiter)
+        self.assertIsNot(client.limiter_for(""), client.rate_limiter)
+
+        await client.handle_message("", "|updateuser| bot|1|1|{}")
+        await client.handle_message("lobby", "|deinit")
+        self.assertEqual(client.ranks, {"techcode": " "})
+        self.assertIs(client.limiter_for("lobby"), client.rate_limiter)
+        self.assertIs(client.limiter_for(""), client.rate_limiter)
+
+    async def test_room_users(self):
+        client = self.client
+        await client.handle_message("techcode", "|init|chat")
+        await client.handle_message("techcode", "|users|2,@foo, bar@!")
+        await client.handle_message("lobby", "|init|chat")
+        await client.handle_message("lobby", "|users|1,@foo")
+        await client.handle_message("techcode", "|J|+baz")
+        await client.handle_message("techcode", "|N|@Foo|foo")
+        await client.handle_message("techcode", "|N| Qux|bar")
+        await client.handle_message("techcode", "|L| baz")
+
+        techcode = client.rooms["techcode"].users
+        self.assertEqual(list(techcode), ["foo", "qux"])
+        self.assertEqual(techcode["foo"].name, "Foo")
+        self.assertEqual(techcode["qux"].to_string(), " Qux")
+        self.assertEqual([user.name for user in techcode.ordered()], ["Foo", "Qux"])
+        # renaming in one room doesn't rename the user in another
+        self.assertEqual(client.rooms["lobby"].users["foo"].name, "foo")
+        # nor do other clients share this one's users
+        self.assertIsNot(make_client().user_registry, client.user_registry)
+
+    async def test_metrics(self):
+        hello = HelloPlugin(self.client)
+        self.client.plugins.append(hello)
+        await self.client.handle_message("lobby", "|init|chat")
+        await self.client.handle_message("lobby", "|c|@foo|hello")
+        await self.client.handle_message("lobby", "|c|@foo|bye")
+
+        metrics = self.client.metrics
+        self.assertEqual(metrics.inbound_lines.labels("ChatMessage").value, 2)
+        self.assertEqual(metrics.parse_seconds.labels().count, 3)
+        self.assertEqual(metrics.plugin_seconds.labels("HelloPlugin", "match").count, 2)
+        self.assertEqual(
+            metrics.plugin_seconds.labels("HelloPlugin", "response").count, 1
+        )
+        exposition = metrics.expose()
+        self.assertIn("pyshowdown_rooms 1\n", exposition)
+        self.assertIn("pyshowdown_outbound_queue_depth 0\n", exposition)
+
+    async def test_plugin_timeout(self):
+        hanging = HangingPlugin(self.client)
+        chat = ChatPlugin(self.client)
+        self.client.plugins.extend([hanging, chat])
+
+        with self.assertLogs("pyshowdown", "WARNING") as logs:
+            for i in range(3):
+                await self.client.handle_message("lobby", f"|c|@foo|{i}")
+        self.assertEqual(
+            logs.output, ["WARNING:pyshowdown:Plugin HangingPlugin timed out"] * 2
+        )
+
+        stats = self.client.plugin_stats(hanging)
+        self.assertEqual(stats.timeouts.value, 2)
+        self.assertEqual(stats.skipped.value, 1)
+        self.assertIs(stats.breaker.state, BreakerState.OPEN)
+        self.assertEqual(len(chat.seen), 3)
+
+    async def test_plugin_breaker(self):
+        failing = FailingPlugin(self.client)
+        self.client.plugins.append(failing)
+
+        with self.assertLogs("pyshowdown", "ERROR") as logs:
+            await self.client.handle_message("lobby", "|c|@foo|fail")
+        self.assertIn("plugin FailingPlugin: bad message", logs.output[0])
+        stats = self.client.plugin_stats(failing)
+        self.assertIs(stats.breaker.state, BreakerState.OPEN)
+        self.assertIsInstance(stats.last_error, ValueError)
+
+        # the cooldown is over, so the next message is a trial
+        await self.client.handle_message("lobby", "|c|@foo|ok")
+        self.assertIs(stats.breaker.state, BreakerState.CLOSED)
+        self.assertEqual(len(failing.seen), 2)
+        self.assertEqual(stats.errors.value, 1)
+        self.assertIn(stats, self.client.all_plugin_stats())
+
+    def test_print(self):
+        with self.assertLogs("pyshowdown", "INFO") as logs:
+            Client.print("connecting...")
+        self.assertEqual(logs.output, ["INFO:pyshowdown:connecting..."])
+
+    def test_print_without_logging(self):
+        root = logging.getLogger()
+        handlers = root.handlers[:]
+        root.handlers.clear()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()) as out:
+                Client.print("connecting...")
+        finally:
+            root.handlers[:] = handlers
+        self.assertEqual(out.getvalue(), "connecting...\n")
+
+    def test_load_plugin_error(self):
+        printed: List[str] = []
+        self.client.print = printed.append  # type: ignore[method-assign]
+
+        self.assertFalse(self.client.load_plugin("pyshowdown.plugins.nonexistent"))
+        self.assertEqual(len(printed), 1)
+        self.assertTrue(printed[0].startswith("Error loading plugin"))
+
+    async def test_plugin_breaker_no_match(self):
+        failing = PickyFailingPlugin(self.client)
+        self.client.plugins.append(failing)
+
+        with self.assertLogs("pyshowdown", "ERROR"):
+            await self.client.handle_message("lobby", "|c|@foo|fail")
+            await self.client.handle_message("lobby", "|c|@foo|skip")
+            await self.client.handle_message("lobby", "|c|@foo|fail")
+
+        # the message it didn't match isn't counted as a success
+        stats = self.client.plugin_stats(failing)
+        self.assertIs(stats.breaker.state, BreakerState.OPEN)
+
+    async def test_system_plugins(self):
+        self.client.plugin_timeout = 0.01
+        for plugin in self.client.plugins:
+            self.assertIsInstance(plugin, SystemPlugin)
+            self.assertIsNone(self.client._timeout(plugin.match_timeout))
+            self.assertIsNone(self.client._timeout(plugin.response_timeout))
+            self.assertIsNone(
+                self.client.plugin_stats(plugin).breaker.failure_threshold
+            )
+        self.assertEqual(
+            self.client._timeout(BasePlugin(self.client).response_timeout), 0.01
+        )
+
+    async def test_thread_executor(self):
+        plugin = ThreadPlugin(self.client)
+        self.client.plugins.append(plugin)
+
+        await self.client.handle_message("lobby", "|c|@foo|hi")
+
+        self.assertTrue(self.sent[0][1].startswith("pyshowdown-plugin"))
+        # the plugin got a copy of the message
+        self.assertEqual(plugin.seen[0].message, "hi")
+        self.assertEqual(self.client.executors["thread"].completed, 1)
+        self.assertEqual(self.client.plugin_stats(plugin).response_seconds.count, 1)
+        await self.client.close()
+
+    async def test_process_executor(self):
+        self.client.plugins.append(ProcessPlugin(self.client))
+
+        await self.client.handle_message("lobby", "|c|@foo|hi")
+
+        self.assertEqual(self.sent, [("lobby", "foo said hi")])
+        self.client.executors["process"].shutdown()
+
+    async def test_commands(self):
+        roll = RollPlugin(self.client)
+        chat = ChatPlugin(self.client)
+        self.client.plugins.extend([roll, chat])
+
+        await self.client.handle_message("lobby", "|c|+foo|!roll 2d6, 1d20")
+        await self.client.handle_message("lobby", "|c|+foo|!DICE")
+        await self.client.handle_message("lobby", "|c|+foo|!ban bar")
+        await self.client.handle_message("lobby", "|c|+foo|roll")
+        await self.client.handle_message("", "|pm|+foo| bot|!pick a, b")
+
+        self.assertEqual(
+            self.sent,
+            [
+                ("lobby", "roll: ['2d6', '1d20']"),
+                ("lobby", "roll: []"),
+                ("", "/w foo, pick: ['a', 'b']"),
+            ],
+        )
+        self.assertEqual(roll.calls[1].alias, "dice")
+        # ordinary plugins still see every chat message
+        self.assertEqual(len(chat.seen), 4)
+
+    async def test_command_restrictions(self):
+        self.client.plugins.append(BanPlugin(self.client))
+
+        await self.client.handle_message("techcode", "|c|%foo|!ban bar")
+        await self.client.handle_message("lobby", "|c|@foo|!ban bar")
+        await self.client.handle_message("", "|pm|@foo| bot|!ban bar")
+        await self.client.handle_message("techcode", "|c|#foo|!ban bar")
+        # our own messages aren't commands
+        await self.client.handle_message("techcode", "|c|#bot|!ban bar")
+
+        self.assertEqual(self.sent, [("techcode", "banned bar")])
+
+    def test_parse_command(self):
+        self.assertEqual(parse_command("!Roll  2d6 "), ("roll", "2d6"))
+        self.assertEqual(parse_command(".roll", ".!"), ("roll", ""))
+        self.assertIsNone(parse_command("roll"))
+        self.assertIsNone(parse_command("! roll"))
+        self.assertIsNone(parse_command(""))
+
+    def test_invalid_command_plugin(self):
+        class BadRank(CommandPlugin):
+            min_rank = "?"
+
+        class BadAlias(CommandPlugin):
+            commands = ("roll",)
+            aliases = {"dice": "rol"}
+
+        self.assertRaises(ValueError, BadRank, self.client)
+        self.assertRaises(ValueError, BadAlias, self.client)
+
+    async def test_matcher(self):
+        chat = ChatPlugin(self.client)
+        self.client.plugins.append(chat)
+        self.client.matcher.add_phrase("bad word")
+
+        await self.client.handle_message("lobby", "|c|@foo|a B.A.D. WORD")
+        await self.client.handle_message("lobby", "|c|@foo|a good word")
+
+        self.assertEqual(chat.seen[0].matches, {"bad word"})
+        self.assertEqual(chat.seen[1].matches, frozenset())
+
+    async def test_stream(self):
+        chat = ChatPlugin(self.client)
+        self.client.plugins.append(chat)
+        lobby = self.client.stream(message.ChatMessage, room="lobby")
+        everything = self.client.stream(maxsize=1, overflow="drop-newest")
+        self.client.rooms["lobby"] = Room("lobby")
+
+        await self.client.handle_message("lobby", "|c|@foo|one")
+        await self.client.handle_message("techcode", "|c|@foo|two")
+        await self.client.handle_message("lobby", "|j|@foo")
+        lobby.close()
+        await self.client.handle_message("lobby", "|c|@foo|three")
+
+        self.assertEqual([m.message async for m in lobby], ["one"])
+        self.assertEqual(everything.dropped, 3)
+        # one parse, shared by the plugins and subscriptions
+        self.assertIs(await everything.get(), chat.seen[0])
+        self.assertEqual(self.client._subscriptions, (everything,))
+
+        await self.client.close()
+        self.assertEqual(self.client._subscriptions, ())
+        self.assertEqual([m async for m in everything], [])
+
+    async def test_handle_frame(self):
+        chat = ChatPlugin(self.client)
+        self.client.plugins.append(chat)
+        errors = []
+        self.client._inbound_error = lambda room, line, e: errors.append(line)
+
+        await self.client.handle_frame(
+            "lobby", "|c:|1|@foo|one\n|c|@foo|two\n\n|users|x\n|c|+bar|three"
+        )
+
+        # the bad line fails on its own
+        self.assertEqual([m.message for m in chat.seen], ["one", "two", "three"])
+        self.assertEqual(errors, ["|users|x"])
+
+        chat.seen.clear()
+        await self.client.handle_frame("lobby", "|c:|1|@foo|one\n|c|@foo|two")
+        self.assertEqual([m.message for m in chat.seen], ["one", "two"])
+        self.assertIs(chat.seen[0].user, chat.seen[1].user)
+        self.assertEqual(self.client.metrics.parse_seconds._unlabelled().count, 2)
+
+    async def test_unordered_plugin(self):
+        slow = SlowPlugin(self.client)
+        chat = ChatPlugin(self.client)
+        self.client.plugins.extend([slow, chat])
+
+        await self.client.handle_message("lobby", "|c|@foo|one")
+        await self.client.handle_message("lobby", "|c|@foo|two")
+
+        self.assertEqual([m.message for m in chat.seen], ["one", "two"])
+        self.assertEqual(slow.seen, [])
+
+        slow.release.set()
+        await asyncio.gather(*self.client._plugin_tasks)
+        self.assertEqual(len(slow.seen), 2)
+
+
+class ClientQueueTest(unittest.IsolatedAsyncioTestCase):
+    async def test_priorities(self):
+        client = make_client()
+        frames: List[str] = []
+
+        async def send(frame: str) -> None:
+            frames.append(frame)
+
+        client.conn.send = send  # type: ignore[method-assign]
+        client.rate_limiter = TokenBucket(1000, 5)
+        for i in range(3):
+            await client.send("lobby", f"announcement {i}", Priority.BULK)
+        await client.send_pm("foo", "hi!")
+        await client.join("techcode")
+
+        task = asyncio.create_task(client.start_message_queue())
+        while len(frames) < 5:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+        self.assertEqual(
+            frames,
+            [
+                "|/join techcode",
+                "|/w foo, hi!",
+                "lobby|announcement 0",
+                "lobby|announcement 1",
+                "lobby|announcement 2",
+            ],
+        )
+        self.assertEqual(client.queue.wait_stats[Priority.BULK].count, 3)
+
+    async def test_coalesce(self):
+        client = make_client()
+        client.coalesce = True
+        frames: List[str] = []
+
+        async def send(frame: str) -> None:
+            frames.append(frame)
+
+        client.conn.send = send  # type: ignore[method-assign]
+        for i in range(4):
+            await client.send("lobby", f"line {i}")
+        await client.send_pm("foo", "one\ntwo")
+
+        task = asyncio.create_task(client.start_message_queue())
+        while len(frames) < 3:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+        self.assertEqual(
+            frames,
+            [
+                "lobby|line 0\nline 1\nline 2",
+                "|/w foo, one\n/w foo, two",
+                "lobby|line 3",
+            ],
+        )
+
+    async def test_throttled(self):
+        client = make_client()
+        frames: List[str] = []
+
+        async def send(frame: str) -> None:
+            frames.append(frame)
+
+        client.conn.send = send  # type: ignore[method-assign]
+        client.rate_limiter = AdaptiveTokenBucket(1000, 5, min_rate=100)
+        await client.send("techcode", "one")
+        await client.send("techcode", "two")
+
+        task = asyncio.create_task(client.start_message_queue())
+        while len(frames) < 2:
+            await asyncio.sleep(0.01)
+
+        notice = (
+            '|raw|<strong class="message-throttle-notice">Your message was not '
+            "sent because you've been typing too quickly.</strong>"
+        )
+        await client.handle_message("techcode", notice)
+        while len(frames) < 3:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+        self.assertEqual(frames, ["techcode|one", "techcode|two", "techcode|two"])
+        self.assertEqual(client.rate_limiter.throttle_count, 1)
+        self.assertLess(client.rate_limiter.rate, 1000)
+
+    async def test_throttled_gives_up(self):
+        client = make_client()
+        await client.send("techcode", "one")
+        m = client.queue.get_nowait()
+        m.attempts = MAX_RETRIES
+        client._last_sent["techcode"] = (client.queue.clock(), m)
+
+        with self.assertLogs("pyshowdown", "WARNING"):
+            await client.handle_message(
+                "techcode", "|error|You are sending messages too fast"
+            )
+        self.assertTrue(client.queue.empty())
+        await client.handle_message("techcode", "|error|/help is not a command")
+        await client.handle_message("techcode", "|raw|<b>Stop going too fast!</b>")
+        self.assertEqual(client.rate_limiter.throttle_count, 1)
+
+    async def test_throttled_global(self):
+        now = 100.0
+        client = make_client()
+        client.queue.clock = lambda: now
+        await client.send("lobby", "hello")
+        await client.send("", "/w foo, hi")
+        lobby = client.queue.get_nowait()
+        pm = client.queue.get_nowait()
+        client._last_sent["lobby"] = (now, lobby)
+        client._last_sent[""] = (now, pm)
+
+        # a global notice is about the PM, not the lobby message
+        await client.handle_message("", "|popup|You are sending messages too fast")
+        self.assertIs(client.queue.get_nowait(), pm)
+        self.assertTrue(client.queue.empty())
+        self.assertIn("lobby", client._last_sent)
+
+        # a notice long after the message was sent isn't about it
+        client._last_sent[""] = (now, pm)
+        now += RETRY_WINDOW + 1
+        await client.handle_message("", "|popup|You are sending messages too fast")
+        self.assertTrue(client.queue.empty())
+        self.assertEqual(client.rate_limiter.throttle_count, 2)
+
+    def test_default_rate_limiter(self):
+        client = make_client()
+        self.assertEqual(client.rate_limiter.rate, 1 / THROTTLE)
+        # no faster than PS allows unranked users, unless asked to
+        self.assertEqual(client.rate_limiter.max_rate, 1 / THROTTLE)
+        client = make_client(min_throttle=0.5)
+        self.assertEqual(client.rate_limiter.max_rate, 2)
+
+    async def test_room_limiters(self):
+        client = make_client()
+        frames: List[str] = []
+
+        async def send(frame: str) -> None:
+            frames.append(frame)
+
+        client.conn.send = send  # type: ignore[method-assign]
+        client.trusted_throttle = 0.001
+        client.rate_limiter = TokenBucket(0.01, 1)
+        client.set_rank("techcode", "*")
+        for i in range(2):
+            await client.send("lobby", f"a{i}")
+            await client.send("techcode", f"b{i}")
+
+        task = asyncio.create_task(client.start_message_queue())
+        while len(frames) < 3:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+        # lobby is out of tokens, but techcode doesn't wait for it
+        self.assertEqual(frames, ["lobby|a0", "techcode|b0", "techcode|b1"])
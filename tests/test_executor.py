@@ -0,0 +1,57 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from pyshowdown.executor import PROCESS, THREAD, PluginExecutor
+
+
+def square(x: int) -> int:
+    return x * x
+
+
+class PluginExecutorTest(unittest.IsolatedAsyncioTestCase):
+    async def test_thread(self):
+        executor = PluginExecutor(THREAD, max_workers=2)
+        self.assertEqual(executor.workers, 0)
+
+        name = await executor.run(lambda: threading.current_thread().name)
+        self.assertTrue(name.startswith("pyshowdown-plugin"))
+        self.assertEqual(executor.workers, 2)
+        self.assertEqual(executor.completed, 1)
+        executor.shutdown()
+
+    async def test_saturation(self):
+        executor = PluginExecutor(THREAD, max_workers=1)
+        release = threading.Event()
+        calls = [asyncio.ensure_future(executor.run(release.wait)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+
+        self.assertEqual(executor.pending, 3)
+        self.assertEqual(executor.saturation, 3)
+
+        release.set()
+        await asyncio.gather(*calls)
+        self.assertEqual(executor.pending, 0)
+        self.assertEqual(executor.max_pending, 3)
+        executor.shutdown()
+
+    async def test_cancelled_call_still_counted(self):
+        executor = PluginExecutor(THREAD, max_workers=1)
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(executor.run(time.sleep, 0.05), 0.01)
+
+        # the worker is still busy
+        self.assertEqual(executor.pending, 1)
+        await asyncio.sleep(0.1)
+        self.assertEqual(executor.pending, 0)
+        executor.shutdown()
+
+    async def test_process(self):
+        executor = PluginExecutor(PROCESS, max_workers=1)
+        self.assertEqual(await executor.run(square, 12), 144)
+        executor.shutdown()
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, PluginExecutor, "fiber")
+        self.assertRaises(ValueError, PluginExecutor, THREAD, max_workers=0)
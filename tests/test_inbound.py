@@ -0,0 +1,187 @@
+import asyncio
+import unittest
+from typing import Dict, List, Tuple
+
+from pyshowdown.inbound import InboundPipeline, frame_room, split_frame
+
+
+class InboundPipelineTest(unittest.IsolatedAsyncioTestCase):
+    async def test_handles_lines(self):
+        handled: List[Tuple[str, str]] = []
+
+        async def handler(room: str, line: str) -> None:
+            handled.append((room, line))
+
+        pipeline = InboundPipeline(handler, maxsize=10, workers=1)
+        for i in range(5):
+            await pipeline.put("lobby", str(i))
+        await pipeline.join()
+
+        self.assertEqual(handled, [("lobby", str(i)) for i in range(5)])
+        self.assertEqual(pipeline.processed, 5)
+        self.assertEqual(pipeline.depth, 0)
+        await pipeline.stop()
+
+    async def test_room_order(self):
+        handled: Dict[str, List[str]] = {"a": [], "b": [], "c": []}
+
+        async def handler(room: str, line: str) -> None:
+            # later lines finish faster, so they'd overtake without lanes
+            await asyncio.sleep(0.001 * (5 - int(line) % 5))
+            handled[room].append(line)
+
+        pipeline = InboundPipeline(handler, maxsize=100, workers=4)
+        for i in range(10):
+            for room in handled:
+                await pipeline.put(room, str(i))
+        await pipeline.join()
+
+        for room, lines in handled.items():
+            self.assertEqual(lines, [str(i) for i in range(10)], room)
+        await pipeline.stop()
+
+    async def test_rooms_concurrent(self):
+        release = asyncio.Event()
+        handled: List[Tuple[str, str]] = []
+
+        async def handler(room: str, line: str) -> None:
+            if room == "slow":
+                await release.wait()
+            handled.append((room, line))
+
+        pipeline = InboundPipeline(handler, maxsize=10, workers=2)
+        await pipeline.put("slow", "1")
+        await pipeline.put("slow", "2")
+        await pipeline.put("fast", "1")
+        await pipeline.put("fast", "2")
+        await asyncio.sleep(0.01)
+
+        self.assertEqual(handled, [("fast", "1"), ("fast", "2")])
+        self.assertEqual(pipeline.lane_depths(), {"slow": 1})
+
+        release.set()
+        await pipeline.join()
+        self.assertEqual(handled[2:], [("slow", "1"), ("slow", "2")])
+        self.assertEqual(pipeline.lane_depths(), {})
+        await pipeline.stop()
+
+    async def test_backpressure(self):
+        release = asyncio.Event()
+
+        async def handler(room: str, line: str) -> None:
+            await release.wait()
+
+        pipeline = InboundPipeline(handler, maxsize=2, workers=1)
+        # one line is held by the worker, two fill the queue
+        for i in range(3):
+            await pipeline.put("lobby", str(i))
+            await asyncio.sleep(0)
+        self.assertEqual(pipeline.depth, 2)
+
+        blocked = asyncio.create_task(pipeline.put("lobby", "3"))
+        await asyncio.sleep(0.01)
+        self.assertFalse(blocked.done())
+
+        release.set()
+        await blocked
+        await pipeline.join()
+        self.assertEqual(pipeline.processed, 4)
+        self.assertEqual(pipeline.dropped, 0)
+        await pipeline.stop()
+
+    async def test_drop_overflow(self):
+        release = asyncio.Event()
+
+        async def handler(room: str, line: str) -> None:
+            await release.wait()
+
+        pipeline = InboundPipeline(handler, maxsize=2, workers=1, overflow="drop")
+        for i in range(3):
+            await pipeline.put("lobby", str(i))
+            await asyncio.sleep(0)
+        await pipeline.put("lobby", "3")
+        await pipeline.put("lobby", "4")
+
+        self.assertEqual(pipeline.dropped, 2)
+        release.set()
+        await pipeline.join()
+        self.assertEqual(pipeline.processed, 3)
+        await pipeline.stop()
+
+    async def test_errors(self):
+        errors: List[Tuple[str, str, Exception]] = []
+
+        async def handler(room: str, line: str) -> None:
+            if line == "bad":
+                raise ValueError(line)
+
+        pipeline = InboundPipeline(
+            handler, workers=2, on_error=lambda *args: errors.append(args)
+        )
+        for line in ["good", "bad", "good"]:
+            await pipeline.put("lobby", line)
+        await pipeline.join()
+
+        self.assertEqual(pipeline.processed, 2)
+        self.assertEqual(pipeline.failed, 1)
+        self.assertEqual(errors[0][:2], ("lobby", "bad"))
+        await pipeline.stop()
+
+    async def test_stop_discards(self):
+        async def handler(room: str, line: str) -> None:
+            await asyncio.sleep(10)
+
+        pipeline = InboundPipeline(handler, maxsize=10, workers=1)
+        for i in range(4):
+            await pipeline.put("lobby", str(i))
+        await asyncio.sleep(0)
+        await pipeline.stop()
+
+        self.assertFalse(pipeline.running)
+        self.assertEqual(pipeline.dropped, 3)
+        self.assertEqual(pipeline.depth, 0)
+
+    def test_invalid_arguments(self):
+        async def handler(room: str, line: str) -> None:
+            pass
+
+        self.assertRaises(ValueError, InboundPipeline, handler, maxsize=0)
+        self.assertRaises(ValueError, InboundPipeline, handler, workers=0)
+        self.assertRaises(ValueError, InboundPipeline, handler, overflow="wait")
+
+
+class SplitFrameTest(unittest.TestCase):
+    def test_room_frame(self):
+        frame = ">techcode\n|init|chat\n|title|Tech & Code\n\n|users|2,@foo, bar\n"
+
+        self.assertEqual(
+            list(split_frame(frame)),
+            [
+                ("techcode", "|init|chat"),
+                ("techcode", "|title|Tech & Code"),
+                ("techcode", "|users|2,@foo, bar"),
+            ],
+        )
+
+    def test_lobby_frame(self):
+        self.assertEqual(
+            list(split_frame("|c|@foo|hi\n|j|@bar")),
+            [("", "|c|@foo|hi"), ("", "|j|@bar")],
+        )
+        self.assertEqual(
+            list(split_frame("|updatechallenges|{}")), [("", "|updatechallenges|{}")]
+        )
+
+    def test_empty(self):
+        self.assertEqual(list(split_frame("")), [])
+        self.assertEqual(list(split_frame("\n\n")), [])
+        self.assertEqual(list(split_frame(">lobby")), [])
+        self.assertEqual(list(split_frame(">lobby\n")), [])
+
+    def test_frame_room(self):
+        self.assertEqual(
+            frame_room(">techcode\n|init|chat\n|title|Tech"),
+            ("techcode", "|init|chat\n|title|Tech"),
+        )
+        self.assertEqual(frame_room("|c|@foo|hi"), ("", "|c|@foo|hi"))
+        self.assertEqual(frame_room(">lobby"), ("lobby", ""))
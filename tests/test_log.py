@@ -0,0 +1,104 @@
+import logging
+import unittest
+from typing import List
+
+from pyshowdown.log import (
+    INBOUND,
+    OUTBOUND,
+    WireLog,
+    logger,
+    message_type,
+    setup_logging,
+    wire_logger,
+)
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records: List[logging.LogRecord] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.records.append(record)
+
+
+class WireLogTest(unittest.TestCase):
+    def setUp(self):
+        self.handler = RecordingHandler()
+        wire_logger.addHandler(self.handler)
+        wire_logger.setLevel(logging.DEBUG)
+
+    def tearDown(self):
+        wire_logger.removeHandler(self.handler)
+        wire_logger.setLevel(logging.NOTSET)
+
+    def lines(self) -> List[str]:
+        return [record.getMessage() for record in self.handler.records]
+
+    def test_message_type(self):
+        self.assertEqual(message_type(INBOUND, "|c|@foo|hi"), "c")
+        self.assertEqual(message_type(INBOUND, "|init|chat"), "init")
+        self.assertEqual(message_type(INBOUND, "hello"), "raw")
+        self.assertEqual(message_type(OUTBOUND, "/join lobby"), "/join")
+        self.assertEqual(message_type(OUTBOUND, "hello"), "chat")
+
+    def test_log(self):
+        wire = WireLog()
+        wire.log(INBOUND, "lobby", "|c|@foo|hi")
+        wire.log(OUTBOUND, "lobby", "hello")
+
+        self.assertEqual(self.lines(), ["<< lobby||c|@foo|hi", ">> lobby|hello"])
+        self.assertEqual(self.handler.records[0].msg_type, "c")
+        self.assertEqual(self.handler.records[1].direction, OUTBOUND)
+
+    def test_filters(self):
+        wire = WireLog(directions=[INBOUND], types=["c", "j"])
+        wire.log(INBOUND, "lobby", "|c|@foo|hi")
+        wire.log(INBOUND, "lobby", "|l|@foo")
+        wire.log(OUTBOUND, "lobby", "hello")
+        wire.log(INBOUND, "lobby", "|j|@foo")
+
+        self.assertEqual(self.lines(), ["<< lobby||c|@foo|hi", "<< lobby||j|@foo"])
+
+    def test_sample(self):
+        wire = WireLog(sample=3)
+        for i in range(7):
+            wire.log(INBOUND, "lobby", f"|c|@foo|{i}")
+
+        self.assertEqual(self.lines(), ["<< lobby||c|@foo|2", "<< lobby||c|@foo|5"])
+        self.assertRaises(ValueError, WireLog, sample=0)
+
+    def test_disabled(self):
+        wire_logger.setLevel(logging.INFO)
+        WireLog().log(INBOUND, "lobby", "|c|@foo|hi")
+        self.assertEqual(self.handler.records, [])
+
+
+class SetupLoggingTest(unittest.TestCase):
+    def tearDown(self):
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        logger.setLevel(logging.NOTSET)
+        logger.propagate = True
+        wire_logger.setLevel(logging.NOTSET)
+
+    def test_setup_logging(self):
+        handler = RecordingHandler()
+        listener = setup_logging(logging.INFO, handler, wire=True)
+        logger.debug("hidden")
+        logger.info("connected to %s", "sim3")
+        WireLog().log(INBOUND, "lobby", "|c|@foo|hi")
+        listener.stop()
+
+        self.assertEqual(
+            [record.getMessage() for record in handler.records],
+            ["connected to sim3", "<< lobby||c|@foo|hi"],
+        )
+
+    def test_wire_off_by_default(self):
+        handler = RecordingHandler()
+        listener = setup_logging(logging.DEBUG, handler)
+        WireLog().log(INBOUND, "lobby", "|c|@foo|hi")
+        listener.stop()
+
+        self.assertEqual(handler.records, [])
@@ -0,0 +1,93 @@
+import re
+import unittest
+
+from pyshowdown.matcher import NO_MATCHES, KeywordMatcher
+from pyshowdown.utils import to_id
+
+
+class KeywordMatcherTest(unittest.TestCase):
+    def test_phrases(self):
+        matcher = KeywordMatcher(["bad word", "he", "she", "hers", "his"])
+
+        self.assertEqual(matcher.match("B.A.D w-o-r-d!"), {"bad word"})
+        # overlapping phrases, found through the failure links
+        self.assertEqual(matcher.match("ushers"), {"he", "she", "hers"})
+        self.assertEqual(matcher.match("this"), {"his"})
+        self.assertIs(matcher.match("nothing to see"), NO_MATCHES)
+
+    def test_patterns(self):
+        matcher = KeywordMatcher(patterns=[r"\bfree \w+", r"https?://\S+", r"\d{4}"])
+
+        self.assertEqual(
+            matcher.match("FREE stuff at http://example.com"),
+            {r"\bfree \w+", r"https?://\S+"},
+        )
+        self.assertEqual(matcher.match("since 1996"), {r"\d{4}"})
+        self.assertIs(matcher.match("carefree"), NO_MATCHES)
+
+    def test_phrases_and_patterns(self):
+        matcher = KeywordMatcher(["spam"], [r"s+p+a+m+"])
+
+        self.assertEqual(matcher.match("sssspam"), {"spam", r"s+p+a+m+"})
+        self.assertEqual(matcher.match("s p a m"), {"spam"})
+
+    def test_updates(self):
+        matcher = KeywordMatcher(["abc"])
+        self.assertEqual(matcher.match("xabcx"), {"abc"})
+
+        matcher.add_phrase("bc")
+        matcher.add_phrase("A.B.C")
+        matcher.add_pattern("x$")
+        self.assertEqual(matcher.match("xabcx"), {"abc", "A.B.C", "bc", "x$"})
+
+        self.assertTrue(matcher.remove_phrase("abc"))
+        self.assertFalse(matcher.remove_phrase("abc"))
+        self.assertTrue(matcher.remove_pattern("x$"))
+        self.assertEqual(matcher.match("xabcx"), {"A.B.C", "bc"})
+        self.assertEqual(matcher.phrases(), ("bc", "A.B.C"))
+        self.assertEqual(matcher.patterns(), ())
+        self.assertEqual(len(matcher), 2)
+
+    def test_lines_not_cached(self):
+        matcher = KeywordMatcher(["bad word"])
+        to_id.cache_clear()
+
+        self.assertEqual(matcher.match("what a B.A.D w-o-r-d"), {"bad word"})
+        # chat lines would push names out of to_id()'s cache
+        self.assertEqual(to_id.cache_info().currsize, 0)
+
+    def test_invalid(self):
+        matcher = KeywordMatcher()
+
+        self.assertFalse(matcher)
+        self.assertIs(matcher.match("anything"), NO_MATCHES)
+        self.assertRaises(ValueError, matcher.add_phrase, "...")
+        self.assertRaises(re.error, matcher.add_pattern, "(")
+        # global flags can't be combined with the other patterns
+        self.assertRaises(re.error, matcher.add_pattern, "(?i)spam")
+        self.assertRaises(re.error, matcher.add_pattern, "spam(?x)")
+        self.assertEqual(len(matcher), 0)
+
+    def test_groups(self):
+        matcher = KeywordMatcher(patterns=["spam"])
+
+        # the same group name in two patterns
+        matcher.add_pattern(r"(?P<w>eggs)")
+        matcher.add_pattern(r"(?P<w>ham)")
+        self.assertEqual(matcher.match("ham and spam"), {"spam", r"(?P<w>ham)"})
+        self.assertEqual(matcher.match("eggs"), {r"(?P<w>eggs)"})
+
+        # backreferences, which joining the patterns would renumber
+        matcher.add_pattern(r"(a)\1")
+        matcher.add_pattern(r"(b)\1")
+        self.assertEqual(matcher.match("bb"), {r"(b)\1"})
+        self.assertEqual(matcher.match("aa spam"), {"spam", r"(a)\1"})
+        self.assertIs(matcher.match("ab"), NO_MATCHES)
+
+        self.assertTrue(matcher.remove_pattern(r"(b)\1"))
+        self.assertIs(matcher.match("bb"), NO_MATCHES)
+        self.assertEqual(len(matcher), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,31 @@
+import pickle
 import random
 import unittest
 
 from pyshowdown import message
-from pyshowdown.user import User
+from pyshowdown.user import User, UserRegistry
+
+# every parsed field of the message classes
+FIELDS = (
+    "room",
+    "message_str",
+    "user",
+    "receiver",
+    "message",
+    "timestamp",
+    "usercount",
+    "users",
+    "oldid",
+    "status_str",
+    "named",
+    "avatar",
+    "settings",
+    "formats",
+    "json",
+    "query_type",
+    "json_data",
+    "password",
+)
 
 
 class MessageTest(unittest.TestCase):
@@ -359,3 +382,194 @@ class MessageTest(unittest.TestCase):
 
         assert isinstance(m, message.PageHTMLMessage)
         self.assertEqual(m.html, "<b>Hello!</b>")
+
+    def test_register_parser(self):
+        class TourMessage(message.Message):
+            def __init__(self, room: str, message_str: str, event: str):
+                super().__init__(room, message_str)
+                self.event = event
+
+        @message.register_parser("tournament")
+        def parse_tournament(room, message_str, info):
+            return TourMessage(room, message_str, info[2])
+
+        try:
+            m = message.parse_message("lobby", "|tournament|create|gen9ou|Single")
+
+            assert isinstance(m, TourMessage)
+            self.assertEqual(m.event, "create")
+            self.assertEqual(m.room, "lobby")
+        finally:
+            del message.PARSERS["tournament"]
+
+        m = message.parse_message("lobby", "|tournament|create|gen9ou|Single")
+        self.assertIs(type(m), message.Message)
+
+    def test_register_parser_lazy(self):
+        @message.register_parser("pm")
+        def parse_pm(room, message_str, info):
+            return message.Message(room, message_str)
+
+        try:
+            # the lazy parser stands in for the built-in one, not this one
+            m = message.parse_message("", "|pm|@foo|@bar|hi", lazy=True)
+            self.assertIs(type(m), message.Message)
+        finally:
+            message.register_parser("pm")(message._parse_pm)
+
+        m = message.parse_message("", "|pm|@foo|@bar|hi", lazy=True)
+        self.assertIs(type(m), message.PMMessage)
+
+    def test_slots(self):
+        for line in ["|c|@foo|hello!", "|pm|@foo|@bar|hi", "|init|chat", "foo"]:
+            m = message.parse_message("lobby", line)
+            self.assertFalse(hasattr(m, "__dict__"), line)
+
+        m = message.parse_message("lobby", "|c|@foo|hello!")
+        copy = pickle.loads(pickle.dumps(m))
+
+        assert isinstance(copy, message.ChatMessage)
+        self.assertEqual(copy.user, m.user)
+        self.assertEqual(copy.message, "hello!")
+
+    def test_shared_users(self):
+        for lazy in (False, True):
+            users = UserRegistry()
+            chat = message.parse_message("lobby", "|c|@foo|hi", lazy, users)
+            again = message.parse_message("lobby", "|c|@foo|bye", lazy, users)
+            join = message.parse_message("techcode", "|J|@foo", lazy, users)
+            other = message.parse_message("lobby", "|c|@foo|hi", lazy)
+
+            assert isinstance(chat, message.ChatMessage)
+            assert isinstance(again, message.ChatMessage)
+            assert isinstance(join, message.JoinMessage)
+            assert isinstance(other, message.ChatMessage)
+            self.assertIs(chat.user, again.user)
+            # each room has its own users, and no registry shares nothing
+            self.assertIsNot(chat.user, join.user)
+            self.assertIs(chat.user.id, join.user.id)
+            self.assertIsNot(chat.user, other.user)
+            self.assertEqual(chat.user, other.user)
+
+    def test_snapshot(self):
+        for lazy in (False, True):
+            m = message.parse_message("lobby", "|c|@foo|hello!", lazy=lazy)
+            copy = m.snapshot()
+
+            assert isinstance(copy, message.ChatMessage)
+            self.assertEqual(copy.user, m.user)
+            self.assertIsNot(copy.user, m.user)
+            self.assertEqual(copy.message, "hello!")
+
+
+class LazyMessageTest(unittest.TestCase):
+    lines = [
+        "|users|4,@foo@!,+bar@!,@baz@!,%quux",
+        "|users|0",
+        "|j|@foo",
+        "|J| Foo Bar@!busy",
+        "|l|@foo",
+        "|N|#Bar@!|foo",
+        "|c|@foo|hello|world",
+        "|c|@foo",
+        "|c:|1636113111|@foo|hello!",
+        "|pm|@foo|@bar|Hello!|again",
+        "|nametaken|@foo|sorry",
+        '|updateuser|@foo|1|winona|{"blockChallenges":false,"language":null}',
+        "|formats|,1|Sw/Sh Singles|[Gen 8] Random Battle,f|[Gen 8] OU,e",
+        '|updatesearch|{"searching":[],"games":null}',
+        '|updatechallenges|{"challengesFrom":{},"challengeTo":null}',
+        '|queryresponse|savereplay|{"id":"battle-gen8ou-1","password":"pw"}',
+        '|queryresponse|userdetails|{"id":"foo","rooms":{"lobby":{}}}',
+    ]
+
+    def test_lazy_matches_eager(self):
+        for line in self.lines:
+            with self.subTest(line=line):
+                eager = message.parse_message("lobby", line)
+                lazy = message.parse_message("lobby", line, lazy=True)
+
+                self.assertIs(type(lazy), type(eager))
+                for attr in FIELDS:
+                    if hasattr(eager, attr):
+                        self.assertEqual(getattr(lazy, attr), getattr(eager, attr))
+
+    def test_decoded_once(self):
+        m = message.parse_message("lobby", "|c|@foo|hello!", lazy=True)
+
+        assert isinstance(m, message.ChatMessage)
+        self.assertIsInstance(m._user, message.Deferred)
+        user = m.user
+        self.assertEqual(user, User("foo", "@", "", False))
+        self.assertIs(m.user, user)
+        self.assertIs(m._user, user)
+
+    def test_lazy_fallback(self):
+        m = message.parse_message("lobby", "|title|Lobby", lazy=True)
+
+        assert isinstance(m, message.TitleMessage)
+        self.assertEqual(m.title, "Lobby")
+
+        m = message.parse_message("lobby", "|deinit", lazy=True)
+        assert isinstance(m, message.DeinitMessage)
+
+    def test_lazy_decode_error(self):
+        m = message.parse_message("", "|updatesearch|{not json", lazy=True)
+
+        assert isinstance(m, message.UpdateSearchMessage)
+        with self.assertRaises(ValueError):
+            m.json
+
+
+class BatchMessageTest(unittest.TestCase):
+    lines = LazyMessageTest.lines + [
+        "|init|chat",
+        "|title|Lobby",
+        "|c:|1636113111|@foo|hello|world",
+        "|c:|1636113112|@foo|again",
+        "|c:|1636113113|+bar|",
+        "|c|@foo|",
+        "|c|+bar|hi",
+        "|:|1636113111",
+        "foo",
+    ]
+
+    def test_batch_matches_single(self):
+        for lazy in (False, True):
+            batch = message.parse_messages("lobby", self.lines, lazy=lazy)
+
+            self.assertEqual(len(batch), len(self.lines))
+            for line, m in zip(self.lines, batch):
+                with self.subTest(line=line, lazy=lazy):
+                    single = message.parse_message("lobby", line, lazy=lazy)
+
+                    self.assertIs(type(m), type(single))
+                    for attr in FIELDS:
+                        if hasattr(single, attr):
+                            self.assertEqual(getattr(m, attr), getattr(single, attr))
+
+    def test_shared_users(self):
+        lines = ["|c:|1|@foo|one", "|c|@foo|two", "|c:|3|+foo|three"]
+        for lazy in (False, True):
+            one, two, three = message.parse_messages(
+                "lobby", lines, lazy=lazy, users=UserRegistry()
+            )
+
+            assert isinstance(one, message.ChatMessage)
+            assert isinstance(two, message.ChatMessage)
+            assert isinstance(three, message.ChatMessage)
+            self.assertIs(one.user, two.user)
+            self.assertIsNot(one.user, three.user)
+            self.assertEqual(three.user.rank, "+")
+
+    def test_replaced_parser(self):
+        @message.register_parser("c")
+        def parse_chat(room, message_str, info):
+            return message.Message(room, message_str)
+
+        try:
+            for lazy in (False, True):
+                (m,) = message.parse_messages("lobby", ["|c|@foo|hi"], lazy=lazy)
+                self.assertIs(type(m), message.Message)
+        finally:
+            message.register_parser("c", "chat")(message._parse_chat)
@@ -0,0 +1,101 @@
+import asyncio
+import unittest
+
+from pyshowdown.metrics import (
+    ClientMetrics,
+    Counter,
+    Gauge,
+    Histogram,
+    MetricsServer,
+    Registry,
+)
+
+
+class MetricsTest(unittest.TestCase):
+    def test_counter(self):
+        counter = Counter("lines_total", "Lines received.", ["type"])
+        chat = counter.labels("chat")
+        chat.inc()
+        chat.inc(2)
+        counter.labels("join").inc()
+
+        self.assertIs(counter.labels("chat"), chat)
+        self.assertEqual(
+            counter.expose(),
+            "# HELP lines_total Lines received.\n"
+            "# TYPE lines_total counter\n"
+            'lines_total{type="chat"} 3\n'
+            'lines_total{type="join"} 1\n',
+        )
+        self.assertRaises(ValueError, counter.inc)
+        self.assertRaises(ValueError, counter.labels, "chat", "lobby")
+
+    def test_gauge(self):
+        gauge = Gauge("depth", "Queue depth.")
+        gauge.set(5)
+        gauge.dec(2)
+        self.assertIn("depth 3\n", gauge.expose())
+
+        gauge.set_function(lambda: 1.5)
+        self.assertIn("depth 1.5\n", gauge.expose())
+
+    def test_histogram(self):
+        histogram = Histogram("latency", "Latency.", buckets=[0.1, 1])
+        for value in [0.05, 0.1, 0.5, 2]:
+            histogram.observe(value)
+
+        self.assertEqual(
+            histogram.expose().splitlines()[2:],
+            [
+                'latency_bucket{le="0.1"} 2',
+                'latency_bucket{le="1"} 3',
+                'latency_bucket{le="+Inf"} 4',
+                "latency_sum 2.65",
+                "latency_count 4",
+            ],
+        )
+        self.assertRaises(ValueError, Histogram, "empty", "Empty.", buckets=[])
+
+    def test_histogram_labels(self):
+        histogram = Histogram("latency", "Latency.", ["plugin"], buckets=[1])
+        histogram.labels('a"b').observe(0.5)
+
+        self.assertIn('latency_bucket{plugin="a\\"b",le="1"} 1', histogram.expose())
+        self.assertIn('latency_count{plugin="a\\"b"} 1', histogram.expose())
+
+    def test_registry(self):
+        registry = Registry()
+        registry.counter("a_total", "A.").inc()
+        registry.gauge("b", "B.").set(2)
+
+        self.assertRaises(ValueError, registry.counter, "a_total", "A again.")
+        self.assertIn("a_total 1\n", registry.expose())
+        self.assertIn("b 2\n", registry.expose())
+
+    def test_client_metrics(self):
+        metrics = ClientMetrics()
+        metrics.inbound_lines.labels("ChatMessage").inc()
+        metrics.parse_seconds.observe(0.00002)
+
+        exposition = metrics.expose()
+        self.assertIn(
+            'pyshowdown_inbound_lines_total{type="ChatMessage"} 1', exposition
+        )
+        self.assertIn("pyshowdown_parse_seconds_count 1", exposition)
+
+
+class MetricsServerTest(unittest.IsolatedAsyncioTestCase):
+    async def test_serve(self):
+        registry = Registry()
+        registry.counter("a_total", "A.").inc()
+        server = MetricsServer(registry, port=0)
+        await server.start()
+
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+        writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        response = await reader.read()
+        writer.close()
+        await server.close()
+
+        self.assertTrue(response.startswith(b"HTTP/1.1 200 OK\r\n"))
+        self.assertTrue(response.endswith(b"a_total 1\n"))
@@ -0,0 +1,269 @@
+import asyncio
+import unittest
+
+from pyshowdown.outbound import OutboundQueue, Priority, join_lines, parse_uhtml
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class OutboundQueueTest(unittest.TestCase):
+    def drain(self, queue: OutboundQueue):
+        frames = []
+        while not queue.empty():
+            frames.append(queue.get_nowait().frame)
+        return frames
+
+    def test_priority(self):
+        queue = OutboundQueue()
+        queue.put("lobby", "announcement", Priority.BULK)
+        queue.put("lobby", "reply")
+        queue.put("", "/join techcode", Priority.CONTROL)
+
+        self.assertEqual(queue.qsize(), 3)
+        self.assertEqual(queue.qsize(Priority.BULK), 1)
+        self.assertEqual(queue.peek().frame, "|/join techcode")
+        self.assertEqual(
+            self.drain(queue),
+            ["|/join techcode", "lobby|reply", "lobby|announcement"],
+        )
+
+    def test_round_robin(self):
+        queue = OutboundQueue()
+        for i in range(3):
+            queue.put("lobby", f"a{i}", Priority.BULK)
+        queue.put("techcode", "b0", Priority.BULK)
+        queue.put("help", "c0", Priority.BULK)
+        queue.put("techcode", "b1", Priority.BULK)
+
+        self.assertEqual(
+            self.drain(queue),
+            [
+                "lobby|a0",
+                "techcode|b0",
+                "help|c0",
+                "lobby|a1",
+                "techcode|b1",
+                "lobby|a2",
+            ],
+        )
+
+    def test_put_front(self):
+        queue = OutboundQueue()
+        queue.put("lobby", "one")
+        queue.put("techcode", "other")
+        item = queue.get_nowait()
+        queue.put("lobby", "two")
+
+        queue.put_item(item, front=True)
+        self.assertEqual(
+            self.drain(queue), ["lobby|one", "techcode|other", "lobby|two"]
+        )
+
+    def test_get_ready(self):
+        queue = OutboundQueue()
+        queue.put("lobby", "a0")
+        queue.put("lobby", "a1")
+        queue.put("techcode", "b0")
+        queue.put("help", "c0")
+        queue.put("", "/join techcode", Priority.CONTROL)
+
+        item = queue.get_nowait(lambda room: room == "techcode")
+        self.assertEqual(item.frame, "techcode|b0")
+        self.assertEqual(queue.rooms(), {"", "lobby", "help"})
+        self.assertRaises(
+            asyncio.QueueEmpty, queue.get_nowait, lambda room: room == "techcode"
+        )
+        # skipped rooms keep their turn
+        self.assertEqual(
+            self.drain(queue), ["|/join techcode", "lobby|a0", "help|c0", "lobby|a1"]
+        )
+
+    def test_retry(self):
+        queue = OutboundQueue()
+        queue.put("lobby", "one")
+        queue.put("lobby", "two")
+        item = queue.get_nowait()
+
+        self.assertTrue(queue.retry(item))
+        self.assertEqual(item.attempts, 1)
+        self.assertEqual(self.drain(queue), ["lobby|one", "lobby|two"])
+
+    def test_retry_uhtml(self):
+        queue = OutboundQueue()
+        queue.put("lobby", "/changeuhtml score, 1-0")
+        item = queue.get_nowait()
+        queue.put("lobby", "/changeuhtml score, 2-0")
+
+        # a newer update is queued, so the rejected one is dropped
+        self.assertFalse(queue.retry(item))
+        self.assertEqual(self.drain(queue), ["lobby|/changeuhtml score, 2-0"])
+
+    def test_wait_stats(self):
+        clock = FakeClock()
+        queue = OutboundQueue(clock=clock)
+        queue.put("lobby", "one")
+        queue.put("lobby", "two")
+        queue.put("lobby", "bulk", Priority.BULK)
+
+        clock.now = 1
+        queue.get_nowait()
+        clock.now = 3
+        queue.get_nowait()
+        queue.get_nowait()
+
+        stats = queue.wait_stats[Priority.INTERACTIVE]
+        self.assertEqual(stats.count, 2)
+        self.assertEqual(stats.mean, 2)
+        self.assertEqual(stats.max, 3)
+        self.assertEqual(queue.wait_stats[Priority.BULK].max, 3)
+        self.assertEqual(queue.wait_stats[Priority.CONTROL].count, 0)
+
+    def test_coalesce(self):
+        queue = OutboundQueue()
+        for i in range(5):
+            queue.put("lobby", f"line {i}")
+        queue.put("techcode", "other")
+        queue.put("lobby", "bulk", Priority.BULK)
+
+        merged = queue.coalesce(queue.get_nowait(), max_lines=3)
+        self.assertEqual(merged.frame, "lobby|line 0\nline 1\nline 2")
+        self.assertEqual(queue.qsize(), 4)
+
+        merged = queue.coalesce(queue.get_nowait(), max_lines=3)
+        self.assertEqual(merged.frame, "techcode|other")
+        merged = queue.coalesce(queue.get_nowait(), max_lines=3)
+        self.assertEqual(merged.frame, "lobby|line 3\nline 4")
+        merged = queue.coalesce(queue.get_nowait(), max_lines=3)
+        self.assertEqual(merged.frame, "lobby|bulk")
+        self.assertTrue(queue.empty())
+        self.assertEqual(queue.wait_stats[Priority.INTERACTIVE].count, 6)
+
+    def test_coalesce_limits(self):
+        queue = OutboundQueue()
+        queue.put("lobby", "a\nb")
+        queue.put("lobby", "c\nd")
+        queue.put("lobby", "x" * 20)
+
+        item = queue.get_nowait()
+        self.assertIs(queue.coalesce(item, max_lines=3), item)
+
+        item = queue.get_nowait()
+        merged = queue.coalesce(item, max_lines=10, max_bytes=20)
+        self.assertIs(merged, item)
+        self.assertEqual(queue.qsize(), 1)
+
+    def test_join_lines(self):
+        lines = ["a", "b", "c", "d\ne", "f"]
+        self.assertEqual(join_lines("lobby", lines), ["a\nb\nc", "d\ne\nf"])
+        self.assertEqual(join_lines("lobby", lines, max_lines=1), lines)
+        # "lobby|a\nb" is 9 bytes
+        self.assertEqual(
+            join_lines("lobby", ["a", "b", "c"], max_bytes=9), ["a\nb", "c"]
+        )
+        self.assertEqual(
+            join_lines("lobby", ["x" * 20, "y"], max_bytes=9), ["x" * 20, "y"]
+        )
+        self.assertEqual(join_lines("lobby", []), [])
+
+    def test_parse_uhtml(self):
+        self.assertEqual(
+            parse_uhtml("/adduhtml Score Board, <b>1-0</b>"),
+            ("/adduhtml", "scoreboard", "<b>1-0</b>"),
+        )
+        self.assertEqual(
+            parse_uhtml("/changeuhtml scoreboard,<b>1-1</b>"),
+            ("/changeuhtml", "scoreboard", "<b>1-1</b>"),
+        )
+        self.assertIsNone(parse_uhtml("/adduhtml scoreboard"))
+        self.assertIsNone(parse_uhtml("/addhtmlbox <b>hi</b>"))
+        self.assertIsNone(parse_uhtml("hello, world"))
+
+    def test_uhtml_supersede(self):
+        queue = OutboundQueue()
+        first = queue.put("lobby", "/adduhtml score, 0-0")
+        queue.put("lobby", "hello")
+        queue.put("techcode", "/changeuhtml score, 5-5")
+        second = queue.put("lobby", "/changeuhtml score, 1-0")
+        queue.put("lobby", "/changeuhtml Score, 2-0")
+
+        self.assertIs(second, first)
+        self.assertEqual(queue.superseded, 2)
+        self.assertEqual(
+            self.drain(queue),
+            [
+                "lobby|/adduhtml Score, 2-0",
+                "techcode|/changeuhtml score, 5-5",
+                "lobby|hello",
+            ],
+        )
+
+    def test_uhtml_skip_unchanged(self):
+        queue = OutboundQueue()
+        queue.put("lobby", "/adduhtml score, 1-0")
+        queue.get_nowait()
+
+        self.assertIsNone(queue.put("lobby", "/changeuhtml score, 1-0"))
+        self.assertEqual(queue.skipped, 1)
+        self.assertTrue(queue.empty())
+
+        # re-adding moves the box, so it's still sent
+        self.assertIsNotNone(queue.put("lobby", "/adduhtml score, 1-0"))
+        queue.get_nowait()
+        self.assertIsNotNone(queue.put("lobby", "/changeuhtml score, 2-0"))
+
+    def test_uhtml_coalesced(self):
+        queue = OutboundQueue()
+        queue.put("lobby", "hello")
+        queue.put("lobby", "/changeuhtml score, 1-0")
+        queue.coalesce(queue.get_nowait())
+
+        self.assertIsNone(queue.put("lobby", "/changeuhtml score, 1-0"))
+        self.assertIsNotNone(queue.put("lobby", "/changeuhtml score, 2-0"))
+        self.assertEqual(queue.qsize(), 1)
+
+    def test_clear(self):
+        queue = OutboundQueue()
+        queue.put("lobby", "one")
+        queue.put("lobby", "two", Priority.BULK)
+
+        self.assertEqual(queue.clear(), 2)
+        self.assertTrue(queue.empty())
+        self.assertIsNone(queue.peek())
+        self.assertRaises(asyncio.QueueEmpty, queue.get_nowait)
+
+    def test_clear_forgets_sent_html(self):
+        queue = OutboundQueue()
+        queue.put("lobby", "/adduhtml score, 1-0")
+        queue.get_nowait()
+        queue.clear()
+
+        # after reconnecting, the box has to be sent again
+        self.assertIsNotNone(queue.put("lobby", "/changeuhtml score, 1-0"))
+        self.assertEqual(queue.skipped, 0)
+
+
+class OutboundQueueAsyncTest(unittest.IsolatedAsyncioTestCase):
+    async def test_get_waits(self):
+        queue = OutboundQueue()
+        getter = asyncio.create_task(queue.get())
+        await asyncio.sleep(0)
+        self.assertFalse(getter.done())
+
+        queue.put("lobby", "hello")
+        item = await asyncio.wait_for(getter, 1)
+        self.assertEqual(item.frame, "lobby|hello")
+
+    async def test_wait_put(self):
+        queue = OutboundQueue()
+        self.assertFalse(await queue.wait_put(0.01))
+
+        waiter = asyncio.create_task(queue.wait_put(1))
+        await asyncio.sleep(0)
+        queue.put("lobby", "hello")
+        self.assertTrue(await waiter)
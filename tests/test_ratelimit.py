@@ -0,0 +1,120 @@
+import asyncio
+import time
+import unittest
+
+from pyshowdown.ratelimit import AdaptiveTokenBucket, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_burst(self):
+        clock = FakeClock()
+        bucket = TokenBucket(2, burst=3, clock=clock)
+
+        self.assertTrue(bucket.try_acquire())
+        self.assertTrue(bucket.try_acquire())
+        self.assertTrue(bucket.try_acquire())
+        self.assertFalse(bucket.try_acquire())
+        self.assertAlmostEqual(bucket.delay(), 0.5)
+
+        clock.now = 0.5
+        self.assertTrue(bucket.try_acquire())
+        self.assertFalse(bucket.try_acquire())
+
+    def test_refill_capped(self):
+        clock = FakeClock()
+        bucket = TokenBucket(1, burst=2, clock=clock)
+        bucket.try_acquire()
+        bucket.try_acquire()
+
+        clock.now = 100
+        self.assertEqual(bucket.delay(), 0)
+        self.assertTrue(bucket.try_acquire())
+        self.assertTrue(bucket.try_acquire())
+        self.assertFalse(bucket.try_acquire())
+
+    def test_set_rate(self):
+        clock = FakeClock()
+        bucket = TokenBucket(1, burst=4, clock=clock)
+        bucket.try_acquire()
+
+        bucket.set_rate(10, burst=2)
+        self.assertEqual(bucket.rate, 10)
+        self.assertEqual(bucket.tokens, 2)
+        bucket.try_acquire()
+        bucket.try_acquire()
+        self.assertAlmostEqual(bucket.delay(), 0.1)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, TokenBucket, 0)
+        self.assertRaises(ValueError, TokenBucket, 1, burst=0)
+        self.assertRaises(ValueError, TokenBucket(1).set_rate, -1)
+
+
+class AdaptiveTokenBucketTest(unittest.TestCase):
+    def test_backoff_and_recover(self):
+        clock = FakeClock()
+        bucket = AdaptiveTokenBucket(
+            2, burst=3, min_rate=0.5, increase=0.25, clock=clock
+        )
+
+        bucket.throttled()
+        self.assertEqual(bucket.rate, 1)
+        self.assertEqual(bucket.tokens, 0)
+        self.assertFalse(bucket.try_acquire())
+
+        bucket.throttled()
+        bucket.throttled()
+        self.assertEqual(bucket.rate, 0.5)
+        self.assertEqual(bucket.throttle_count, 3)
+
+        for _ in range(4):
+            bucket.sent()
+        self.assertEqual(bucket.rate, 1.5)
+        for _ in range(4):
+            bucket.sent()
+        self.assertEqual(bucket.rate, 2)
+
+    def test_defaults(self):
+        bucket = AdaptiveTokenBucket(10)
+        self.assertEqual(bucket.min_rate, 1)
+        self.assertEqual(bucket.max_rate, 10)
+        self.assertEqual(bucket.increase, 0.5)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, AdaptiveTokenBucket, 1, min_rate=0)
+        self.assertRaises(ValueError, AdaptiveTokenBucket, 1, min_rate=2)
+        self.assertRaises(ValueError, AdaptiveTokenBucket, 1, decrease=1)
+        self.assertRaises(ValueError, AdaptiveTokenBucket, 1, increase=0)
+
+
+class TokenBucketAsyncTest(unittest.IsolatedAsyncioTestCase):
+    async def test_acquire(self):
+        bucket = TokenBucket(50, burst=2)
+
+        start = time.monotonic()
+        for _ in range(4):
+            await bucket.acquire()
+        elapsed = time.monotonic() - start
+
+        # two immediately, then two more at 20ms intervals
+        self.assertGreaterEqual(elapsed, 0.035)
+        self.assertLess(elapsed, 0.5)
+
+    async def test_set_rate_wakes_waiter(self):
+        bucket = TokenBucket(0.01, burst=1)
+        await bucket.acquire()
+
+        waiter = asyncio.create_task(bucket.acquire())
+        await asyncio.sleep(0.01)
+        self.assertFalse(waiter.done())
+
+        bucket.set_rate(1000)
+        await asyncio.wait_for(waiter, 1)
@@ -1,6 +1,11 @@
+import copy as copy_module
+import pickle
+import random
 import unittest
 
 from pyshowdown import room
+from pyshowdown.user import User
+from pyshowdown.utils import to_id
 
 
 class RoomTest(unittest.TestCase):
@@ -27,3 +32,95 @@ class RoomTest(unittest.TestCase):
         self.assertEqual(r.is_battle, True)
         self.assertEqual(r.is_private_battle, True)
         self.assertEqual(r.password, "password")
+
+
+class RoomUsersTest(unittest.TestCase):
+    def make_users(self):
+        return {
+            user.id: user
+            for user in [
+                User("Zed", "+", "", False),
+                User("alpha", "@", "", True),
+                User("Bravo", "@", "", False),
+                User("charlie", " ", "", False),
+                User("Delta", "%", "", False),
+                User("echo", "#", "", False),
+                User("foxtrot", "?", "", False),
+            ]
+        }
+
+    def assertIndexed(self, users: room.RoomUsers):
+        self.assertEqual(list(users.ordered()), sorted(users.values()))
+
+    def test_ordered(self):
+        users = room.RoomUsers(self.make_users())
+
+        self.assertEqual(
+            [user.name for user in users.ordered()],
+            ["echo", "Bravo", "alpha", "Delta", "foxtrot", "Zed", "charlie"],
+        )
+        self.assertEqual([user.name for user in users.top(2)], ["echo", "Bravo"])
+        self.assertEqual(users.top(0), [])
+
+    def test_with_rank(self):
+        users = room.RoomUsers(self.make_users())
+
+        self.assertEqual(
+            [user.name for user in users.with_rank("%")],
+            ["echo", "Bravo", "alpha", "Delta"],
+        )
+        self.assertEqual(
+            [user.name for user in users.with_rank("%", "@")],
+            ["Bravo", "alpha", "Delta"],
+        )
+        self.assertEqual([user.name for user in users.with_rank("+", "+")], ["Zed"])
+        self.assertEqual(users.with_rank("~", "~"), [])
+        self.assertRaises(ValueError, users.with_rank, "?")
+
+    def test_updates(self):
+        rng = random.Random(0)
+        users = room.RoomUsers()
+        names = [f"User {i}" for i in range(30)]
+        for _ in range(500):
+            name = rng.choice(names)
+            id = to_id(name)
+            action = rng.randrange(4)
+            if action == 0:
+                users.pop(id, None)
+            elif action == 1 and id in users:
+                del users[id]
+            else:
+                rank = rng.choice("~#@%+ ")
+                users[id] = User(name, rank, "", rng.random() < 0.3)
+            self.assertIndexed(users)
+
+        users.update({"newbie": User("Newbie", " ", "", False)})
+        users.setdefault("zed", User("Zed", "+", "", False))
+        users |= {"yankee": User("Yankee", "@", "", False)}
+        self.assertIndexed(users)
+        users.popitem()
+        self.assertIndexed(users)
+        users.clear()
+        self.assertEqual(list(users.ordered()), [])
+
+    def test_copies(self):
+        users = room.RoomUsers(self.make_users())
+        for copy in (
+            users.copy(),
+            copy_module.deepcopy(users),
+            pickle.loads(pickle.dumps(users)),
+        ):
+            self.assertIsInstance(copy, room.RoomUsers)
+            self.assertEqual(copy, users)
+            self.assertIndexed(copy)
+
+    def test_room_users(self):
+        r = room.Room("test")
+        users = self.make_users()
+        r.users = users
+
+        self.assertIsInstance(r.users, room.RoomUsers)
+        self.assertEqual(r.users, users)
+        self.assertIsNot(r.users, users)
+        r.users["golf"] = User("golf", "~", "", False)
+        self.assertEqual(r.users.top(1)[0].name, "golf")
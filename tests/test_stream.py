@@ -0,0 +1,87 @@
+import asyncio
+import unittest
+
+from pyshowdown.message import ChatMessage, Message, parse_message
+from pyshowdown.stream import Subscription
+
+
+def chat(text: str, room: str = "lobby") -> Message:
+    return parse_message(room, f"|c|@foo|{text}")
+
+
+class SubscriptionTest(unittest.IsolatedAsyncioTestCase):
+    async def drain(self, subscription: Subscription):
+        subscription.close()
+        return [m.message async for m in subscription]
+
+    async def test_wants(self):
+        subscription = Subscription((ChatMessage,), rooms=("lobby",))
+
+        self.assertTrue(subscription.wants(chat("hi")))
+        self.assertFalse(subscription.wants(chat("hi", "techcode")))
+        self.assertFalse(subscription.wants(parse_message("lobby", "|j|@foo")))
+        self.assertTrue(Subscription().wants(parse_message("", "|j|@foo")))
+
+    async def test_drop_oldest(self):
+        subscription = Subscription(maxsize=2, overflow="drop-oldest")
+        for i in range(4):
+            await subscription.put(chat(str(i)))
+
+        self.assertEqual(subscription.lag, 2)
+        self.assertEqual(subscription.dropped, 2)
+        self.assertEqual(await self.drain(subscription), ["2", "3"])
+
+    async def test_drop_newest(self):
+        subscription = Subscription(maxsize=2, overflow="drop-newest")
+        for i in range(4):
+            await subscription.put(chat(str(i)))
+
+        self.assertEqual(subscription.dropped, 2)
+        self.assertEqual(subscription.max_lag, 2)
+        self.assertEqual(await self.drain(subscription), ["0", "1"])
+
+    async def test_block(self):
+        subscription = Subscription(maxsize=1)
+        await subscription.put(chat("0"))
+        putter = asyncio.create_task(subscription.put(chat("1")))
+        await asyncio.sleep(0)
+        self.assertFalse(putter.done())
+        self.assertEqual(subscription.blocked, 1)
+
+        self.assertEqual((await subscription.get()).message, "0")
+        await asyncio.wait_for(putter, 1)
+        self.assertEqual((await subscription.get()).message, "1")
+        self.assertEqual(subscription.delivered, 2)
+        self.assertEqual(subscription.dropped, 0)
+
+    async def test_get_waits(self):
+        subscription = Subscription()
+        getter = asyncio.create_task(subscription.get())
+        await asyncio.sleep(0)
+        self.assertFalse(getter.done())
+
+        await subscription.put(chat("hi"))
+        self.assertEqual((await asyncio.wait_for(getter, 1)).message, "hi")
+
+    async def test_close(self):
+        closed = []
+        subscription = Subscription(maxsize=1, on_close=closed.append)
+        await subscription.put(chat("0"))
+        putter = asyncio.create_task(subscription.put(chat("1")))
+        await asyncio.sleep(0)
+
+        async with subscription:
+            pass
+        await asyncio.wait_for(putter, 1)
+        await subscription.put(chat("2"))
+
+        self.assertEqual(closed, [subscription])
+        self.assertEqual([m.message async for m in subscription], ["0"])
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, Subscription, maxsize=0)
+        self.assertRaises(ValueError, Subscription, overflow="drop")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,9 @@
+import copy
+import pickle
 import unittest
 
 
-from pyshowdown.user import User
+from pyshowdown.user import User, UserIdentity, UserRegistry, is_trusted_rank
 
 
 class UserTest(unittest.TestCase):
@@ -66,3 +68,116 @@ class UserTest(unittest.TestCase):
                 "quebec",
             ],
         )
+
+    def test_slots(self):
+        user = User("TeSt", "@", "", True)
+
+        self.assertFalse(hasattr(user, "__dict__"))
+        with self.assertRaises(AttributeError):
+            user.nickname = "test"  # type: ignore[attr-defined]
+
+    def test_copy(self):
+        user = User("TeSt", "@", "", True)
+        user.away = False
+
+        for copied in (
+            copy.copy(user),
+            copy.deepcopy(user),
+            pickle.loads(pickle.dumps(user)),
+        ):
+            self.assertEqual(copied, user)
+            self.assertEqual(copied.id, "test")
+            self.assertFalse(copied.away)
+
+    def test_is_trusted_rank(self):
+        for rank in ["~", "&", "#", "@", "%", "*"]:
+            self.assertTrue(is_trusted_rank(rank), rank)
+        for rank in ["+", "☆", " ", "!", "‽", "?"]:
+            self.assertFalse(is_trusted_rank(rank), rank)
+
+
+class UserRegistryTest(unittest.TestCase):
+    def test_interned(self):
+        registry = UserRegistry()
+        user = registry.user("@Foo Bar")
+
+        self.assertEqual(user, User("Foo Bar", "@", "", False))
+        self.assertIs(registry.user("@Foo Bar"), user)
+        self.assertEqual((registry.hits, registry.misses), (1, 1))
+
+        promoted = registry.user("+Foo Bar")
+        self.assertIsNot(promoted, user)
+        self.assertEqual(user.rank, "@")
+        self.assertIs(registry.user("+Foo Bar"), promoted)
+        # the name and ID are shared by every record of the user
+        self.assertIs(promoted.id, user.id)
+        self.assertIs(promoted.name, user.name)
+
+    def test_rooms(self):
+        registry = UserRegistry()
+        lobby = registry.user("@foo", "lobby")
+        techcode = registry.user("@foo", "techcode")
+
+        self.assertIsNot(lobby, techcode)
+        self.assertIs(lobby.id, techcode.id)
+        self.assertIs(registry.user("@foo", "lobby"), lobby)
+
+        # changing a room's user doesn't change the others
+        techcode.rank = "+"
+        self.assertEqual(lobby.rank, "@")
+        self.assertEqual(len(registry), 1)
+
+        registry.clear("techcode")
+        self.assertIs(registry.user("@foo", "lobby"), lobby)
+        self.assertIsNot(registry.user("@foo", "techcode"), techcode)
+
+    def test_identity(self):
+        registry = UserRegistry()
+        identity = registry.identity("Foo Bar!")
+
+        self.assertEqual(identity, UserIdentity("foobar", "Foo Bar!"))
+        self.assertIs(registry.identity("Foo Bar!"), identity)
+        self.assertEqual(
+            registry.identity("foo bar"), UserIdentity("foobar", "foo bar")
+        )
+        self.assertEqual(len(registry), 1)
+
+    def test_with_status(self):
+        registry = UserRegistry()
+
+        self.assertEqual(
+            registry.user_with_status("@foo@!busy@work"),
+            User("foo", "@", "busy@work", True),
+        )
+        # chat lines don't show the status, so the room's one is kept
+        self.assertEqual(registry.user("@foo"), User("foo", "@", "busy@work", True))
+        self.assertEqual(
+            registry.user_with_status("+foo@"), User("foo", "+", "", False)
+        )
+        self.assertEqual(registry.user_with_status(" foo"), User("foo", " ", "", False))
+        self.assertIs(
+            registry.user_with_status(" foo"), registry.user_with_status(" foo")
+        )
+
+    def test_users_with_status(self):
+        registry = UserRegistry()
+        plain = registry.user("@foo")
+        users = registry.users_with_status(["@foo", "+Bar Baz@!away", " qux"])
+
+        self.assertIs(users[0], plain)
+        self.assertEqual(users[1], User("Bar Baz", "+", "away", True))
+        self.assertEqual([user.id for user in users], ["foo", "barbaz", "qux"])
+        self.assertIs(registry.users_with_status([" qux"])[0], users[2])
+
+    def test_maxsize(self):
+        registry = UserRegistry(maxsize=2)
+        first = registry.user("@a")
+        registry.user("@b")
+        registry.user("@c")
+
+        self.assertEqual(len(registry), 2)
+        self.assertIsNot(registry.user("@a"), first)
+
+        registry.clear()
+        self.assertEqual(len(registry), 0)
+        self.assertRaises(ValueError, UserRegistry, maxsize=0)
@@ -0,0 +1,113 @@
+import colorsys
+import random
+import re
+import unittest
+from hashlib import md5
+
+from pyshowdown.utils import (
+    numpy,
+    text_to_id,
+    to_id,
+    to_ids,
+    username_color,
+    username_colors,
+)
+
+
+def regex_to_id(string: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]", "", string).lower()
+
+
+class ToIdTest(unittest.TestCase):
+    names = [
+        "Zarel",
+        "Some User Name",
+        "already1d",
+        "B.A.D. w-o-r-d!",
+        "Ünïcödé Nâme ✨",
+        "日本語のなまえ",
+        "\0tab\there\0",
+        "\ud800lone surrogate",
+        "",
+        " " * 30,
+    ]
+
+    def test_to_id(self):
+        for name in self.names:
+            self.assertEqual(to_id(name), regex_to_id(name), name)
+        self.assertEqual(to_id(None), "")
+
+    def test_text_to_id(self):
+        to_id.cache_clear()
+        for name in self.names:
+            self.assertEqual(text_to_id(name), regex_to_id(name), name)
+        self.assertEqual(to_id.cache_info().currsize, 0)
+
+    def test_fuzz(self):
+        rng = random.Random(0)
+        alphabet = [chr(c) for c in range(0x2FF)] + ["✨", "日", "\ud800"]
+        for _ in range(500):
+            name = "".join(rng.choice(alphabet) for _ in range(rng.randrange(20)))
+            self.assertEqual(to_id(name), regex_to_id(name), repr(name))
+
+    def test_to_ids(self):
+        self.assertEqual(to_ids(self.names), [regex_to_id(n) for n in self.names])
+        self.assertEqual(to_ids(iter(["A", "B"])), ["a", "b"])
+        self.assertEqual(to_ids([]), [])
+        self.assertEqual(to_ids([""]), [""])
+
+
+def reference_color(name: str) -> tuple:
+    # username_color before it was cached
+    hash = md5(to_id(name).encode()).hexdigest()
+    H = int(hash[4:8], 16) % 360
+    S = int(hash[0:4], 16) % 50 + 40
+    L = int(hash[8:12], 16) % 20 + 30
+    R, G, B = colorsys.hls_to_rgb(H / 360, L / 100, S / 100)
+    lum = R * R * R * 0.2126 + G * G * G * 0.7152 + B * B * B * 0.0722
+    HLmod = (lum - 0.2) * -150
+    if HLmod > 18:
+        HLmod = (HLmod - 18) * 2.5
+    elif HLmod < 0:
+        HLmod = (HLmod - 0) / 3
+    else:
+        HLmod = 0
+    Hdist = min(abs(180 - H), abs(240 - H))
+    if Hdist < 15:
+        HLmod += (15 - Hdist) / 3
+    L += HLmod
+    return H, S, L
+
+
+class UsernameColorTest(unittest.TestCase):
+    names = [f"User {i}" for i in range(300)] + ["Zarel", "Ünïcödé", ""]
+
+    def assertSameColors(self, colors, expected):
+        self.assertEqual(colors, expected)
+        # down to the types, which username_color() mixes
+        self.assertEqual(repr(colors), repr(expected))
+
+    def test_username_color(self):
+        for name in self.names:
+            self.assertSameColors(username_color(name), reference_color(name))
+        self.assertIs(username_color("User 1"), username_color("user1"))
+
+    def test_username_colors(self):
+        expected = {to_id(name): reference_color(name) for name in self.names}
+
+        self.assertSameColors(username_colors(self.names, vectorized=False), expected)
+        self.assertEqual(
+            username_colors({"foo": None, "Foo": None}), {"foo": username_color("foo")}
+        )
+        self.assertEqual(username_colors([]), {})
+
+    @unittest.skipIf(numpy is None, "NumPy isn't installed")
+    def test_vectorized(self):
+        expected = {to_id(name): reference_color(name) for name in self.names}
+
+        self.assertSameColors(username_colors(self.names, vectorized=True), expected)
+        self.assertEqual(username_colors([], vectorized=True), {})
+
+
+if __name__ == "__main__":
+    unittest.main()